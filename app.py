@@ -1,160 +1,447 @@
-import struct
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, has_request_context, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
+import sys
 import platform
 import subprocess
 import datetime
 import webbrowser
 import requests
 import socket
-from newsapi import NewsApiClient
-import screen_brightness_control as sbc
-from ctypes import cast, POINTER
-from comtypes import CLSCTX_ALL
-from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
-import pythoncom
-import cv2
 from dotenv import load_dotenv
-import google.generativeai as genai
 import logging
-import threading
 import ssl
 import re
 import ctypes
-import sqlite3
-import schedule
 import time
-import pvporcupine
-import pyaudio
 from plyer import notification
 from dateutil.parser import parse
 from datetime import datetime, timedelta
-from langdetect import detect
+from concurrent.futures import ThreadPoolExecutor
 import warnings
+import json
+import wave
+import argparse
+import atexit
+import contextvars
+from types import SimpleNamespace
+from intents import IntentRouter, OPEN_VERB, CLOSE_VERB
+from http_client import HTTPClient
+from storage import Storage
+from migrations import migrate
+from reminders import ReminderScheduler
+from jobs import JobEngine, DailyAt, parse_recurrence
+from tasks import TaskQueue
+from memory import ConversationMemory, clip
+from subsystems import SubsystemRegistry
+from events import EventBus, sse_format
+from tracing import Tracer, span
+from llm_gateway import LLMGateway, INTERACTIVE, BULK, is_throttle
+from cache import ResponseCache, MemoryCacheBackend, SQLiteCacheBackend, RedisCacheBackend, prompt_key, city_key, params_key
+from state import SQLiteState, RedisState, FakeRedis, claim_worker_slot, slot_path
+from retention import SessionRetention
+from app_registry import AppRegistry
+from launcher import Launcher
 
 
 # Initialize Flask app and enable CORS
 app = Flask(__name__)
 CORS(app)
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Per-request spans (intent matching, database, upstream calls, JSON serialization) are
+# summed per request, echoed in a Server-Timing header and kept as histograms for /metrics
+tracer = Tracer()
+
+class TracedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with span('serialize'):
+            return super().dumps(obj, **kwargs)
+
+app.json = TracedJSONProvider(app)
+
+@app.before_request
+def begin_trace():
+    g.trace_token = tracer.begin(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def finish_trace(response):
+    trace = tracer.finish(response.status_code)
+    if trace:
+        response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+# Streamed responses end after after_request; their remaining spans still count
+@app.teardown_request
+def end_trace(exc):
+    token = g.pop('trace_token', None)
+    if token:
+        tracer.end(token)
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging; LOG_LEVEL=DEBUG shows per-request detail. Log calls pass
+# %-style arguments, so disabled levels skip the string formatting entirely.
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 # Suppress Werkzeug development server warning
 warnings.filterwarnings('ignore', message='This is a development server')
 logging.getLogger('werkzeug').setLevel(logging.ERROR)
 
-# Load environment variables
-load_dotenv()
 app.secret_key = os.getenv('FLASK_SECRET_KEY', os.urandom(24).hex())
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
 NEWS_API_KEY = os.getenv('NEWS_API_KEY')
 PICOVOICE_ACCESS_KEY = os.getenv('PICOVOICE_ACCESS_KEY')
+# Optional Gemini API host override (e.g. a local stand-in for load tests); uses the REST transport
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
 
 # Log API key status
-logger.debug(f"GEMINI_API_KEY set: {bool(GEMINI_API_KEY)}")
-logger.debug(f"WEATHER_API_KEY set: {bool(WEATHER_API_KEY)}")
-logger.debug(f"NEWS_API_KEY set: {bool(NEWS_API_KEY)}")
-logger.debug(f"PICOVOICE_ACCESS_KEY set: {bool(PICOVOICE_ACCESS_KEY)}")
+logger.debug("GEMINI_API_KEY set: %s", bool(GEMINI_API_KEY))
+logger.debug("WEATHER_API_KEY set: %s", bool(WEATHER_API_KEY))
+logger.debug("NEWS_API_KEY set: %s", bool(NEWS_API_KEY))
+logger.debug("PICOVOICE_ACCESS_KEY set: %s", bool(PICOVOICE_ACCESS_KEY))
 
 # Check for missing API keys
 required_keys = ['GEMINI_API_KEY', 'WEATHER_API_KEY', 'NEWS_API_KEY', 'PICOVOICE_ACCESS_KEY']
 for key in required_keys:
     if not os.getenv(key):
-        logger.warning(f"Environment variable {key} is not set. Related features may not work.")
+        logger.warning("Environment variable %s is not set. Related features may not work.", key)
 
 # Initialize SQLite for conversational memory and reminders
-conn = sqlite3.connect('jarvis_sessions.db', check_same_thread=False)
-c = conn.cursor()
-c.execute('CREATE TABLE IF NOT EXISTS sessions (user_id TEXT, query TEXT, response TEXT, timestamp DATETIME)')
-c.execute('CREATE TABLE IF NOT EXISTS reminders (user_id TEXT, task TEXT, reminder_time TEXT, created_at DATETIME)')
-conn.commit()
-
-# Initialize Gemini model
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Pooled connections in WAL mode; session rows are group-committed by a background writer
+storage = Storage(
+    'jarvis_sessions.db',
+    batch_size=int(os.getenv('DB_BATCH_SIZE', '100')),
+    flush_interval=float(os.getenv('DB_FLUSH_INTERVAL', '0.05'))
+)
+# Bring the schema up to date (tables, primary keys, indexes, reminders.due_at)
+with storage.connection() as db:
+    logger.debug("Database schema version: %s", migrate(db))
+
+# State shared by worker processes running behind one load balancer: which worker runs
+# each scheduled job. STATE_BACKEND=redis keeps it in REDIS_URL (fake:// for an
+# in-process stand-in); the default keeps it in jarvis_sessions.db.
+def connect_redis():
+    url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    if url.startswith('fake://'):
+        return FakeRedis()
+    import redis
+    return redis.Redis.from_url(url)
+
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite').lower()
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory').lower()
+redis_client = connect_redis() if 'redis' in (STATE_BACKEND, CACHE_BACKEND) else None
+shared_state = RedisState(redis_client) if STATE_BACKEND == 'redis' else SQLiteState(storage)
+
+# Per-user conversation memory for Gemini prompts: the newest turns verbatim,
+# older ones condensed into a rolling summary, all within MEMORY_TOKEN_BUDGET
+memory = ConversationMemory(
+    storage,
+    recent_turns=int(os.getenv('MEMORY_RECENT_TURNS', '6')),
+    token_budget=int(os.getenv('MEMORY_TOKEN_BUDGET', '1024')),
+    summary_tokens=int(os.getenv('MEMORY_SUMMARY_TOKENS', '256'))
+)
+
+# Server-to-browser events (reminders, wake word, daily news) streamed from /events
+event_bus = EventBus(max_queue=int(os.getenv('EVENTS_QUEUE_SIZE', '100')))
+
+# Heavy capabilities load on first use or in the background warm-up started at launch,
+# so importing this module stays fast; /health reports what is ready
+subsystems = SubsystemRegistry()
+
+@subsystems.register('llm')
+def load_gemini_model():
+    if not GEMINI_API_KEY:
+        logger.warning("GEMINI_API_KEY not set. General queries will not work.")
+        return None
+    import google.generativeai as genai
+    if GEMINI_API_ENDPOINT:
+        genai.configure(api_key=GEMINI_API_KEY, transport='rest', client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=GEMINI_API_KEY)
     try:
         model = genai.GenerativeModel('gemini-2.0-flash')
         logger.debug("Gemini model initialized with gemini-2.0-flash.")
+        return model
     except Exception as e:
-        logger.warning(f"Failed to initialize gemini-2.0-flash: {str(e)}")
-        try:
-            models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
-            logger.debug(f"Available models: {models}")
-            if models:
-                model = genai.GenerativeModel(models[0])
-                logger.debug(f"Falling back to model: {models[0]}")
-            else:
-                model = None
-                logger.warning("No supported models found.")
-        except Exception as e:
-            model = None
-            logger.error(f"Failed to list models: {str(e)}")
+        logger.warning("Failed to initialize gemini-2.0-flash: %s", e)
+    models = [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]
+    logger.debug("Available models: %s", models)
+    if not models:
+        logger.warning("No supported models found.")
+        return None
+    logger.debug("Falling back to model: %s", models[0])
+    return genai.GenerativeModel(models[0])
+
+# Language of /chat messages; profiles load here, once, and each user's language sticks
+# so short replies ("haan", "ok") skip detection
+@subsystems.register('language')
+def load_language_detection():
+    from language import LanguageDetector
+    return LanguageDetector(
+        min_letters=int(os.getenv('LANGUAGE_MIN_LETTERS', '12')),
+        confidence=float(os.getenv('LANGUAGE_CONFIDENCE', '0.9')),
+        cache_size=int(os.getenv('LANGUAGE_CACHE_SIZE', '1024'))
+    )
+
+# Webcam capture pipeline; CAMERA_SOURCE=synthetic runs it on generated frames
+@subsystems.register('camera')
+def load_camera():
+    from camera import Camera, SyntheticSource
+    if os.getenv('CAMERA_SOURCE', 'webcam') == 'synthetic':
+        open_source = SyntheticSource
+    else:
+        import cv2
+        open_source = lambda: cv2.VideoCapture(int(os.getenv('CAMERA_INDEX', '0')))
+    return Camera(
+        open_source,
+        slots=int(os.getenv('CAMERA_RING_SLOTS', '8')),
+        snapshot_dir=os.getenv('CAMERA_SNAPSHOT_DIR', '.'),
+        jpeg_quality=int(os.getenv('CAMERA_JPEG_QUALITY', '80'))
+    )
+
+@subsystems.register('brightness')
+def load_brightness():
+    import screen_brightness_control as sbc
+    return sbc
+
+@subsystems.register('volume')
+def load_volume():
+    if platform.system() != 'Windows':
+        return None
+    from ctypes import cast, POINTER
+    from comtypes import CLSCTX_ALL
+    from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
+    import pythoncom
+    return SimpleNamespace(cast=cast, POINTER=POINTER, CLSCTX_ALL=CLSCTX_ALL, pythoncom=pythoncom,
+                           AudioUtilities=AudioUtilities, IAudioEndpointVolume=IAudioEndpointVolume)
+
+# Wake word listener (not started). WAKE_WORD_ENGINE=energy with WAKE_WORD_SOURCE=<16-bit mono WAV>
+# runs the same loop on recorded audio without Porcupine or a microphone.
+@subsystems.register('wake_word')
+def load_wake_word():
+    from audio import WakeWordListener, MicrophoneSource, WavSource, EnergyEngine
+    if os.getenv('WAKE_WORD_ENGINE', 'porcupine') == 'energy':
+        engine = EnergyEngine(threshold=int(os.getenv('WAKE_WORD_ENERGY_THRESHOLD', '3000')))
+    elif PICOVOICE_ACCESS_KEY:
+        import pvporcupine
+        engine = pvporcupine.create(access_key=PICOVOICE_ACCESS_KEY, keywords=os.getenv('WAKE_WORDS', 'jarvis').split(','))
+    else:
+        return None
+    wav_path = os.getenv('WAKE_WORD_SOURCE')
+    if wav_path:
+        open_source = lambda: WavSource(wav_path, realtime=True)
+    else:
+        import pyaudio
+        open_source = lambda: MicrophoneSource(pyaudio, engine.sample_rate, engine.frame_length)
+    return WakeWordListener(engine, open_source, on_wake=on_wake_word,
+                            ring_seconds=float(os.getenv('WAKE_WORD_RING_SECONDS', '10')))
+
+def get_model():
+    return subsystems.get('llm')
+
+# Shared outbound HTTP client: pooled keep-alive connections, connect/read timeouts,
+# bounded retries and a circuit breaker per upstream (weather, news, gemini)
+outbound = HTTPClient(
+    connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('HTTP_READ_TIMEOUT', '10')),
+    pool_maxsize=int(os.getenv('HTTP_POOL_SIZE', '10'))
+)
+# Gemini goes through the SDK, so any SDK error except a quota error counts as a failure.
+# The breaker lives here, but llm_gateway makes the retries so each one waits for a token.
+gemini_upstream = outbound.upstream('gemini', retries=0, retry_on=(Exception,), give_up=is_throttle)
+
+def load_gemini_fallbacks(primary_name):
+    """(name, model) alternatives for a throttled primary: GEMINI_FALLBACK_MODELS, else flash models first."""
+    if not GEMINI_API_KEY:
+        return []
+    import google.generativeai as genai
+    names = [name.strip() for name in os.getenv('GEMINI_FALLBACK_MODELS', '').split(',') if name.strip()]
+    if not names:
+        names = sorted((m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods),
+                       key=lambda name: 'flash' not in name)
+    models = [genai.GenerativeModel(name) for name in names]
+    limit = int(os.getenv('GEMINI_FALLBACK_LIMIT', '2'))
+    return [(model.model_name, model) for model in models if model.model_name != primary_name][:limit]
+
+# Every Gemini call is admitted here: a token bucket per model sized to its quota
+# (GEMINI_RPM requests per minute), interactive requests ahead of bulk ones,
+# identical concurrent prompts sharing one call, retries that each wait for a token,
+# and other models when the primary is throttled
+llm_gateway = LLMGateway(
+    get_model,
+    rpm=float(os.getenv('GEMINI_RPM', '15')),
+    burst=int(os.getenv('GEMINI_BURST', '0')) or None,
+    fallbacks=load_gemini_fallbacks,
+    fallback_rpm=float(os.getenv('GEMINI_FALLBACK_RPM', '0')) or None,
+    max_wait=float(os.getenv('GEMINI_MAX_WAIT', '30')),
+    coalesce_window=float(os.getenv('GEMINI_COALESCE_WINDOW_MS', '0')) / 1000,
+    cooldown=float(os.getenv('GEMINI_THROTTLE_COOLDOWN', '15')),
+    retries=int(os.getenv('GEMINI_RETRIES', '2')),
+    upstream=gemini_upstream
+)
+
+@subsystems.register('news')
+def load_newsapi():
+    if not NEWS_API_KEY:
+        return None
+    from newsapi import NewsApiClient
+    return NewsApiClient(api_key=NEWS_API_KEY, session=outbound.session)
+
+def get_newsapi():
+    return subsystems.get('news')
+
+# Response caches for Gemini, weather and news lookups
+# CACHE_BACKEND=sqlite keeps cached responses in jarvis_sessions.db across restarts;
+# sqlite and redis are shared by every worker
+if CACHE_BACKEND == 'sqlite':
+    cache_backend = SQLiteCacheBackend(storage, max_entries=int(os.getenv('CACHE_MAX_ENTRIES', '5000')))
+elif CACHE_BACKEND == 'redis':
+    cache_backend = RedisCacheBackend(redis_client)
 else:
-    model = None
-    logger.warning("GEMINI_API_KEY not set. General queries will not work.")
-
-# Initialize NewsAPI client
-newsapi = NewsApiClient(api_key=NEWS_API_KEY) if NEWS_API_KEY else None
-
-# Application paths configuration
-# To add a new website: add a new entry with format 'name': {'url': 'https://example.com'}
-# To add a new app: add entry with 'win', 'mac', 'linux' keys for platform-specific commands
-APPS = {
-    'whatsapp': {
-        'win': os.getenv('WHATSAPP_PATH', 'start whatsapp'),
-        'mac': 'WhatsApp',
-        'linux': 'whatsapp-desktop',
-        'url': 'https://web.whatsapp.com'
-    },
-    'youtube': {'url': 'https://www.youtube.com'},
-    'facebook': {'url': 'https://www.facebook.com'},
-    'google': {'url': 'https://www.google.com'},
-    'twitter': {'url': 'https://www.twitter.com'},
-    'instagram': {'url': 'https://www.instagram.com'},
-    'github': {'url': 'https://www.github.com'},
-    'linkedin': {'url': 'https://www.linkedin.com'},
-    'reddit': {'url': 'https://www.reddit.com'},
-    'stackoverflow': {'url': 'https://stackoverflow.com'},
-    'gmail': {'url': 'https://mail.google.com'},
-    'netflix': {'url': 'https://www.netflix.com'},
-    'calculator': {
-        'win': 'calc',
-        'mac': 'Calculator',
-        'linux': 'gnome-calculator'
-    },
-    'vscode': {
-        'win': os.getenv('VSCODE_PATH', 'code'),
-        'mac': 'Visual Studio Code',
-        'linux': 'code'
-    },
-    'chrome': {
-        'win': 'chrome',
-        'mac': 'Google Chrome',
-        'linux': 'google-chrome'
-    },
-    'edge': {
-        'win': 'msedge',
-        'mac': 'Microsoft Edge',
-        'linux': 'microsoft-edge'
-    },
-    'firefox': {
-        'win': 'firefox',
-        'mac': 'Firefox',
-        'linux': 'firefox'
-    },
-    'notepad': {
-        'win': 'notepad',
-        'mac': 'TextEdit',
-        'linux': 'gedit'
-    },
-    'wikipedia': {'url': 'https://en.wikipedia.org/wiki/Main_Page'}
-}
-
-# Camera state
-camera_active = False
+    cache_backend = MemoryCacheBackend(max_entries=int(os.getenv('CACHE_MAX_ENTRIES', '512')))
+gemini_cache = ResponseCache('gemini', cache_backend, ttl=int(os.getenv('GEMINI_CACHE_TTL', '86400')))
+weather_cache = ResponseCache('weather', cache_backend, ttl=int(os.getenv('WEATHER_CACHE_TTL', '600')))
+news_cache = ResponseCache('news', cache_backend, ttl=int(os.getenv('NEWS_CACHE_TTL', '900')))
+
+# Semantic cache for note and general-question answers: a rephrased question
+# ("explain photosynthesis" after "what is photosynthesis") reuses the stored answer
+@subsystems.register('semantic_cache')
+def load_semantic_cache():
+    if os.getenv('SEMANTIC_CACHE', '1') == '0':
+        return None
+    from semantic_cache import SemanticCache
+    # Each worker process maps a vector file of its own: semantic_cache.f32, semantic_cache.1.f32, ...
+    path = os.getenv('SEMANTIC_CACHE_PATH', 'semantic_cache.f32')
+    shard = claim_worker_slot(path)
+    return SemanticCache(
+        storage,
+        path=slot_path(path, shard),
+        shard=shard,
+        capacity=int(os.getenv('SEMANTIC_CACHE_SIZE', '2048')),
+        threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.85')),
+        ttl=int(os.getenv('SEMANTIC_CACHE_TTL', os.getenv('GEMINI_CACHE_TTL', '86400')))
+    )
+
+# Similarity search over each user's past turns, for /history/search and prompt context
+@subsystems.register('history')
+def load_history_index():
+    if os.getenv('HISTORY_INDEX', '1') == '0':
+        return None
+    from history_index import HistoryIndex
+    # Each worker process indexes into a directory of its own: history_index, history_index.1, ...
+    directory = os.getenv('HISTORY_INDEX_DIR', 'history_index')
+    return HistoryIndex(storage, directory=slot_path(directory, claim_worker_slot(directory)))
+
+# Questions that refer back to the conversation get a fresh answer every time
+FOLLOW_UP_WORDS = re.compile(r'\b(it|its|this|that|these|those|they|them|he|she|him|her|more|again|above|previous|same)\b',
+                             re.IGNORECASE)
+
+# Conversation context in Gemini prompts. A prompt carrying a user's recent turns
+# differs on every request, so keying a cache or a task on it never hits, and its
+# answer is shaped by that user. A question that doesn't refer back to the
+# conversation is therefore sent without context: its prompt depends on the query
+# alone, so gemini_cache and task dedup key on it and can share the answer. The
+# trade-off is that such a question is answered without the user's earlier turns;
+# follow-up questions keep their context and are never cached.
+def prompt_context(clean_query, context):
+    """The context to send with clean_query: none when the question stands alone."""
+    return context if FOLLOW_UP_WORDS.search(clean_query) else ''
+
+def semantic_key(intent, clean_query):
+    """(namespace, question) for the semantic cache, or None when the answer shouldn't be shared.
+
+    Semantic cache entries are shared by every user, so generate_text and
+    stream_text only use one for a prompt sent without context (cache=True).
+    """
+    if intent == 'note':
+        question = note_topic(clean_query)
+    elif intent == 'fallback':
+        question = clean_query
+    else:
+        return None
+    if FOLLOW_UP_WORDS.search(question):
+        return None
+    return intent, question
+
+# Cached upstream calls. Empty or failed responses are never cached, and neither
+# are prompts with conversation context (cache=False; see prompt_context), in either cache.
+# With a semantic key, a similar earlier question's answer is reused before either is tried.
+def generate_text(prompt, semantic=None, priority=INTERACTIVE, cache=True):
+    memory.observe_prompt(prompt)
+    def compute():
+        gemini_response = llm_gateway.generate(prompt, priority)
+        return gemini_response.text.strip() if gemini_response.text else ''
+    def cached_compute():
+        if not cache:
+            return compute()
+        return gemini_cache.get_or_compute(prompt_key(prompt), compute, should_cache=bool)
+    semantic_cache = subsystems.get('semantic_cache') if semantic and cache else None
+    if semantic_cache:
+        return semantic_cache.get_or_compute(*semantic, cached_compute)
+    return cached_compute()
+
+# Streaming variant of generate_text: yields text chunks as Gemini produces them.
+# A cache hit is yielded as a single chunk; a completed stream fills the cache.
+def stream_text(prompt, semantic=None, cache=True):
+    memory.observe_prompt(prompt)
+    semantic_cache = subsystems.get('semantic_cache') if semantic and cache else None
+    key = prompt_key(prompt) if cache else None
+    cached = (semantic_cache.lookup(*semantic) if semantic_cache else None) or (key and gemini_cache.get(key))
+    if cached:
+        yield cached
+        return
+    start = time.perf_counter()
+    chunks = []
+    for chunk in llm_gateway.stream(prompt):
+        text = getattr(chunk, 'text', None)
+        if text:
+            chunks.append(text)
+            yield text
+    full_text = ''.join(chunks).strip()
+    if full_text:
+        if key:
+            gemini_cache.set(key, full_text)
+        if semantic_cache:
+            semantic_cache.store(*semantic, full_text, time.perf_counter() - start)
+
+def fetch_weather(city):
+    def compute():
+        params = {'q': city, 'appid': WEATHER_API_KEY, 'units': 'metric'}
+        return outbound.get('weather', 'http://api.openweathermap.org/data/2.5/weather', params=params).json()
+    return weather_cache.get_or_compute(city_key(city), compute, should_cache=lambda data: data.get('cod') == 200)
+
+def fetch_top_headlines(language='en', page_size=3):
+    return news_cache.get_or_compute(
+        params_key(language=language, page_size=page_size),
+        lambda: outbound.upstream('news').call(lambda: get_newsapi().get_top_headlines(language=language, page_size=page_size)),
+        should_cache=lambda top: top.get('status') == 'ok' and bool(top.get('articles'))
+    )
+
+# Apps and websites "open <name>" can launch, from APPS_CONFIG (apps.json next to app.py).
+# To add a website: "name": {"url": "https://example.com"}; to add an app: "win", "mac"
+# and "linux" launch commands. Optional keys: "aliases", "title", "search" (a URL with
+# {query}) and "browser" (opened on the Jarvis URL). The file is re-read when it changes.
+apps = AppRegistry(
+    os.getenv('APPS_CONFIG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'apps.json')),
+    min_similarity=float(os.getenv('APPS_FUZZY_SIMILARITY', '0.5'))
+)
+
+# Native apps are started detached and reaped in the background, so a request never
+# waits on the app; an app that dies right after starting is reported as an 'app' event
+def report_app_exit(launch):
+    if launch.failed:
+        event_bus.publish('app', {'app': launch.key, 'state': 'failed', 'returncode': launch.returncode,
+                                  'message': f"{launch.key} closed right after opening."}, user_id=launch.user_id)
+
+launcher = Launcher(early_exit=float(os.getenv('LAUNCH_EARLY_EXIT', '2')),
+                    kill_after=float(os.getenv('LAUNCH_KILL_AFTER', '5')), on_exit=report_app_exit)
+atexit.register(launcher.shutdown)
+
+# Intent router for /ask; handlers are registered below with @router.handler
+router = IntentRouter()
 
 # Store server port for URL retrieval
 JARVIS_PORT = None
@@ -180,97 +467,807 @@ def set_one_time_reminder(user_id, task, reminder_time_str):
         seconds_until = (parsed_time - now).total_seconds()
         if seconds_until < 0:
             return "Reminder time is in the past."
-        threading.Timer(seconds_until, lambda: send_notification(task)).start()
         formatted_time = parsed_time.strftime('%I:%M %p on %B %d, %Y')
-        c.execute("INSERT INTO reminders VALUES (?, ?, ?, ?)", (user_id, task, formatted_time, datetime.now()))
-        conn.commit()
+        due_at = int(parsed_time.timestamp())
+        reminder_id = storage.insert("INSERT INTO reminders (user_id, task, reminder_time, created_at, due_at) VALUES (?, ?, ?, ?, ?)",
+                                     (user_id, task, formatted_time, datetime.now(), due_at))
+        reminder_scheduler.add(reminder_id, user_id, task, due_at)
         return f"One-time reminder set for '{task}' at {formatted_time}."
     except ValueError:
         return "Invalid time format. Use '3pm', '11:00 AM tomorrow', etc."
 
-# Load reminders from SQLite on startup
-def load_reminders():
-    c.execute("SELECT user_id, task, reminder_time FROM reminders")
-    reminders = c.fetchall()
-    for user_id, task, reminder_time in reminders:
-        try:
-            parsed_time = parse(reminder_time, fuzzy=True, default=datetime.now())
-            now = datetime.now()
-            if parsed_time > now:
-                seconds_until = (parsed_time - now).total_seconds()
-                threading.Timer(seconds_until, lambda: send_notification(task)).start()
-                logger.debug(f"Loaded reminder: {task} at {reminder_time} for user {user_id}")
-        except ValueError:
-            logger.warning(f"Invalid reminder time format: {reminder_time}")
+# Set recurring reminder, e.g. "remind me to stretch every weekday at 9am"
+def set_recurring_reminder(user_id, clean_query, rule):
+    task = re.sub(r'^.*?(?:remind\s+(?:me\s+)?|set\s+reminder\s+(?:for\s+)?|reminder\s+(?:for\s+)?)', '', clean_query, flags=re.IGNORECASE)
+    task = re.sub(r'\s*\bevery\b.*$', '', task, flags=re.IGNORECASE).strip()
+    if not task:
+        return "Please specify the task (e.g., 'remind me to stretch every weekday at 9am')."
+    reminder_id = storage.insert("INSERT INTO recurring_reminders (user_id, task, rule, created_at) VALUES (?, ?, ?, ?)",
+                                 (user_id, task, str(rule), datetime.now()))
+    schedule_recurring_reminder(reminder_id, user_id, task, rule)
+    logger.debug("Recurring reminder scheduled: %s (%s)", task, rule)
+    return f"Recurring reminder set for '{task}' {rule.describe()}."
+
+# Deliver a due reminder to its user
+def deliver_reminder(user_id, task):
+    send_notification(task)
+    event_bus.publish('reminder', {'task': task, 'message': f"Reminder: {task}"}, user_id=user_id)
+
+# One scheduler thread fires all reminders; only the next REMINDER_WINDOW seconds are kept in memory
+reminder_scheduler = ReminderScheduler(storage, deliver_reminder, window=int(os.getenv('REMINDER_WINDOW', '3600')))
 
 # Task scheduling setup
 def run_daily_news():
-    if newsapi:
+    if get_newsapi():
         try:
-            top = newsapi.get_top_headlines(language='en', page_size=3)
+            top = fetch_top_headlines(language='en', page_size=3)
             if top['status'] == 'ok' and top['articles']:
                 headlines = [f"{article['title']} from {article['source']['name']}" for article in top['articles']]
                 response = f"Daily news: {' | '.join(headlines)}"
-                logger.debug(f"Scheduled news: {response}")
+                logger.debug("Scheduled news: %s", response)
                 send_notification(response)
+                event_bus.publish('daily_news', {'message': response, 'headlines': headlines})
                 return response
         except Exception as e:
-            logger.error(f"Scheduled news error: {str(e)}")
+            logger.error("Scheduled news error: %s", e)
     return "News API unavailable."
 
-schedule.every().day.at("08:00").do(run_daily_news)
+# Refresh the headlines cache shortly before it expires so news queries stay warm
+def warm_news_cache():
+    if get_newsapi():
+        key = params_key(language='en', page_size=3)
+        top = outbound.upstream('news').call(lambda: get_newsapi().get_top_headlines(language='en', page_size=3))
+        if top.get('status') == 'ok' and top.get('articles'):
+            news_cache.set(key, top)
+
+# Recurring user reminders ("every weekday at 9am") run as jobs named reminder:<id>
+def schedule_recurring_reminder(reminder_id, user_id, task, rule):
+    job_engine.schedule(f"reminder:{reminder_id}", lambda: deliver_reminder(user_id, task), rule=rule, exclusive=True)
+
+def load_recurring_reminders():
+    for reminder_id, user_id, task, rule in storage.fetchall("SELECT id, user_id, task, rule FROM recurring_reminders"):
+        try:
+            schedule_recurring_reminder(reminder_id, user_id, task, DailyAt.parse(rule))
+        except ValueError:
+            logger.error("Skipping recurring reminder %s with invalid rule '%s'", reminder_id, rule)
+
+# One engine thread runs every periodic job, sleeping until the next one is due;
+# exclusive jobs run in only one worker process per occurrence
+job_engine = JobEngine(claim=shared_state.claim)
+job_engine.daily(os.getenv('DAILY_NEWS_TIME', '08:00'), 'daily_news', run_daily_news, exclusive=True)
+job_engine.every(max(60, news_cache.ttl - 60), 'warm_news_cache', warm_news_cache,
+                 exclusive=not isinstance(cache_backend, MemoryCacheBackend))
+
+# sessions rows past HISTORY_MAX_ROWS per user or older than HISTORY_MAX_AGE_DAYS are
+# archived into compressed per-user, per-day blobs (still in /history/export), and
+# the pages they free go back to the disk a few at a time
+retention = SessionRetention(
+    storage,
+    max_rows=int(os.getenv('HISTORY_MAX_ROWS', '5000')),
+    max_age=float(os.getenv('HISTORY_MAX_AGE_DAYS', '90')) * 86400,
+    codec=os.getenv('HISTORY_ARCHIVE_CODEC') or None
+)
+HISTORY_VACUUM_PAGES = int(os.getenv('HISTORY_VACUUM_PAGES', '2000'))
+job_engine.daily(os.getenv('DB_MAINTENANCE_TIME', '03:00'), 'archive_history',
+                 lambda: retention.run(limit=int(os.getenv('HISTORY_ARCHIVE_BATCH', '200000')),
+                                       pages=HISTORY_VACUUM_PAGES), exclusive=True)
+job_engine.every(int(os.getenv('HISTORY_VACUUM_INTERVAL', '3600')), 'vacuum_database',
+                 lambda: retention.vacuum(HISTORY_VACUUM_PAGES), exclusive=True)
+job_engine.daily(os.getenv('DB_MAINTENANCE_TIME', '03:00'), 'compact_database', storage.compact, exclusive=True)
+
+# Index new sessions rows for history search, a bounded batch per run
+def index_history():
+    history = subsystems.get('history')
+    if history:
+        history.sync(limit=int(os.getenv('HISTORY_INDEX_BATCH', '5000')))
+
+job_engine.every(int(os.getenv('HISTORY_INDEX_INTERVAL', '30')), 'index_history', index_history)
+job_engine.every(float(os.getenv('APPS_RELOAD_INTERVAL', '2')), 'reload_apps', apps.reload)
+load_recurring_reminders()
+atexit.register(job_engine.shutdown)
 
-def run_continuously():
-    cease_continuous_run = threading.Event()
-    class ScheduleThread(threading.Thread):
-        @classmethod
-        def run(cls):
-            while not cease_continuous_run.is_set():
-                schedule.run_pending()
-                time.sleep(1)
-    continuous_thread = ScheduleThread()
-    continuous_thread.start()
-    return cease_continuous_run
+# Slow Gemini intents (multi-example code, notes) are answered in the background when
+# asked through the blocking /ask, so a proxy timeout can't kill the work. The reply
+# carries a job id for /jobs/<id>; the answer also arrives as a 'task' event.
+TASK_INTENTS = {name.strip() for name in os.getenv('TASK_INTENTS', 'code,note').split(',') if name.strip()}
 
-cease_run = run_continuously()
+def run_ask_task(payload):
+    return router.handle(payload['intent'], payload['clean_query'], payload['user_id'], payload['context'])
+
+# Every user who asked the same in-flight question gets the answer
+def finish_task(task, requests):
+    message = task['result'] if task['state'] == 'done' else f"Error processing query: {task['error']}."
+    for user_id, query in requests:
+        remember_turn(user_id, query, message)
+        event_bus.publish('task', {'id': task['id'], 'state': task['state'], 'title': query, 'message': message},
+                          user_id=user_id)
+
+task_queue = TaskQueue(
+    storage,
+    {'ask': run_ask_task},
+    on_finish=finish_task,
+    limits={'gemini': int(os.getenv('TASK_GEMINI_CONCURRENCY', '2'))},
+    lease=float(os.getenv('TASK_LEASE', '60'))
+)
+job_engine.daily(os.getenv('DB_MAINTENANCE_TIME', '03:00'), 'purge_tasks',
+                 lambda: task_queue.purge(int(os.getenv('TASK_RETENTION', str(7 * 86400)))), exclusive=True)
+# Unfinished tasks are re-queued once their lease expires, by the next start or another worker
+atexit.register(task_queue.shutdown, wait=False)
+
+def queue_ask(intent, clean_query, user_id, context):
+    """Queue an /ask intent; identical in-flight prompts share one task. Returns the reply body.
+
+    Standalone questions are prompted without context (see prompt_context), so
+    users asking the same one share a task; follow-ups carry their own context.
+    """
+    prompt = llm_prompt(intent, clean_query, context)
+    payload = {'intent': intent, 'clean_query': clean_query, 'user_id': user_id, 'context': context}
+    task_id, joined = task_queue.submit('ask', payload, dedup_key=prompt_key(prompt), upstream='gemini',
+                                        user_id=user_id, query=clean_query)
+    logger.debug("Queued %s as job %s%s", intent, task_id, ' (joined)' if joined else '')
+    return {'response': "Working on it. I'll post the answer here when it's ready.", 'job_id': task_id,
+            'status_url': f"/jobs/{task_id}"}
 
 # Wake word detection setup
-def listen_for_wake_word():
-    if not PICOVOICE_ACCESS_KEY:
-        logger.warning("PICOVOICE_ACCESS_KEY not set. Wake word detection disabled.")
+# Detections are handled on the listener's dispatcher thread, off the audio loop.
+# With WAKE_WORD_CLIP_SECONDS set, the audio around each detection is saved as a WAV.
+def on_wake_word(event):
+    logger.info("Wake word 'JARVIS' detected")
+    event_bus.publish('wake_word', {'keyword_index': event.keyword_index, 'time': event.timestamp})
+    clip_seconds = float(os.getenv('WAKE_WORD_CLIP_SECONDS', '0'))
+    listener = subsystems.get('wake_word')
+    if clip_seconds <= 0 or not listener:
+        return
+    samples = listener.audio_after(event, clip_seconds, before=0.5, timeout=clip_seconds + 1)
+    path = os.path.join(os.getenv('WAKE_WORD_CLIP_DIR', '.'), f"wake_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
+    with wave.open(path, 'wb') as clip:
+        clip.setnchannels(1)
+        clip.setsampwidth(2)
+        clip.setframerate(listener.engine.sample_rate)
+        clip.writeframes(samples.tobytes())
+    logger.debug("Wake word clip saved: %s", path)
+
+def start_wake_word_listener():
+    listener = subsystems.get('wake_word')
+    if not listener:
+        logger.warning("Wake word detection disabled: %s", subsystems.error('wake_word') or 'PICOVOICE_ACCESS_KEY not set')
         return False
+    return listener.start()
+
+# Gemini prompt builders, shared by the blocking and streaming /ask paths
+def note_topic(clean_query):
+    return re.sub(r'(generate\s+)?note\s*', '', clean_query, flags=re.IGNORECASE).strip() or 'general note'
+
+def note_prompt(clean_query, context):
+    topic = note_topic(clean_query)
+    logger.debug("Note topic parsed: %s", topic)
+    prompt = f"Summarize key information about {topic} in a concise note format."
+    if context:
+        prompt += f"\nContext: {context}"
+    return prompt
+
+def parse_code_request(clean_query):
+    match = re.search(r'(write\s+a\s+program|code\s+in|give\s+me\s+a\s+code)\s+(java|python|javascript|c\+\+|c#)\s*(.*)', clean_query, re.IGNORECASE)
+    language = match.group(2).lower() if match else 'python'
+    code_topic = (match.group(3).strip() if match else '') or 'hello world'
+    logger.debug("Code language: %s, Topic: %s", language, code_topic)
+    return language, code_topic
 
-    porcupine = None
-    pa = None
-    audio_stream = None
+def code_prompt(language, code_topic, context):
+    prompt = f"""
+Provide a comprehensive and educational response for writing a {language} program for '{code_topic}'. Include:
+1. At least three distinct code examples, showcasing different approaches or variations.
+2. Detailed explanation for each example, covering syntax, key components, logic, and use cases.
+3. Step-by-step instructions for compiling and running each example.
+4. Relevant best practices for {language} programming.
+5. Additional insights or tips.
+Format code in ```{language}``` blocks.
+"""
+    if context:
+        prompt += f"\nContext: {context}"
+    return prompt
+
+def fallback_prompt(clean_query, context):
+    prompt = f"Summarize key information about {clean_query} in a concise format."
+    if context:
+        prompt += f"\nContext: {context}"
+    return prompt
+
+# Prompt for intents answered by Gemini; None for intents handled locally
+def llm_prompt(intent, clean_query, context):
+    context = prompt_context(clean_query, context)
+    if intent == 'note':
+        return note_prompt(clean_query, context)
+    if intent == 'code':
+        language, code_topic = parse_code_request(clean_query)
+        return code_prompt(language, code_topic, context)
+    if intent == 'fallback':
+        return fallback_prompt(clean_query, context)
+    return None
+
+# Intent handlers
+# Each handler is bound to an intent declared in intents.py and returns the response text.
+@router.handler('jarvis_url')
+def handle_jarvis_url(clean_query, user_id, context):
+    # Get the current port from the Flask app context or use stored port
+    # (async mode runs local handlers outside a Flask request)
+    environ = request.environ if has_request_context() else {}
+    port = JARVIS_PORT or environ.get('SERVER_PORT', '5000')
+    host = environ.get('SERVER_NAME', JARVIS_HOST)
+    if host == '0.0.0.0':
+        host = JARVIS_HOST
+    jarvis_url = f"http://{host}:{port}"
+    response = f"JARVIS is running at: {jarvis_url}\n\nTo access JARVIS, open this URL in your browser:\n{jarvis_url}"
+    logger.info("🌐 JARVIS URL: %s", jarvis_url)
+    return response
+
+@router.handler('time')
+def handle_time(clean_query, user_id, context):
+    response = f"The current time is {datetime.now().strftime('%I:%M %p')} (IST, {datetime.now().strftime('%B %d, %Y')})."
+    logger.debug("Time query response: %s", response)
+    return response
+
+@router.handler('date')
+def handle_date(clean_query, user_id, context):
+    response = f"Today's date is {datetime.now().strftime('%B %d, %Y')}."
+    logger.debug("Date query response: %s", response)
+    return response
+
+@router.handler('toggle_notebook')
+def handle_toggle_notebook(clean_query, user_id, context):
+    response = "Toggling notebook visibility."
+    logger.debug("Notebook toggle command received")
+    return response
+
+@router.handler('clear_notebook')
+def handle_clear_notebook(clean_query, user_id, context):
+    response = "Clearing notebook content."
+    logger.debug("Notebook clear command received")
+    return response
+
+@router.handler('show_reminders')
+def handle_show_reminders(clean_query, user_id, context):
+    reminders = storage.fetchall("SELECT task, reminder_time FROM reminders WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
+    reminders += [(task, DailyAt.parse(rule).describe())
+                  for task, rule in storage.fetchall("SELECT task, rule FROM recurring_reminders WHERE user_id = ? ORDER BY created_at DESC", (user_id,))]
+    if not reminders:
+        response = "No reminders found."
+    else:
+        reminder_list = [f"{task} {time}" if time.startswith('every ') else f"{task} at {time}" for task, time in reminders]
+        response = "Your reminders:\n" + "\n".join(reminder_list)
+    logger.debug("Show reminders response: %s", response)
+    return response
+
+@router.handler('delete_reminder')
+def handle_delete_reminder(clean_query, user_id, context):
+    task = re.sub(r'delete\s+my\s+reminder\s*', '', clean_query, flags=re.IGNORECASE).strip()
+    if not task:
+        response = "Please specify the task to delete (e.g., 'delete my lecture reminder')."
+    else:
+        rows = storage.fetchall("SELECT id FROM reminders WHERE user_id = ? AND task = ?", (user_id, task))
+        deleted = storage.execute("DELETE FROM reminders WHERE user_id = ? AND task = ?", (user_id, task))
+        for (reminder_id,) in rows:
+            reminder_scheduler.cancel(reminder_id)
+        recurring = storage.fetchall("SELECT id FROM recurring_reminders WHERE user_id = ? AND task = ?", (user_id, task))
+        deleted += storage.execute("DELETE FROM recurring_reminders WHERE user_id = ? AND task = ?", (user_id, task))
+        for (reminder_id,) in recurring:
+            job_engine.cancel(f"reminder:{reminder_id}")
+        if deleted > 0:
+            response = f"Reminder for '{task}' deleted."
+        else:
+            response = f"No reminder found for '{task}'."
+        logger.debug("Delete reminder response: %s", response)
+    return response
+
+@router.handler('set_reminder')
+def handle_set_reminder(clean_query, user_id, context):
+    rule = parse_recurrence(clean_query)
+    if rule:
+        return set_recurring_reminder(user_id, clean_query, rule)
     try:
-        porcupine = pvporcupine.create(access_key=PICOVOICE_ACCESS_KEY, keywords=['jarvis'])
-        pa = pyaudio.PyAudio()
-        audio_stream = pa.open(
-            rate=porcupine.sample_rate,
-            channels=1,
-            format=pyaudio.paInt16,
-            input=True,
-            frames_per_buffer=porcupine.frame_length
-        )
-        logger.debug("Listening for wake word 'JARVIS'...")
-        while True:
-            pcm = audio_stream.read(porcupine.frame_length, exception_on_overflow=False)
-            pcm = struct.unpack_from("h" * porcupine.frame_length, pcm)
-            keyword_index = porcupine.process(pcm)
-            if keyword_index >= 0:
-                logger.debug("Wake word 'JARVIS' detected")
-                return True
+        time_match = re.search(r'(?:at\s+)?(\d{1,2}(?::\d{2})?\s*(am|pm)?(?:\s+tomorrow)?)', clean_query, re.IGNORECASE)
+        task_match = re.search(r'(?:remind\s+(?:me\s+)?|set\s+reminder|reminder\s+(?:for\s+)?)(.+?)(?:\s+at\s+\d|\s*$)', clean_query, re.IGNORECASE)
+        task = task_match.group(1).strip() if task_match else re.sub(r'(remind\s+(?:me\s+)?|set\s+reminder|reminder\s+(?:for\s+)?).*', '', clean_query, flags=re.IGNORECASE).strip()
+
+        if not time_match:
+            response = "Please specify a time (e.g., 'set reminder for meeting at 3pm')."
+        else:
+            reminder_time_str = time_match.group(0).strip()
+            if 'tomorrow' in clean_query.lower():
+                parsed_time = parse(reminder_time_str, fuzzy=True, default=datetime.now() + timedelta(days=1))
+            else:
+                parsed_time = parse(reminder_time_str, fuzzy=True, default=datetime.now())
+                # If time is past today, assume tomorrow
+                if parsed_time < datetime.now():
+                    parsed_time += timedelta(days=1)
+            formatted_time = parsed_time.strftime('%I:%M %p on %B %d, %Y')
+            response = set_one_time_reminder(user_id, task, formatted_time)
+            logger.debug("Reminder scheduled: %s at %s", task, formatted_time)
     except Exception as e:
-        logger.error(f"Wake word detection error: {str(e)}")
-        return False
-    finally:
-        if audio_stream:
-            audio_stream.close()
-        if pa:
-            pa.terminate()
-        if porcupine:
-            porcupine.delete()
+        response = f"Error setting reminder: {str(e)}. Try: 'set reminder for meeting at 3pm tomorrow'."
+        logger.error("Reminder parsing error: %s", e)
+    return response
+
+@router.handler('sleep')
+def handle_sleep(clean_query, user_id, context):
+    system = platform.system().lower()
+    if system == 'windows':
+        try:
+            subprocess.run(['rundll32.exe', 'powrprof.dll,SetSuspendState', '0,1,0'], check=True)
+            response = "System is entering sleep mode."
+            logger.debug("Sleep command executed")
+        except Exception as e:
+            response = f"Error putting system to sleep: {str(e)}"
+            logger.error("Sleep error: %s", e)
+    elif system == 'darwin':
+        try:
+            subprocess.run(['pmset', 'sleepnow'], check=True)
+            response = "System is entering sleep mode."
+            logger.debug("Sleep command executed")
+        except Exception as e:
+            response = f"Error putting system to sleep: {str(e)}"
+            logger.error("Sleep error: %s", e)
+    else:
+        response = "Sleep command not supported on Linux."
+        logger.warning("Sleep command attempted on Linux")
+    return response
+
+@router.handler('restart')
+def handle_restart(clean_query, user_id, context):
+    system = platform.system().lower()
+    if system != 'windows':
+        response = "Restart command only supported on Windows."
+        logger.warning("Restart command attempted on non-Windows system")
+    else:
+        try:
+            subprocess.run(['shutdown', '/r', '/t', '0'], check=True)
+            response = "System is restarting."
+            logger.debug("Restart command executed")
+        except Exception as e:
+            response = f"Error restarting system: {str(e)}"
+            logger.error("Restart error: %s", e)
+    return response
+
+@router.handler('shutdown')
+def handle_shutdown(clean_query, user_id, context):
+    system = platform.system().lower()
+    if system != 'windows':
+        response = "Shutdown command only supported on Windows."
+        logger.warning("Shutdown command attempted on non-Windows system")
+    else:
+        try:
+            subprocess.run(['shutdown', '/s', '/t', '0'], check=True)
+            response = "System is shutting down."
+            logger.debug("Shutdown command executed")
+        except Exception as e:
+            response = f"Error shutting down system: {str(e)}"
+            logger.error("Shutdown error: %s", e)
+    return response
+
+@router.handler('lock')
+def handle_lock(clean_query, user_id, context):
+    system = platform.system().lower()
+    if system != 'windows':
+        response = "Lock command only supported on Windows."
+        logger.warning("Lock command attempted on non-Windows system")
+    else:
+        try:
+            ctypes.windll.user32.LockWorkStation()
+            response = "System is locked."
+            logger.debug("Lock command executed")
+        except Exception as e:
+            response = f"Error locking system: {str(e)}"
+            logger.error("Lock error: %s", e)
+    return response
+
+@router.handler('url')
+def handle_url(clean_query, user_id, context):
+    # Direct URL opening: "open https://example.com" or "open www.example.com"
+    url_match = re.search(r'(?:https?://|www\.)[^\s]+', clean_query, re.IGNORECASE)
+    if url_match:
+        url = url_match.group(0)
+        if not url.startswith('http://') and not url.startswith('https://'):
+            url = 'https://' + url
+        try:
+            webbrowser.open(url)
+            logger.info("🌐 Opening direct URL: %s", url)
+            response = f"Opening {url} in browser."
+        except Exception as e:
+            response = f"Error opening URL: {str(e)}"
+            logger.error("Error opening URL: %s", e)
+    else:
+        response = "Invalid URL format. Use 'open https://example.com' or 'open www.example.com'."
+    return response
+
+# "how close is the moon" or "quit smoking" names no app, so it goes to the fallback
+@router.guard('close')
+def names_known_app(query):
+    return apps.find_around(query, CLOSE_VERB)[0] is not None
+
+@router.handler('open')
+def handle_open(clean_query, user_id, context):
+    # Support variants like "open chrome", "chrome kholo", "kholo chrome", and misheard names like "open crome"
+    app_name, extra_query, after = apps.find_around(clean_query, OPEN_VERB)
+
+    if not app_name and after.split():
+        response = f"Application or website '{after.split()[0].lower()}' not supported."
+        logger.warning("Unsupported app/website: %s", clean_query)
+    elif not app_name:
+        response = "Invalid open command format. Use 'open <app/website> [optional query]'."
+        logger.warning("Invalid open command format: %s", clean_query)
+    else:
+        logger.debug("App name parsed: %s, Extra query: %s", app_name, extra_query)
+        entry = apps.get(app_name)
+        try:
+            if 'url' in entry:
+                if extra_query and entry.get('search'):
+                    url_to_open = entry['search'].format(query=extra_query.replace(' ', '+'))
+                    response = f"Opening {entry.get('title', app_name)} and searching for '{extra_query}'."
+                else:
+                    # For websites, fall back to opening the configured URL
+                    url_to_open = entry['url']
+                    response = f"Opening {app_name} in browser."
+                webbrowser.open(url_to_open)
+                logger.info("🌐 Opening URL: %s", url_to_open)
+            elif apps.command(app_name) is None:
+                response = f"I don't know how to open {app_name} on {platform.system()}."
+                logger.warning("No %s launch command for %s", platform.system(), app_name)
+            else:
+                # Native app launch; browsers open on the JARVIS URL
+                app_command, shell = apps.command(app_name)
+                jarvis_url_to_open = f"http://localhost:{JARVIS_PORT}" if entry.get('browser') and JARVIS_PORT else None
+                if jarvis_url_to_open:
+                    app_command = [app_command, jarvis_url_to_open] if shell else app_command + [jarvis_url_to_open]
+                    response = f"Opening {app_name} with JARVIS interface at {jarvis_url_to_open}."
+                else:
+                    response = f"Opening {app_name}."
+                launcher.launch(app_name, app_command, shell=shell, user_id=user_id)
+                logger.info("🚀 Opening app: %s with command: %s", app_name, app_command)
+            logger.debug("Successfully opened %s", app_name)
+        except Exception as e:
+            response = f"Error opening {app_name}: {str(e)}"
+            logger.error("Error opening %s: %s", app_name, e)
+    return response
+
+@router.handler('close')
+def handle_close(clean_query, user_id, context):
+    app_name = apps.find_around(clean_query, CLOSE_VERB)[0]
+    entry = apps.get(app_name) if app_name else None
+    if not entry:
+        return "Which app should I close?"
+    if launcher.close(user_id, app_name):
+        logger.info("🛑 Closing app: %s", app_name)
+        return f"Closing {app_name}."
+    # 'open -a' hands the app to the system and exits, so ask the app itself to quit
+    if platform.system() == 'Darwin' and entry.get('mac'):
+        try:
+            launcher.launch(f"close:{app_name}", ['osascript', '-e', f'quit app "{entry["mac"]}"'], user_id=user_id)
+            return f"Closing {app_name}."
+        except OSError as e:
+            logger.error("Error closing %s: %s", app_name, e)
+    if 'url' in entry:
+        return f"I can't close {app_name}; close its browser tab instead."
+    return f"{app_name} isn't running, or wasn't opened by me."
+
+@router.handler('whatsapp_message')
+def handle_whatsapp_message(clean_query, user_id, context):
+    # Command: "send a whatsapp message to [number] saying [message]"
+    match = re.search(r'whatsapp message to\s+([\d\s\+]+?)\s+saying\s+(.*)', clean_query, re.IGNORECASE)
+    if match:
+        phone_number = re.sub(r'\s+', '', match.group(1)) # Remove spaces from number
+        message_text = match.group(2).strip()
+
+        # Basic validation for phone number (e.g., starts with + and has digits)
+        if not re.match(r'^\+?\d+$', phone_number):
+            response = f"Invalid phone number format: {phone_number}. Please include the country code."
+        else:
+            url = f"https://web.whatsapp.com/send?phone={phone_number}&text={requests.utils.quote(message_text)}"
+            webbrowser.open(url)
+            response = f"Opening WhatsApp to send a message to {phone_number}. The message box will be focused; press Enter to send."
+    else:
+        response = "I couldn't understand the phone number or message. Please say, 'send a whatsapp message to [phone number with country code] saying [your message]'."
+    return response
+
+# Weather and news replies, shared by the threaded handlers and the async serving mode
+def parse_weather_city(clean_query):
+    city_match = re.search(r'(?:weather|was the weather)\s*(?:in)?\s*([\w\s]+)', clean_query, re.IGNORECASE)
+    city = city_match.group(1).strip() if city_match else 'Delhi'
+    logger.debug("City parsed: %s", city)
+    return city
+
+def weather_reply(city, data):
+    if data.get('cod') != 200:
+        logger.error("Weather API error for %s: %s (cod: %s)", city, data.get('message', 'No detail'), data.get('cod'))
+        return f"Weather error: {data.get('message', 'City not found')} (cod: {data.get('cod')})"
+    response = f"Weather in {data['name']}: {data['main']['temp']}°C, {data['weather'][0]['description']}."
+    logger.debug("Weather response for %s: %s", city, response)
+    return response
+
+def headlines_reply(top):
+    if top['status'] != 'ok' or not top['articles']:
+        logger.warning("No news articles found")
+        return "No news available."
+    headlines = [f"{article['title']} from {article['source']['name']}" for article in top['articles']]
+    response = f"Top headlines: {' | '.join(headlines)}"
+    logger.debug("News response: %s", response)
+    return response
+
+@router.handler('weather')
+def handle_weather(clean_query, user_id, context):
+    if not WEATHER_API_KEY:
+        response = "Weather API key not configured."
+        logger.warning("Weather API key missing")
+    else:
+        city = parse_weather_city(clean_query)
+        try:
+            response = weather_reply(city, fetch_weather(city))
+        except Exception as e:
+            response = f"Error fetching weather: {str(e)}"
+            logger.error("Weather API error: %s", e)
+    return response
+
+@router.handler('news')
+def handle_news(clean_query, user_id, context):
+    if not get_newsapi():
+        response = "News API key not configured."
+        logger.warning("News API key missing")
+    else:
+        try:
+            response = headlines_reply(fetch_top_headlines(language='en', page_size=3))
+        except Exception as e:
+            response = f"Error fetching news: {str(e)}"
+            logger.error("News API error: %s", e)
+    return response
+
+@router.handler('volume')
+def handle_volume(clean_query, user_id, context):
+    audio = subsystems.get('volume')
+    if platform.system() != 'Windows':
+        response = "Volume control only supported on Windows."
+        logger.warning("Volume control attempted on non-Windows system")
+    elif not audio:
+        response = f"Volume control unavailable: {subsystems.error('volume')}"
+        logger.error(response)
+    else:
+        try:
+            audio.pythoncom.CoInitialize()
+            level_str = re.search(r'\d+', clean_query)
+            level = int(level_str.group()) / 100 if level_str else 0.5
+            logger.debug("Volume level parsed: %s", level)
+            devices = audio.AudioUtilities.GetSpeakers()
+            interface = devices.Activate(audio.IAudioEndpointVolume._iid_, audio.CLSCTX_ALL, None)
+            volume = audio.cast(interface, audio.POINTER(audio.IAudioEndpointVolume))
+            volume.SetMasterVolumeLevelScalar(min(max(level, 0.0), 1.0), None)
+            response = f"Volume set to {int(level * 100)}%."
+            logger.debug("Volume set to %s", level)
+        except Exception as e:
+            response = f"Error setting volume: {str(e)}. Ensure you're on Windows and try again."
+            logger.error("Volume control error: %s", e)
+        finally:
+            audio.pythoncom.CoUninitialize()
+    return response
+
+@router.handler('brightness')
+def handle_brightness(clean_query, user_id, context):
+    sbc = subsystems.get('brightness')
+    if not sbc:
+        response = f"Brightness control unavailable: {subsystems.error('brightness')}"
+        logger.error(response)
+        return response
+    try:
+        level_str = re.search(r'\d+', clean_query)
+        level = int(level_str.group()) if level_str else 50
+        logger.debug("Brightness level parsed: %s", level)
+        sbc.set_brightness(level)
+        response = f"Brightness set to {level}%."
+        logger.debug("Brightness set to %s", level)
+    except Exception as e:
+        response = f"Error setting brightness: {str(e)}"
+        logger.error("Brightness control error: %s", e)
+    return response
+
+@router.handler('camera')
+def handle_camera(clean_query, user_id, context):
+    camera = subsystems.get('camera')
+    if not camera:
+        response = f"Camera unavailable: {subsystems.error('camera')}"
+        logger.error(response)
+    elif camera.active:
+        response = "Camera is already active."
+        logger.warning("Camera already active")
+    else:
+        try:
+            # CAMERA_DISPLAY=0 skips the OpenCV window; frames are still served at /camera/stream
+            camera.start(display=os.getenv('CAMERA_DISPLAY', '1') != '0')
+            response = "Camera opened. Press 'c' to capture, 'q' to quit."
+            logger.debug("Camera command initiated")
+        except Exception as e:
+            response = f"Error opening camera: {str(e)}"
+            logger.error("Camera error: %s", e)
+    return response
+
+@router.handler('note')
+def handle_note(clean_query, user_id, context):
+    if not get_model():
+        response = "Note generation unavailable without Gemini API key."
+        logger.warning("Note generation attempted without Gemini API key")
+    else:
+        try:
+            context = prompt_context(clean_query, context)
+            prompt = note_prompt(clean_query, context)
+            text = generate_text(prompt, semantic_key('note', clean_query), priority=BULK, cache=not context)
+            if not text:
+                response = "No response received from Gemini for note generation."
+                logger.warning("Gemini returned an empty response for note.")
+            else:
+                response = text
+                logger.debug("Note generated: %s...", response[:100])
+        except Exception as e:
+            response = f"Error generating note: {str(e)}. Check GEMINI_API_KEY or API quotas."
+            logger.error("Note generation error: %s", e)
+    return response
+
+@router.handler('code')
+def handle_code(clean_query, user_id, context):
+    if not get_model():
+        response = "Code generation unavailable without Gemini API key."
+        logger.warning("Code generation attempted without Gemini API key")
+    else:
+        try:
+            language, code_topic = parse_code_request(clean_query)
+            context = prompt_context(clean_query, context)
+            prompt = code_prompt(language, code_topic, context)
+            text = generate_text(prompt, priority=BULK, cache=not context)
+            if not text:
+                response = f"No {language} code example received from Gemini."
+                logger.warning("Gemini returned an empty response for %s code.", language)
+            else:
+                response = text
+                logger.debug("%s code generated: %s...", language.capitalize(), response[:100])
+        except Exception as e:
+            response = f"Error generating {language} code: {str(e)}."
+            logger.error("Code generation error: %s", e)
+    return response
+
+@router.handler('fallback')
+def handle_fallback(clean_query, user_id, context):
+    if get_model():
+        try:
+            logger.debug("Sending to Gemini: '%s'", clean_query)
+            context = prompt_context(clean_query, context)
+            prompt = fallback_prompt(clean_query, context)
+            text = generate_text(prompt, semantic_key('fallback', clean_query), cache=not context)
+            if not text:
+                response = "No response received from Gemini."
+                logger.warning("Gemini returned an empty response.")
+            else:
+                response = text
+                logger.debug("Gemini response: %s...", response[:100])
+        except Exception as e:
+            response = f"Error processing query: {str(e)}."
+            logger.error("Gemini error: %s", e)
+    else:
+        response = "General query support unavailable. Please check GEMINI_API_KEY."
+        logger.error("Gemini model unavailable.")
+    return response
+
+
+WAKE_WORDS = re.compile(r'^(how\s+can\s+i\s+help\s+you\s+today\??\s*)?(?:(?:hey|ok|jarvis)\b[,.\s]*)+', re.IGNORECASE)
+# Sentence ends; a dot inside "www.google.com" or "2.5" doesn't split
+SENTENCE_END = re.compile(r'[.!?]+(?:\s+|$)')
+# Jarvis's own greeting, picked up by the microphone
+GREETING_ECHO = re.compile(r'^how\s+can\s+i\s+help\s+you\s+today$', re.IGNORECASE)
+
+# Commands of a compound utterance in order, with wake words ("Jarvis,", "Hey Jarvis") stripped:
+# "what's the weather in pune. show top headlines" -> ["what's the weather in pune", "show top headlines"]
+def split_commands(query):
+    commands = []
+    for sentence in SENTENCE_END.split(query):
+        command = WAKE_WORDS.sub('', sentence.strip()).strip()
+        if command and not GREETING_ECHO.match(command):
+            commands.append(command)
+    if not commands:
+        last_attempt = re.findall(r'\b\w+\b$', query, re.IGNORECASE)
+        commands = [last_attempt[0] if last_attempt else query]
+    logger.debug("Cleaned commands: %s", commands)
+    return commands
+
+# One command from an utterance: its last sentence (each /ask/batch entry is one command)
+def clean_user_query(query):
+    return split_commands(query)[-1]
+
+# Intents that only wait on an upstream (weather, news, Gemini) run concurrently within a
+# compound query; the rest (apps, volume, reminders) run one after another in spoken order
+CONCURRENT_INTENTS = {'weather', 'news', 'note', 'code', 'fallback'}
+batch_pool = ThreadPoolExecutor(max_workers=int(os.getenv('BATCH_WORKERS', '8')), thread_name_prefix='ask-batch')
+
+def run_command(command, intent, user_id, wait=True):
+    """Answer one command of a batch; the result carries its own timing."""
+    start = time.perf_counter()
+    result = {'query': command, 'intent': intent}
+    try:
+        context = load_context(user_id, command)
+        if intent in TASK_INTENTS and not wait and get_model():
+            result.update(queue_ask(intent, command, user_id, context))
+        else:
+            result['response'] = router.handle(intent, command, user_id, context)
+    except Exception as e:
+        logger.error("Error processing '%s': %s", command, e)
+        result['error'] = f"Error processing request: {str(e)}"
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+def iter_commands(commands, user_id, wait=True):
+    """Yield each command's result in order as soon as it and every earlier one is ready."""
+    intents = [router.match(command) for command in commands]
+    # Each command runs in a copy of this context so its spans join the request's trace
+    futures = {i: batch_pool.submit(contextvars.copy_context().run, run_command, command, intent, user_id, wait)
+               for i, (command, intent) in enumerate(zip(commands, intents))
+               if intent in CONCURRENT_INTENTS and len(commands) > 1}
+    for i, (command, intent) in enumerate(zip(commands, intents)):
+        result = futures[i].result() if i in futures else run_command(command, intent, user_id, wait)
+        # Queued jobs are remembered when they finish
+        if 'response' in result and 'job_id' not in result:
+            remember_turn(user_id, command, result['response'])
+        yield result
+
+# /ask/batch body -> ({'commands', 'user_id', 'wait'}, None) or (None, error message)
+def parse_batch(data):
+    if isinstance(data, list):
+        data = {'queries': data}
+    queries = data.get('queries') if isinstance(data, dict) else None
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+        return None, 'Provide a non-empty JSON array of queries'
+    max_commands = int(os.getenv('BATCH_MAX_COMMANDS', '10'))
+    if len(queries) > max_commands:
+        return None, f"At most {max_commands} queries per batch"
+    commands = [clean_user_query(q.lower().strip()) for q in queries]
+    return {'commands': commands, 'user_id': data.get('user_id', 'user1'), 'wait': bool(data.get('wait'))}, None
+
+def merge_results(results):
+    return '\n\n'.join(result.get('response') or result.get('error', '') for result in results)
+
+# Conversation context for Gemini prompts: recent turns plus a rolling summary,
+# and with a query, the user's older turns most similar to it
+def load_context(user_id, query=None):
+    context = memory.context(user_id)
+    related = related_turns(user_id, query) if query else ''
+    if related:
+        context = f"{context}\n{related}" if context else related
+    if context:
+        logger.debug("Retrieved context: %s...", context[:100])
+    return context
+
+def related_turns(user_id, query):
+    history = subsystems.get('history')
+    if not history:
+        return ''
+    try:
+        # The newest turns are already in the context verbatim
+        matches = history.search(user_id, query, k=int(os.getenv('HISTORY_RELATED_TURNS', '2')),
+                                 skip_latest=memory.recent_turns,
+                                 min_score=float(os.getenv('HISTORY_MIN_SCORE', '0.5')))
+    except Exception as e:
+        logger.error("History search error: %s", e)
+        return ''
+    if not matches:
+        return ''
+    turns = [f"User: {clip(match['query'] or '', 48)}\nJarvis: {clip(match['response'] or '', 96)}" for match in matches]
+    return "Related earlier conversation:\n" + '\n'.join(turns)
+
+# Log a finished turn to sessions and the user's conversation memory
+def remember_turn(user_id, query, response):
+    storage.log_session(user_id, query, response, datetime.now())
+    memory.record(user_id, query, response)
+
+# Server-Sent Events helpers
+def sse_event(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # Routes
 @app.route('/')
@@ -286,475 +1283,29 @@ def ask():
 
     query = data.get('query', '').lower().strip()
     user_id = data.get('user_id', 'user1')
-    logger.debug(f"Raw query received: {query} (user: {user_id})")
+    logger.debug("Raw query received: %s (user: %s)", query, user_id)
 
     try:
-        # Enhanced cleaning to handle "Jarvis," or "Hey Jarvis"
-        clean_query = re.sub(r'^(how\s+can\s+i\s+help\s+you\s+today\??\s*)?(hey|ok|jarvis)\s*[,.\s]*(hey\s+jarvis[,.\s]*)*', '', query, flags=re.IGNORECASE).strip()
-        commands = [cmd.strip() for cmd in re.split(r'[.!?]', clean_query) if cmd.strip()]
-        clean_query = commands[-1] if commands else clean_query
-        if not clean_query:
-            last_attempt = re.findall(r'\b\w+\b$', query, re.IGNORECASE)
-            clean_query = last_attempt[0] if last_attempt else query
-        logger.debug(f"Cleaned query: {clean_query}")
-
-        context = ""
-        if 'what was' in clean_query or 'previous' in clean_query:
-            c.execute("SELECT query, response FROM sessions WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1", (user_id,))
-            prev = c.fetchone()
-            if prev:
-                context = f"Previous query: {prev[0]}\nPrevious response: {prev[1]}"
-                logger.debug(f"Retrieved context: {context[:100]}...")
-
-        # Handle commands
-        if any(k in clean_query for k in ['jarvis url', 'jarvis link', 'my url', 'my link', 'web url', 'server url', 'local url']):
-            # Get the current port from the Flask app context or use stored port
-            port = JARVIS_PORT or request.environ.get('SERVER_PORT', '5000')
-            host = request.environ.get('SERVER_NAME', JARVIS_HOST)
-            if host == '0.0.0.0':
-                host = JARVIS_HOST
-            jarvis_url = f"http://{host}:{port}"
-            response = f"JARVIS is running at: {jarvis_url}\n\nTo access JARVIS, open this URL in your browser:\n{jarvis_url}"
-            logger.info(f"🌐 JARVIS URL: {jarvis_url}")
-        elif 'time' in clean_query:
-            response = f"The current time is {datetime.now().strftime('%I:%M %p')} (IST, {datetime.now().strftime('%B %d, %Y')})."
-            logger.debug(f"Time query response: {response}")
-        elif 'date' in clean_query:
-            response = f"Today's date is {datetime.now().strftime('%B %d, %Y')}."
-            logger.debug(f"Date query response: {response}")
-        elif 'toggle notebook' in clean_query:
-            response = "Toggling notebook visibility."
-            logger.debug("Notebook toggle command received")
-        elif 'clear notebook' in clean_query:
-            response = "Clearing notebook content."
-            logger.debug("Notebook clear command received")
-        elif 'show my reminders' in clean_query:
-            c.execute("SELECT task, reminder_time FROM reminders WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-            reminders = c.fetchall()
-            if not reminders:
-                response = "No reminders found."
-            else:
-                reminder_list = [f"{task} at {time}" for task, time in reminders]
-                response = "Your reminders:\n" + "\n".join(reminder_list)
-            logger.debug(f"Show reminders response: {response}")
-        elif 'delete my' in clean_query and 'reminder' in clean_query:
-            task = re.sub(r'delete\s+my\s+reminder\s*', '', clean_query, flags=re.IGNORECASE).strip()
-            if not task:
-                response = "Please specify the task to delete (e.g., 'delete my lecture reminder')."
-            else:
-                c.execute("DELETE FROM reminders WHERE user_id = ? AND task = ?", (user_id, task))
-                conn.commit()
-                if c.rowcount > 0:
-                    response = f"Reminder for '{task}' deleted."
-                else:
-                    response = f"No reminder found for '{task}'."
-                logger.debug(f"Delete reminder response: {response}")
-        elif any(re.search(pattern, clean_query, re.IGNORECASE) for pattern in [
-            r'\b(remind\s+(?:me\s+)?|set\s+reminder|reminder\s+(?:for\s+)?)\b',
-            r'\b(meeting|lecture|call|task|appointment)\s+(?:reminder|at)\b'
-        ]):
-            try:
-                time_match = re.search(r'(?:at\s+)?(\d{1,2}(?::\d{2})?\s*(am|pm)?(?:\s+tomorrow)?)', clean_query, re.IGNORECASE)
-                task_match = re.search(r'(?:remind\s+(?:me\s+)?|set\s+reminder|reminder\s+(?:for\s+)?)(.+?)(?:\s+at\s+\d|\s*$)', clean_query, re.IGNORECASE)
-                task = task_match.group(1).strip() if task_match else re.sub(r'(remind\s+(?:me\s+)?|set\s+reminder|reminder\s+(?:for\s+)?).*', '', clean_query, flags=re.IGNORECASE).strip()
-                
-                if not time_match:
-                    response = "Please specify a time (e.g., 'set reminder for meeting at 3pm')."
-                else:
-                    reminder_time_str = time_match.group(0).strip()
-                    if 'tomorrow' in clean_query.lower():
-                        parsed_time = parse(reminder_time_str, fuzzy=True, default=datetime.now() + timedelta(days=1))
-                    else:
-                        parsed_time = parse(reminder_time_str, fuzzy=True, default=datetime.now())
-                        # If time is past today, assume tomorrow
-                        if parsed_time < datetime.now():
-                            parsed_time += timedelta(days=1)
-                    formatted_time = parsed_time.strftime('%I:%M %p on %B %d, %Y')
-                    response = set_one_time_reminder(user_id, task, formatted_time)
-                    logger.debug(f"Reminder scheduled: {task} at {formatted_time}")
-            except Exception as e:
-                response = f"Error setting reminder: {str(e)}. Try: 'set reminder for meeting at 3pm tomorrow'."
-                logger.error(f"Reminder parsing error: {str(e)}")
-        elif re.search(r'\b(sleep|standby)\b', clean_query, re.IGNORECASE) and not re.search(r'\b(shutdown|power\s+off)\b', clean_query, re.IGNORECASE):
-            system = platform.system().lower()
-            if system == 'windows':
-                try:
-                    subprocess.run(['rundll32.exe', 'powrprof.dll,SetSuspendState', '0,1,0'], check=True)
-                    response = "System is entering sleep mode."
-                    logger.debug("Sleep command executed")
-                except Exception as e:
-                    response = f"Error putting system to sleep: {str(e)}"
-                    logger.error(f"Sleep error: {str(e)}")
-            elif system == 'darwin':
-                try:
-                    subprocess.run(['pmset', 'sleepnow'], check=True)
-                    response = "System is entering sleep mode."
-                    logger.debug("Sleep command executed")
-                except Exception as e:
-                    response = f"Error putting system to sleep: {str(e)}"
-                    logger.error(f"Sleep error: {str(e)}")
-            else:
-                response = "Sleep command not supported on Linux."
-                logger.warning("Sleep command attempted on Linux")
-        elif 'restart' in clean_query or 'reboot' in clean_query:
-            system = platform.system().lower()
-            if system != 'windows':
-                response = "Restart command only supported on Windows."
-                logger.warning("Restart command attempted on non-Windows system")
-            else:
-                try:
-                    subprocess.run(['shutdown', '/r', '/t', '0'], check=True)
-                    response = "System is restarting."
-                    logger.debug("Restart command executed")
-                except Exception as e:
-                    response = f"Error restarting system: {str(e)}"
-                    logger.error(f"Restart error: {str(e)}")
-        elif re.search(r'\b(shutdown|power\s+off)\b', clean_query, re.IGNORECASE):
-            system = platform.system().lower()
-            if system != 'windows':
-                response = "Shutdown command only supported on Windows."
-                logger.warning("Shutdown command attempted on non-Windows system")
-            else:
-                try:
-                    subprocess.run(['shutdown', '/s', '/t', '0'], check=True)
-                    response = "System is shutting down."
-                    logger.debug("Shutdown command executed")
-                except Exception as e:
-                    response = f"Error shutting down system: {str(e)}"
-                    logger.error(f"Shutdown error: {str(e)}")
-        elif 'lock' in clean_query:
-            system = platform.system().lower()
-            if system != 'windows':
-                response = "Lock command only supported on Windows."
-                logger.warning("Lock command attempted on non-Windows system")
-            else:
-                try:
-                    ctypes.windll.user32.LockWorkStation()
-                    response = "System is locked."
-                    logger.debug("Lock command executed")
-                except Exception as e:
-                    response = f"Error locking system: {str(e)}"
-                    logger.error(f"Lock error: {str(e)}")
-        elif re.search(r'\b(?:https?://|www\.)', clean_query, re.IGNORECASE):
-            # Direct URL opening: "open https://example.com" or "open www.example.com"
-            url_match = re.search(r'(?:https?://|www\.)[^\s]+', clean_query, re.IGNORECASE)
-            if url_match:
-                url = url_match.group(0)
-                if not url.startswith('http://') and not url.startswith('https://'):
-                    url = 'https://' + url
-                try:
-                    webbrowser.open(url)
-                    logger.info(f"🌐 Opening direct URL: {url}")
-                    response = f"Opening {url} in browser."
-                except Exception as e:
-                    response = f"Error opening URL: {str(e)}"
-                    logger.error(f"Error opening URL: {str(e)}")
-            else:
-                response = "Invalid URL format. Use 'open https://example.com' or 'open www.example.com'."
-        elif any(k in clean_query for k in ['open', 'kholo', 'khol', 'launch', 'start', 'kholna']):
-            # Support variants like "open chrome", "chrome kholo", "kholo chrome", and similar
-            app_name = None
-            extra_query = ''
-
-            # Try explicit pattern: (open|kholo|khol|launch|start) <app> [extra]
-            match = re.search(r'(?:open|kholo|khol|launch|start|kholna)\s+(\w+)(?:\s+(.*))?', clean_query, re.IGNORECASE)
-            if match:
-                app_name = match.group(1).strip().lower()
-                extra_query = match.group(2).strip() if match.group(2) else ''
-            else:
-                # Try pattern where app name appears first: e.g., "chrome kholo yarr" or "chrome kholo"
-                for key in APPS.keys():
-                    if re.search(r'\b' + re.escape(key) + r'\b', clean_query, re.IGNORECASE):
-                        app_name = key
-                        m = re.search(r'\b' + re.escape(key) + r'\b\s*(.*)', clean_query, re.IGNORECASE)
-                        extra_query = m.group(1).strip() if m and m.group(1) else ''
-                        break
-
-            if not app_name:
-                response = "Invalid open command format. Use 'open <app/website> [optional query]'."
-                logger.warning(f"Invalid open command format: {clean_query}")
-            else:
-                logger.debug(f"App name parsed: {app_name}, Extra query: {extra_query}")
-                if app_name in APPS:
-                    try:
-                        system = platform.system().lower()
-                        logger.debug(f"Opening {app_name} on {system}")
-                        if 'url' in APPS[app_name]:
-                            url_to_open = None
-                            if app_name == 'youtube' and extra_query:
-                                search_query = extra_query.replace(' ', '+')
-                                url_to_open = f"{APPS[app_name]['url']}/results?search_query={search_query}"
-                                webbrowser.open(url_to_open)
-                                response = f"Opening YouTube and searching for '{extra_query}'."
-                            elif app_name == 'google' and extra_query:
-                                search_query = extra_query.replace(' ', '+')
-                                url_to_open = f"{APPS[app_name]['url']}/search?q={search_query}"
-                                webbrowser.open(url_to_open)
-                                response = f"Opening Google and searching for '{extra_query}'."
-                            elif app_name == 'wikipedia' and extra_query:
-                                search_query = extra_query.replace(' ', '+')
-                                url_to_open = f"https://en.wikipedia.org/w/index.php?search={search_query}"
-                                webbrowser.open(url_to_open)
-                                response = f"Opening Wikipedia and searching for '{extra_query}'."
-                            else:
-                                # For websites, fall back to opening the configured URL
-                                url_to_open = APPS[app_name]['url']
-                                webbrowser.open(url_to_open)
-                                response = f"Opening {app_name} in browser."
-                            logger.info(f"🌐 Opening URL: {url_to_open}")
-                            logger.debug(f"Successfully opened {app_name}")
-                        else:
-                            # Native app launch
-                            app_command = None
-                            jarvis_url_to_open = None
-                            # If opening Chrome or Edge, optionally open JARVIS URL
-                            if app_name in ['chrome', 'edge'] and JARVIS_PORT:
-                                jarvis_url_to_open = f"http://localhost:{JARVIS_PORT}"
-                            
-                            if system == 'windows':
-                                # Using shell=True to allow commands like 'start' or app names available in PATH
-                                app_command = APPS[app_name]['win']
-                                if jarvis_url_to_open:
-                                    # Open browser with JARVIS URL
-                                    if app_name == 'chrome':
-                                        subprocess.Popen([app_command, jarvis_url_to_open], shell=True)
-                                    elif app_name == 'edge':
-                                        subprocess.Popen([app_command, jarvis_url_to_open], shell=True)
-                                    logger.info(f"🚀 Opening {app_name} with JARVIS URL: {jarvis_url_to_open}")
-                                    response = f"Opening {app_name} with JARVIS interface at {jarvis_url_to_open}."
-                                else:
-                                    subprocess.Popen(app_command, shell=True)
-                                    logger.info(f"🚀 Opening app: {app_name} with command: {app_command}")
-                                    response = f"Opening {app_name}."
-                            elif system == 'darwin':
-                                app_command = f"open -a {APPS[app_name]['mac']}"
-                                if jarvis_url_to_open:
-                                    subprocess.run(['open', '-a', APPS[app_name]['mac'], jarvis_url_to_open])
-                                    logger.info(f"🚀 Opening {app_name} with JARVIS URL: {jarvis_url_to_open}")
-                                    response = f"Opening {app_name} with JARVIS interface at {jarvis_url_to_open}."
-                                else:
-                                    subprocess.run(['open', '-a', APPS[app_name]['mac']])
-                                    logger.info(f"🚀 Opening app: {app_name} with command: {app_command}")
-                                    response = f"Opening {app_name}."
-                            elif system == 'linux':
-                                app_command = APPS[app_name]['linux']
-                                if jarvis_url_to_open:
-                                    subprocess.run([app_command, jarvis_url_to_open])
-                                    logger.info(f"🚀 Opening {app_name} with JARVIS URL: {jarvis_url_to_open}")
-                                    response = f"Opening {app_name} with JARVIS interface at {jarvis_url_to_open}."
-                                else:
-                                    subprocess.run([app_command])
-                                    logger.info(f"🚀 Opening app: {app_name} with command: {app_command}")
-                                    response = f"Opening {app_name}."
-                            logger.debug(f"Successfully opened {app_name}")
-                    except Exception as e:
-                        response = f"Error opening {app_name}: {str(e)}"
-                        logger.error(f"Error opening {app_name}: {str(e)}")
-                else:
-                    response = f"Application or website '{app_name}' not supported."
-                    logger.warning(f"Unsupported app/website: {app_name}")
-        elif 'whatsapp message' in clean_query:
-            # Command: "send a whatsapp message to [number] saying [message]"
-            match = re.search(r'whatsapp message to\s+([\d\s\+]+?)\s+saying\s+(.*)', clean_query, re.IGNORECASE)
-            if match:
-                phone_number = re.sub(r'\s+', '', match.group(1)) # Remove spaces from number
-                message_text = match.group(2).strip()
-                
-                # Basic validation for phone number (e.g., starts with + and has digits)
-                if not re.match(r'^\+?\d+$', phone_number):
-                    response = f"Invalid phone number format: {phone_number}. Please include the country code."
-                else:
-                    url = f"https://web.whatsapp.com/send?phone={phone_number}&text={requests.utils.quote(message_text)}"
-                    webbrowser.open(url)
-                    response = f"Opening WhatsApp to send a message to {phone_number}. The message box will be focused; press Enter to send."
-            else:
-                response = "I couldn't understand the phone number or message. Please say, 'send a whatsapp message to [phone number with country code] saying [your message]'."
-        elif 'weather' in clean_query:
-            if not WEATHER_API_KEY:
-                response = "Weather API key not configured."
-                logger.warning("Weather API key missing")
-            else:
-                city_match = re.search(r'(?:weather|was the weather)\s*(?:in)?\s*([\w\s]+)', clean_query, re.IGNORECASE)
-                city = city_match.group(1).strip() if city_match else 'Delhi'
-                logger.debug(f"City parsed: {city}")
-                try:
-                    url = f'http://api.openweathermap.org/data/2.5/weather?q={city}&appid={WEATHER_API_KEY}&units=metric'
-                    res = requests.get(url)
-                    data = res.json()
-                    if data.get('cod') != 200:
-                        response = f"Weather error: {data.get('message', 'City not found')} (cod: {data.get('cod')})"
-                        logger.error(f"Weather API error for {city}: {data.get('message', 'No detail')} (cod: {data.get('cod')})")
-                    else:
-                        response = f"Weather in {data['name']}: {data['main']['temp']}°C, {data['weather'][0]['description']}."
-                        logger.debug(f"Weather response for {city}: {response}")
-                except Exception as e:
-                    response = f"Error fetching weather: {str(e)}"
-                    logger.error(f"Weather API error: {str(e)}")
-        elif 'news' in clean_query or 'headlines' in clean_query:
-            if not newsapi:
-                response = "News API key not configured."
-                logger.warning("News API key missing")
-            else:
-                try:
-                    top = newsapi.get_top_headlines(language='en', page_size=3)
-                    if top['status'] != 'ok' or not top['articles']:
-                        response = "No news available."
-                        logger.warning("No news articles found")
-                    else:
-                        headlines = [f"{article['title']} from {article['source']['name']}" for article in top['articles']]
-                        response = f"Top headlines: {' | '.join(headlines)}"
-                        logger.debug(f"News response: {response}")
-                except Exception as e:
-                    response = f"Error fetching news: {str(e)}"
-                    logger.error(f"News API error: {str(e)}")
-        elif 'volume' in clean_query:
-            if platform.system() != 'Windows':
-                response = "Volume control only supported on Windows."
-                logger.warning("Volume control attempted on non-Windows system")
-            else:
-                try:
-                    pythoncom.CoInitialize()
-                    level_str = re.search(r'\d+', clean_query)
-                    level = int(level_str.group()) / 100 if level_str else 0.5
-                    logger.debug(f"Volume level parsed: {level}")
-                    devices = AudioUtilities.GetSpeakers()
-                    interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
-                    volume = cast(interface, POINTER(IAudioEndpointVolume))
-                    volume.SetMasterVolumeLevelScalar(min(max(level, 0.0), 1.0), None)
-                    response = f"Volume set to {int(level * 100)}%."
-                    logger.debug(f"Volume set to {level}")
-                except Exception as e:
-                    response = f"Error setting volume: {str(e)}. Ensure you're on Windows and try again."
-                    logger.error(f"Volume control error: {str(e)}")
-                finally:
-                    pythoncom.CoUninitialize()
-        elif 'brightness' in clean_query:
-            try:
-                level_str = re.search(r'\d+', clean_query)
-                level = int(level_str.group()) if level_str else 50
-                logger.debug(f"Brightness level parsed: {level}")
-                sbc.set_brightness(level)
-                response = f"Brightness set to {level}%."
-                logger.debug(f"Brightness set to {level}")
-            except Exception as e:
-                response = f"Error setting brightness: {str(e)}"
-                logger.error(f"Brightness control error: {str(e)}")
-        elif 'camera' in clean_query:
-            global camera_active
-            if camera_active:
-                response = "Camera is already active."
-                logger.warning("Camera already active")
-            else:
-                try:
-                    camera_active = True
-                    def open_camera():
-                        global camera_active
-                        cap = cv2.VideoCapture(0)
-                        if not cap.isOpened():
-                            logger.error("Could not open camera")
-                            camera_active = False
-                            return
-                        while camera_active:
-                            ret, frame = cap.read()
-                            if not ret:
-                                logger.error("Failed to capture frame")
-                                break
-                            cv2.imshow('JARVIS Camera', frame)
-                            key = cv2.waitKey(1) & 0xFF
-                            if key == ord('c'):
-                                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                                cv2.imwrite(f"capture_{timestamp}.jpg", frame)
-                                logger.debug(f"Picture captured")
-                            elif key == ord('q'):
-                                logger.debug("Camera feed closed by 'q' key")
-                                break
-                        cap.release()
-                        cv2.destroyAllWindows()
-                        camera_active = False
-                    threading.Thread(target=open_camera, daemon=True).start()
-                    response = "Camera opened. Press 'c' to capture, 'q' to quit."
-                    logger.debug("Camera command initiated")
-                except Exception as e:
-                    camera_active = False
-                    response = f"Error opening camera: {str(e)}"
-                    logger.error(f"Camera error: {str(e)}")
-        elif 'note' in clean_query or 'generate note' in clean_query:
-            if not model:
-                response = "Note generation unavailable without Gemini API key."
-                logger.warning("Note generation attempted without Gemini API key")
-            else:
-                topic = re.sub(r'(generate\s+)?note\s*', '', clean_query, flags=re.IGNORECASE).strip() or 'general note'
-                logger.debug(f"Note topic parsed: {topic}")
-                try:
-                    prompt = f"Summarize key information about {topic} in a concise note format."
-                    if context:
-                        prompt += f"\nContext: {context}"
-                    gemini_response = model.generate_content(prompt)
-                    if not gemini_response.text:
-                        response = "No response received from Gemini for note generation."
-                        logger.warning("Gemini returned an empty response for note.")
-                    else:
-                        response = gemini_response.text.strip()
-                        logger.debug(f"Note generated: {response[:100]}...")
-                except Exception as e:
-                    response = f"Error generating note: {str(e)}. Check GEMINI_API_KEY or API quotas."
-                    logger.error(f"Note generation error: {str(e)}")
-        elif re.search(r'(write\s+a\s+program|code\s+in|give\s+me\s+a\s+code)\s+(java|python|javascript|c\+\+|c#)', clean_query, re.IGNORECASE):
-            if not model:
-                response = "Code generation unavailable without Gemini API key."
-                logger.warning("Code generation attempted without Gemini API key")
-            else:
-                try:
-                    match = re.search(r'(write\s+a\s+program|code\s+in|give\s+me\s+a\s+code)\s+(java|python|javascript|c\+\+|c#)\s*(.*)', clean_query, re.IGNORECASE)
-                    language = match.group(2).lower() if match else 'python'
-                    code_topic = match.group(3).strip() or 'hello world'
-                    logger.debug(f"Code language: {language}, Topic: {code_topic}")
-                    prompt = f"""
-Provide a comprehensive and educational response for writing a {language} program for '{code_topic}'. Include:
-1. At least three distinct code examples, showcasing different approaches or variations.
-2. Detailed explanation for each example, covering syntax, key components, logic, and use cases.
-3. Step-by-step instructions for compiling and running each example.
-4. Relevant best practices for {language} programming.
-5. Additional insights or tips.
-Format code in ```{language}``` blocks.
-"""
-                    if context:
-                        prompt += f"\nContext: {context}"
-                    gemini_response = model.generate_content(prompt)
-                    if not gemini_response.text:
-                        response = f"No {language} code example received from Gemini."
-                        logger.warning(f"Gemini returned an empty response for {language} code.")
-                    else:
-                        response = gemini_response.text.strip()
-                        logger.debug(f"{language.capitalize()} code generated: {response[:100]}...")
-                except Exception as e:
-                    response = f"Error generating {language} code: {str(e)}."
-                    logger.error(f"Code generation error: {str(e)}")
-        else:
-            if model:
-                try:
-                    logger.debug(f"Sending to Gemini: '{clean_query}'")
-                    prompt = f"Summarize key information about {clean_query} in a concise format."
-                    if context:
-                        prompt += f"\nContext: {context}"
-                    gemini_response = model.generate_content(prompt)
-                    if not gemini_response.text:
-                        response = "No response received from Gemini."
-                        logger.warning("Gemini returned an empty response.")
-                    else:
-                        response = gemini_response.text.strip()
-                        logger.debug(f"Gemini response: {response[:100]}...")
-                except Exception as e:
-                    response = f"Error processing query: {str(e)}."
-                    logger.error(f"Gemini error: {str(e)}")
-            else:
-                response = "General query support unavailable. Please check GEMINI_API_KEY."
-                logger.error("Gemini model unavailable.")
+        commands = split_commands(query)
+        # A compound utterance gets every command answered, merged in spoken order
+        if len(commands) > 1:
+            results = list(iter_commands(commands, user_id, wait=bool(data.get('wait'))))
+            return jsonify({'response': merge_results(results), 'results': results})
+
+        clean_query = commands[0]
+        context = load_context(user_id, clean_query)
+        intent = router.match(clean_query)
+
+        # Slow intents return a job id at once unless the client asks to wait
+        if intent in TASK_INTENTS and not data.get('wait') and get_model():
+            return jsonify(queue_ask(intent, clean_query, user_id, context)), 202
+
+        # Dispatch to the matching intent handler
+        response = router.handle(intent, clean_query, user_id, context)
 
-        c.execute("INSERT INTO sessions VALUES (?, ?, ?, ?)", (user_id, clean_query, response, datetime.now()))
-        conn.commit()
+        remember_turn(user_id, clean_query, response)
 
-        logger.debug(f"Response: {response[:100]}...")
+        logger.debug("Response: %s...", response[:100])
         return jsonify({'response': response})
 
     except Exception as e:
@@ -762,14 +1313,235 @@ Format code in ```{language}``` blocks.
         logger.error(error_message)
         return jsonify({'error': error_message}), 500
 
+@app.route('/ask/batch', methods=['POST'])
+def ask_batch():
+    """Answer a JSON array of commands (or {"queries": [...], "user_id": ..., "wait": ...}).
+
+    Upstream-bound commands run concurrently; results come back in request
+    order, each with its intent and seconds, so the total is close to the
+    slowest command rather than the sum.
+    """
+    batch, error = parse_batch(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error}), 400
+    start = time.perf_counter()
+    results = list(iter_commands(batch['commands'], batch['user_id'], wait=batch['wait']))
+    return jsonify({'results': results, 'seconds': round(time.perf_counter() - start, 4)})
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    """Streaming variant of /ask using Server-Sent Events.
+
+    Gemini-backed intents (note, code, fallback) emit one `data: {"delta": ...}`
+    event per chunk; other intents emit their whole response as one delta.
+    A final `done` event carries the full response. A compound utterance
+    streams one delta per command, in order, as each answer is ready.
+    """
+    data = request.get_json()
+    if not data or 'query' not in data:
+        logger.error("Invalid request: No query provided")
+        return jsonify({'error': 'No query provided'}), 400
+
+    query = data.get('query', '').lower().strip()
+    user_id = data.get('user_id', 'user1')
+    logger.debug("Raw streaming query received: %s (user: %s)", query, user_id)
+
+    commands = split_commands(query)
+    if len(commands) > 1:
+        def command_events():
+            results = []
+            for result in iter_commands(commands, user_id):
+                results.append(result)
+                text = result.get('response') or result.get('error', '')
+                yield sse_event({'delta': text if len(results) == 1 else '\n\n' + text, 'result': result})
+            yield sse_event({'response': merge_results(results), 'results': results}, event='done')
+        return sse_response(command_events())
+
+    try:
+        clean_query = commands[0]
+        context = load_context(user_id, clean_query)
+        intent = router.match(clean_query)
+        prompt = llm_prompt(intent, clean_query, context) if get_model() else None
+        # Local intents are answered before the stream opens
+        response = router.handle(intent, clean_query, user_id, context) if prompt is None else None
+    except Exception as e:
+        error_message = f"Error processing request: {str(e)}"
+        logger.error(error_message)
+        return jsonify({'error': error_message}), 500
+
+    def events():
+        full_response = response
+        if full_response is None:
+            chunks = []
+            try:
+                for chunk in stream_text(prompt, semantic_key(intent, clean_query),
+                                         cache=not prompt_context(clean_query, context)):
+                    chunks.append(chunk)
+                    yield sse_event({'delta': chunk})
+            except Exception as e:
+                error_message = f"Error processing query: {str(e)}."
+                logger.error("Gemini streaming error: %s", e)
+                yield sse_event({'error': error_message}, event='error')
+                return
+            full_response = ''.join(chunks).strip() or "No response received from Gemini."
+        else:
+            yield sse_event({'delta': full_response})
+
+        remember_turn(user_id, clean_query, full_response)
+        logger.debug("Streamed response: %s...", full_response[:100])
+        yield sse_event({'response': full_response}, event='done')
+
+    return sse_response(events())
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Server-Sent Events for user_id: reminder, wake_word, daily_news and task events.
+
+    A keepalive comment is sent every EVENTS_HEARTBEAT seconds. Reconnecting
+    clients send Last-Event-ID and receive the buffered events they missed.
+    Each connection holds a worker thread here; the async server
+    (--server async) keeps thousands of idle connections on one event loop.
+    """
+    user_id = request.args.get('user_id', 'user1')
+    last_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', ''))
+    last_id = int(last_id) if last_id.isdigit() else None
+    heartbeat = float(os.getenv('EVENTS_HEARTBEAT', '15'))
+    subscription = event_bus.subscribe(user_id)
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            sent = last_id or 0
+            if last_id is not None:
+                for event in event_bus.replay(user_id, last_id):
+                    sent = event['id']
+                    yield sse_format(event)
+            while True:
+                batch = [event for event in subscription.get(timeout=heartbeat) if event['id'] > sent]
+                if not batch:
+                    yield ": keepalive\n\n"
+                for event in batch:
+                    sent = event['id']
+                    yield sse_format(event)
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return sse_response(stream())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Request and span latency histograms by intent, in the Prometheus text format."""
+    return Response(tracer.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/events/stats', methods=['GET'])
+def events_stats():
+    return jsonify(event_bus.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    stats = {rc.namespace: rc.stats() for rc in (gemini_cache, weather_cache, news_cache)}
+    # Report the semantic cache without forcing it to load
+    if subsystems.subsystems['semantic_cache'].state == 'ready':
+        stats['semantic'] = subsystems.get('semantic_cache').stats()
+    if subsystems.subsystems['language'].state == 'ready':
+        stats['language'] = subsystems.get('language').stats()
+    return jsonify(stats)
+
+@app.route('/upstream/stats', methods=['GET'])
+def upstream_stats():
+    return jsonify(outbound.stats())
+
+@app.route('/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify(llm_gateway.stats())
+
+@app.route('/health', methods=['GET'])
+def health():
+    states = subsystems.health()
+    return jsonify({
+        'status': 'ok',
+        'ready': all(info['state'] not in ('pending', 'loading') for info in states.values()),
+        'subsystems': states
+    })
+
+@app.route('/history/search', methods=['GET'])
+def history_search():
+    """Top-k past query/response pairs of user_id most similar to q."""
+    text = request.args.get('q', '').strip()
+    user_id = request.args.get('user_id', 'user1')
+    if not text:
+        return jsonify({'error': 'No query provided'}), 400
+    history = subsystems.get('history')
+    if not history:
+        return jsonify({'error': f"History search unavailable: {subsystems.error('history') or 'disabled'}"}), 503
+    try:
+        k = max(1, min(int(request.args.get('k', '5')), 50))
+    except ValueError:
+        return jsonify({'error': 'k must be an integer'}), 400
+    # Include turns logged since the last background sync
+    storage.flush()
+    history.sync()
+    return jsonify({'query': text, 'user_id': user_id, 'results': history.search(user_id, text, k=k)})
+
+@app.route('/history/stats', methods=['GET'])
+def history_stats():
+    history = subsystems.get('history')
+    return jsonify(history.stats() if history else {'error': 'History search unavailable'})
+
+@app.route('/history/export', methods=['GET'])
+def history_export():
+    """Every turn of user_id, archived and live, oldest first, streamed as NDJSON one row at a time."""
+    user_id = request.args.get('user_id', 'user1')
+    storage.flush()
+    records = retention.export(user_id, since=request.args.get('since'), until=request.args.get('until'),
+                               archived=request.args.get('archived', '1') != '0')
+    lines = (json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/history/retention', methods=['GET'])
+def history_retention():
+    return jsonify(retention.stats())
+
+@app.route('/apps/stats', methods=['GET'])
+def app_registry_stats():
+    return jsonify(apps.stats())
+
+@app.route('/launcher/stats', methods=['GET'])
+def launcher_stats():
+    return jsonify(launcher.stats())
+
+@app.route('/memory/stats', methods=['GET'])
+def memory_stats():
+    return jsonify(memory.stats())
+
+@app.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    return jsonify({'jobs': job_engine.stats(), 'reminders': reminder_scheduler.stats(), 'tasks': task_queue.stats(),
+                    'state': shared_state.stats()})
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    """State of a queued /ask job; once done, result holds the answer."""
+    task = task_queue.get(job_id)
+    if task is None:
+        return jsonify({'error': 'No such job'}), 404
+    return jsonify(task)
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if task_queue.get(job_id) is None:
+        return jsonify({'error': 'No such job'}), 404
+    cancelled = task_queue.cancel(job_id)
+    return jsonify({'id': job_id, 'cancelled': cancelled, 'state': task_queue.get(job_id)['state']})
+
 @app.route('/close_camera', methods=['POST'])
 def close_camera():
-    global camera_active
-    if not camera_active:
+    camera = subsystems.get('camera')
+    if not camera or not camera.active:
         return jsonify({'response': "No active camera to close."})
     try:
-        camera_active = False
-        cv2.destroyAllWindows()
+        camera.stop(wait=True)
         response = "Camera closed."
         logger.debug(response)
         return jsonify({'response': response})
@@ -779,8 +1551,61 @@ def close_camera():
         return jsonify({'error': error_message}), 500
 
 
+@app.route('/camera/stream', methods=['GET'])
+def camera_stream():
+    """MJPEG feed of the active camera for <img src="/camera/stream">."""
+    camera = subsystems.get('camera')
+    if not camera or not camera.active:
+        return jsonify({'error': "Camera is not active."}), 409
+    return Response(camera.mjpeg(), mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'Cache-Control': 'no-cache'})
+
+@app.route('/camera/snapshot', methods=['POST'])
+def camera_snapshot():
+    camera = subsystems.get('camera')
+    if not camera or not camera.active:
+        return jsonify({'error': "Camera is not active."}), 409
+    path = camera.snapshot()
+    if path is None:
+        return jsonify({'error': "Snapshot writer is busy; try again."}), 503
+    return jsonify({'response': f"Picture saved to {path}.", 'path': path})
+
+@app.route('/wake/stats', methods=['GET'])
+def wake_stats():
+    listener = subsystems.get('wake_word')
+    return jsonify(listener.stats() if listener else {'error': f"Wake word detection unavailable: {subsystems.error('wake_word')}"})
+
+@app.route('/camera/stats', methods=['GET'])
+def camera_stats():
+    camera = subsystems.get('camera')
+    return jsonify(camera.stats() if camera else {'error': f"Camera unavailable: {subsystems.error('camera')}"})
+
+
 # ---------- AI Friend Function (POST) ----------
-def ai_friend_reply(text: str) -> str:
+def friend_prompt(text: str, context: str = '', user_id: str = None) -> str:
+    """Build the AI friend prompt, asking Gemini to reply in the user's language."""
+    # Detect language from user input and include it in the prompt so
+    # the model replies in the same language.
+    detected_lang = 'en'
+    detector = subsystems.get('language')
+    try:
+        if detector and text and text.strip():
+            detected_lang = detector.detect(text, user_id)
+            logger.debug("Detected language for ai_friend_reply: %s", detected_lang)
+    except Exception as le:
+        logger.warning("Language detection failed, defaulting to 'en': %s", le)
+
+    # Instruct model to reply in detected language; provide explicit language code
+    return (
+        "Act like a friendly human friend. "
+        "Reply casually, short and natural. "
+        f"Detected language: {detected_lang}. Reply in the same language as the user. "
+        + (f"Conversation so far:\n{context}\n" if context else "")
+        + f"Message: {text}"
+    )
+
+
+def ai_friend_reply(text: str, context: str = '', user_id: str = None) -> str:
     """Return a short, friendly reply using Gemini.
 
     Raises RuntimeError when GEMINI_API_KEY is not configured or on API errors.
@@ -789,24 +1614,9 @@ def ai_friend_reply(text: str) -> str:
         logger.error("GEMINI_API_KEY not configured for ai_friend_reply")
         raise RuntimeError("GEMINI_API_KEY not configured")
     try:
-        # Detect language from user input and include it in the prompt so
-        # the model replies in the same language.
-        detected_lang = 'en'
-        try:
-            if text and text.strip():
-                detected_lang = detect(text)
-                logger.debug(f"Detected language for ai_friend_reply: {detected_lang}")
-        except Exception as le:
-            logger.warning(f"Language detection failed, defaulting to 'en': {le}")
-
-        # Instruct model to reply in detected language; provide explicit language code
-        prompt = (
-            "Act like a friendly human friend. "
-            "Reply casually, short and natural. "
-            f"Detected language: {detected_lang}. Reply in the same language as the user. "
-            f"Message: {text}"
-        )
-        gemini_response = model.generate_content(prompt)
+        prompt = friend_prompt(text, context, user_id)
+        memory.observe_prompt(prompt)
+        gemini_response = llm_gateway.generate(prompt)
         # Some SDK responses place text on .text, ensure safe access
         reply_text = ""
         if gemini_response is not None and getattr(gemini_response, 'text', None):
@@ -816,7 +1626,7 @@ def ai_friend_reply(text: str) -> str:
             reply_text = str(gemini_response.content).strip()
         return reply_text
     except Exception as e:
-        logger.error(f"ai_friend_reply error: {e}")
+        logger.error("ai_friend_reply error: %s", e)
         raise
 
 
@@ -824,7 +1634,7 @@ def ai_friend_reply(text: str) -> str:
 def chat_post():
     """POST endpoint that returns a friendly short reply from the AI friend.
 
-    Accepts JSON: { "text": "..." }
+    Accepts JSON: { "text": "...", "user_id": "..." (optional) }
     Returns JSON: { "user_message": "...", "friend_reply": "..." }
     """
     data = request.get_json()
@@ -833,49 +1643,115 @@ def chat_post():
         return jsonify({"error": "Empty message"}), 400
     if not GEMINI_API_KEY:
         return jsonify({"error": "GEMINI_API_KEY not configured"}), 503
+    user_id = data.get('user_id', 'user1')
     try:
-        reply = ai_friend_reply(text)
+        reply = ai_friend_reply(text, load_context(user_id, text), user_id)
+        remember_turn(user_id, text, reply)
         return jsonify({
             "user_message": text,
             "friend_reply": reply
         })
     except Exception as e:
-        logger.error(f"AI friend chat error: {e}")
+        logger.error("AI friend chat error: %s", e)
         return jsonify({"error": str(e)}), 500
 
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming variant of /chat using Server-Sent Events.
+
+    Accepts JSON: { "text": "...", "user_id": "..." (optional) }
+    Emits `data: {"delta": "..."}` per Gemini chunk, then a `done` event with
+    { "user_message": "...", "friend_reply": "..." }.
+    """
+    data = request.get_json()
+    text = data.get('text', '').strip() if data else ''
+    if not text:
+        return jsonify({"error": "Empty message"}), 400
+    if not GEMINI_API_KEY or not get_model():
+        return jsonify({"error": "GEMINI_API_KEY not configured"}), 503
+    user_id = data.get('user_id', 'user1')
+    prompt = friend_prompt(text, load_context(user_id, text), user_id)
+    memory.observe_prompt(prompt)
+
+    def events():
+        chunks = []
+        try:
+            for chunk in llm_gateway.stream(prompt):
+                chunk_text = getattr(chunk, 'text', None)
+                if chunk_text:
+                    chunks.append(chunk_text)
+                    yield sse_event({'delta': chunk_text})
+        except Exception as e:
+            logger.error("AI friend chat stream error: %s", e)
+            yield sse_event({'error': str(e)}, event='error')
+            return
+        reply = ''.join(chunks).strip()
+        remember_turn(user_id, text, reply)
+        yield sse_event({'user_message': text, 'friend_reply': reply}, event='done')
+
+    return sse_response(events())
+
+def start_background():
+    """Start the schedulers, task workers, subsystem warm-up and wake word listener.
+
+    Called by the development server below; under a multi-worker server such
+    as gunicorn, call it once in each worker (e.g. from a post_fork hook).
+    """
+    reminder_scheduler.start()
+    job_engine.start()
+    task_queue.start()
+    # WARM_UP lists the subsystems to load in the background ('none' to load everything on first use)
+    warm_up = os.getenv('WARM_UP', ','.join(subsystems.subsystems))
+    subsystems.warm_up([name.strip() for name in warm_up.split(',') if name.strip() and name.strip() != 'none'])
+    start_wake_word_listener()
+
 def is_port_in_use(port):
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         return s.connect_ex(('localhost', port)) == 0
 
 if __name__ == '__main__':
-    load_reminders()
-    if PICOVOICE_ACCESS_KEY:
-        threading.Thread(target=listen_for_wake_word, daemon=True).start()
+    parser = argparse.ArgumentParser(description='Run the JARVIS server.')
+    parser.add_argument('--server', choices=['threaded', 'async'], default=os.getenv('JARVIS_SERVER', 'threaded'),
+                        help="'async' serves /ask and /chat on an ASGI event loop (needs quart, aiohttp, hypercorn)")
+    parser.add_argument('--port', type=int, help='port to bind; by default the first free one of 5000-5002')
+    args = parser.parse_args()
+
+    start_background()
 
-    ports = [5000, 5001, 5002]
+    ports = [args.port] if args.port else [5000, 5001, 5002]
     selected_port = None
     for port in ports:
         if not is_port_in_use(port):
             selected_port = port
             JARVIS_PORT = port
-            logger.info(f"Selected port: {port}")
-            logger.info(f"🌐 JARVIS URL: http://localhost:{port}")
+            logger.info("Selected port: %s", port)
+            logger.info("🌐 JARVIS URL: http://localhost:%s", port)
             break
     if not selected_port:
-        logger.error("All attempted ports (5000, 5001, 5002) are in use.")
+        logger.error("All attempted ports (%s) are in use.", ', '.join(map(str, ports)))
         exit(1)
 
+    # The stat reloader re-executes this module in a child process, starting every
+    # background thread and the wake word listener twice; opt in with JARVIS_RELOAD=1
+    use_reloader = os.getenv('JARVIS_RELOAD', '0') == '1'
     try:
         cert_path = os.getenv('SSL_CERT_PATH')
         key_path = os.getenv('SSL_KEY_PATH')
-        if cert_path and key_path and os.path.exists(cert_path) and os.path.exists(key_path):
+        has_cert = bool(cert_path and key_path and os.path.exists(cert_path) and os.path.exists(key_path))
+        if args.server == 'async':
+            from async_app import serve
+            logger.info("Serving /ask and /chat asynchronously on hypercorn")
+            serve(sys.modules[__name__], '0.0.0.0', selected_port,
+                  certfile=cert_path if has_cert else None, keyfile=key_path if has_cert else None)
+        elif has_cert:
             context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
             context.load_cert_chain(certfile=cert_path, keyfile=key_path)
             logger.debug("SSL certificate loaded successfully.")
-            app.run(host='0.0.0.0', port=selected_port, ssl_context=context, debug=True)
+            app.run(host='0.0.0.0', port=selected_port, ssl_context=context, debug=True, use_reloader=use_reloader)
         else:
             logger.warning("SSL certificates not found or not configured. Falling back to HTTP...")
-            app.run(host='0.0.0.0', port=selected_port, debug=True)
+            app.run(host='0.0.0.0', port=selected_port, debug=True, use_reloader=use_reloader)
     except Exception as e:
-        logger.error(f"Failed to start server on port {selected_port}: {str(e)}")
+        logger.error("Failed to start server on port %s: %s", selected_port, e)
         exit(1)
\ No newline at end of file
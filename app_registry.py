@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import platform
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# platform.system().lower() -> the config key holding that platform's launch command
+PLATFORM_KEYS = {'windows': 'win', 'darwin': 'mac', 'linux': 'linux'}
+
+_ENV = re.compile(r'\$\{(\w+)(?::-([^}]*))?\}')
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(name):
+    """'What's App' -> 'whatsapp': lowercase letters and digits only."""
+    return _NON_ALNUM.sub('', name.lower())
+
+
+def trigrams(word):
+    padded = f"${word}$"
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _expand(value):
+    """Substitute ${NAME} and ${NAME:-default} from the environment."""
+    return _ENV.sub(lambda m: os.getenv(m.group(1), m.group(2) or ''), value)
+
+
+def _launch_command(system, command):
+    """(args, shell) to start command on system, as handle_open runs it."""
+    if system == 'windows':
+        # Through the shell, so 'start whatsapp' and programs on PATH work
+        return command, True
+    if system == 'darwin':
+        return ['open', '-a', command], False
+    return [command], False
+
+
+class AppIndex:
+    """One load of the apps config: entries, name matcher, trigram index and launch commands."""
+
+    def __init__(self, config, system):
+        self.entries = {}
+        self.commands = {}
+        self.names = {}
+        self.grams = {}
+        self._grams_of = {}
+        platform_key = PLATFORM_KEYS.get(system)
+        spoken = set()
+        for key, raw in config.items():
+            key = key.lower()
+            entry = {field: _expand(value) if isinstance(value, str) else value for field, value in raw.items()}
+            self.entries[key] = entry
+            if 'url' not in entry and entry.get(platform_key):
+                self.commands[key] = _launch_command(system, entry[platform_key])
+            for name in [key, *entry.get('aliases', ())]:
+                norm = normalize(name)
+                if not norm:
+                    continue
+                if self.names.setdefault(norm, key) != key:
+                    logger.warning("App name %r is claimed by both %s and %s; keeping %s",
+                                   name, self.names[norm], key, self.names[norm])
+                    continue
+                spoken.add(name.lower())
+                grams = self._grams_of[norm] = trigrams(norm)
+                for gram in grams:
+                    self.grams.setdefault(gram, set()).add(norm)
+        # Longest first, so "google chrome" wins over "google"; words may be
+        # joined by spaces, apostrophes or hyphens as speech recognition writes them
+        alternation = '|'.join(r"[\s'-]*".join(map(re.escape, name.split()))
+                               for name in sorted(spoken, key=len, reverse=True))
+        self.matcher = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE) if spoken else None
+
+    def fuzzy(self, norm, min_similarity):
+        """(key, Dice similarity) of the known name sharing the most trigrams with norm, or None."""
+        if len(norm) < 3:
+            return None
+        grams = trigrams(norm)
+        shared = {}
+        for gram in grams:
+            for name in self.grams.get(gram, ()):
+                shared[name] = shared.get(name, 0) + 1
+        best, best_score = None, min_similarity
+        for name, count in shared.items():
+            # A misheard name is about as long as the real one; "googlehow" is not "google"
+            if abs(len(name) - len(norm)) > max(2, len(name) // 4):
+                continue
+            score = 2 * count / (len(grams) + len(self._grams_of[name]))
+            if score >= best_score:
+                best, best_score = name, score
+        return (self.names[best], best_score) if best else None
+
+
+class AppRegistry:
+    """The apps and websites "open <name>" can launch, read from a JSON config file.
+
+    reload() re-reads the file when its modification time or size changes
+    and swaps in a freshly built AppIndex, so lookups never see a half-built
+    index and a broken file leaves the previous apps in place. Names are
+    found by one precompiled regex over every name and alias; failing that,
+    a name misheard by speech recognition ("crome", "watsapp") resolves to
+    the known name sharing the most trigrams, if at least min_similarity alike.
+    """
+
+    def __init__(self, path, system=None, min_similarity=0.5, max_words=3):
+        self.path = path
+        self.system = (system or platform.system()).lower()
+        self.min_similarity = min_similarity
+        self.max_words = max_words
+        self.reloads = 0
+        self.reload_errors = 0
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._index = AppIndex({}, self.system)
+        self._signature = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Load the config if it changed since the last load; returns True if it was loaded."""
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if self._signature is not False:
+                logger.error("Apps config %s unavailable: %s", self.path, e)
+                self._signature = False
+            return False
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    index = AppIndex(json.load(f), self.system)
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                self.reload_errors += 1
+                logger.error("Could not load apps config %s, keeping the previous apps: %s", self.path, e)
+                return False
+            self._index = index
+            self.reloads += 1
+        logger.info("Loaded %s apps from %s", len(index.entries), self.path)
+        return True
+
+    def get(self, key):
+        return self._index.entries.get(key)
+
+    def command(self, key):
+        """(args, shell) launching the native app key on this platform, or None."""
+        return self._index.commands.get(key)
+
+    def resolve(self, name):
+        """Key of the app called name, exactly or by fuzzy match; None if nothing is close."""
+        index = self._index
+        norm = normalize(name)
+        key = index.names.get(norm)
+        if key is None:
+            hit = index.fuzzy(norm, self.min_similarity)
+            key = hit[0] if hit else None
+        self._count(key, exact=norm in index.names)
+        return key
+
+    def find(self, text, at_end=False):
+        """(key, rest of text) for the app named at the start of text, or (None, text).
+
+        With at_end, the app is named at the end of text ("please chrome")
+        and rest is what comes before it. Fuzzy matching tries the first (or
+        last) one to max_words words run together, so "you tube" and
+        "what's up" can still resolve.
+        """
+        index = self._index
+        text = text.strip()
+        if index.matcher:
+            if at_end:
+                match = None
+                for match in index.matcher.finditer(text):
+                    pass
+                # Only a name right before the end counts: "google how close" names no app to close
+                if match and match.end() != len(text):
+                    match = None
+            else:
+                match = index.matcher.match(text)
+            if match:
+                self._count(True, exact=True)
+                rest = text[:match.start()] if at_end else text[match.end():]
+                return index.names[normalize(match.group(0))], rest.strip()
+
+        words = text.split()
+        best = None
+        for n in range(min(self.max_words, len(words)), 0, -1):
+            span = words[-n:] if at_end else words[:n]
+            hit = index.fuzzy(normalize(''.join(span)), self.min_similarity)
+            if hit and (best is None or hit[1] > best[1]):
+                best = (hit[0], hit[1], n)
+        self._count(best, exact=False)
+        if best is None:
+            return None, text
+        key, score, n = best
+        logger.debug("Resolved %r to %s (similarity %.2f)", ' '.join(words[-n:] if at_end else words[:n]), key, score)
+        return key, ' '.join(words[:-n] if at_end else words[n:])
+
+    def find_around(self, text, verb):
+        """(key, extra, text after the verb) for "<verb> <app> [extra]" or "<app> <verb> [extra]".
+
+        verb is a compiled pattern; key is None when no known app is named
+        next to it. The app after the verb is preferred, so "chrome kholo
+        yarr" falls back to "chrome" only because "yarr" is no app.
+        """
+        match = verb.search(text)
+        before, after = (text[:match.start()], text[match.end():]) if match else (text, '')
+        key, extra = None, ''
+        if after.strip():
+            key, extra = self.find(after)
+        if not key and before.strip():
+            key, _ = self.find(before, at_end=True)
+            extra = after.strip() if key else extra
+        return key, extra, after
+
+    def _count(self, found, exact):
+        with self._lock:
+            if not found:
+                self.misses += 1
+            elif exact:
+                self.exact_hits += 1
+            else:
+                self.fuzzy_hits += 1
+
+    def stats(self):
+        index = self._index
+        with self._lock:
+            return {
+                'path': self.path,
+                'apps': len(index.entries),
+                'names': len(index.names),
+                'launchable': len(index.commands),
+                'reloads': self.reloads,
+                'reload_errors': self.reload_errors,
+                'exact_hits': self.exact_hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,484 @@
+"""Async serving mode: python app.py --server async (or JARVIS_SERVER=async).
+
+/ask, /ask/batch, /ask/stream, /chat and /chat/stream run as Quart
+coroutines, and Gemini, weather and news are called over aiohttp, so a
+request waiting on an upstream holds no thread. /events connections wait on
+the event loop too, so thousands of idle browsers cost memory for their
+queues, not threads. Each upstream has its own concurrency limit
+(GEMINI_CONCURRENCY, WEATHER_CONCURRENCY, NEWS_CONCURRENCY). Every other
+route is served by the Flask app through hypercorn's WSGI adapter.
+
+Requires the optional quart, aiohttp and hypercorn packages.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+from hypercorn.asyncio import serve as hypercorn_serve
+from hypercorn.config import Config
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, Response, jsonify, request
+
+from async_client import AsyncHTTPClient
+from cache import prompt_key, city_key, params_key
+from events import sse_format
+from llm_gateway import INTERACTIVE, BULK, is_throttle
+
+logger = logging.getLogger(__name__)
+
+# Paths answered by the async app; everything else goes to Flask
+ASYNC_ROUTES = {'/ask', '/ask/batch', '/ask/stream', '/chat', '/chat/stream', '/events', '/upstream/async/stats'}
+
+GEMINI_ENDPOINT = 'https://generativelanguage.googleapis.com'
+WEATHER_URL = 'http://api.openweathermap.org/data/2.5/weather'
+NEWS_URL = 'https://newsapi.org/v2/top-headlines'
+
+
+class AsyncGemini:
+    """Gemini generateContent over its REST API, awaited instead of run on a thread.
+
+    Calls go to model_name unless another model (a quota fallback) is named.
+    """
+
+    def __init__(self, http, api_key, model_name, endpoint=None):
+        endpoint = endpoint or GEMINI_ENDPOINT
+        if '://' not in endpoint:
+            endpoint = f"https://{endpoint}"
+        self.http = http
+        self.base_url = f"{endpoint.rstrip('/')}/v1beta"
+        self.model_name = model_name
+        self.headers = {'x-goog-api-key': api_key}
+
+    def url(self, model_name=None):
+        model_name = model_name or self.model_name
+        if not model_name.startswith('models/'):
+            model_name = f"models/{model_name}"
+        return f"{self.base_url}/{model_name}"
+
+    @staticmethod
+    def _body(prompt):
+        return {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+
+    @staticmethod
+    def _text(payload):
+        candidates = payload.get('candidates') or [{}]
+        return ''.join(part.get('text', '') for part in candidates[0].get('content', {}).get('parts', []))
+
+    async def generate(self, prompt, model_name=None):
+        payload = await self.http.post_json('gemini', f"{self.url(model_name)}:generateContent",
+                                            json=self._body(prompt), headers=self.headers)
+        if 'error' in payload:
+            raise RuntimeError(f"Gemini error: {payload['error'].get('message', payload['error'])}")
+        return self._text(payload)
+
+    async def stream(self, prompt, model_name=None):
+        lines = self.http.stream_lines('gemini', 'POST', f"{self.url(model_name)}:streamGenerateContent", params={'alt': 'sse'},
+                                       json=self._body(prompt), headers=self.headers)
+        async for line in lines:
+            if line.startswith('data:'):
+                text = self._text(json.loads(line[5:]))
+                if text:
+                    yield text
+
+
+class AsyncJarvis:
+    """Async counterparts of the upstream-bound /ask intents, over app.py's router, caches and storage."""
+
+    def __init__(self, jarvis):
+        self.jarvis = jarvis
+        self.http = None
+        self.gemini = None
+
+    async def start(self):
+        # aiohttp sessions belong to the loop that creates them
+        self.http = AsyncHTTPClient(
+            connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05')),
+            read_timeout=float(os.getenv('HTTP_READ_TIMEOUT', '10')),
+            max_connections=int(os.getenv('ASYNC_MAX_CONNECTIONS', '512')),
+            limits={
+                'gemini': int(os.getenv('GEMINI_CONCURRENCY', '256')),
+                'weather': int(os.getenv('WEATHER_CONCURRENCY', '16')),
+                'news': int(os.getenv('NEWS_CONCURRENCY', '4'))
+            }
+        )
+        # Quota errors go back to the LLM gateway, which moves on to another model
+        self.http.upstream('gemini', give_up=is_throttle)
+        # Model discovery may block on the network; keep it off the event loop
+        model = await asyncio.to_thread(self.jarvis.get_model)
+        if self.jarvis.GEMINI_API_KEY and model:
+            self.gemini = AsyncGemini(self.http, self.jarvis.GEMINI_API_KEY, model.model_name,
+                                      self.jarvis.GEMINI_API_ENDPOINT)
+
+    async def stop(self):
+        if self.http:
+            await self.http.aclose()
+
+    async def ask_gemini(self, prompt, priority=INTERACTIVE):
+        """Gemini's reply to prompt, admitted by app.py's LLM gateway."""
+        return await self.jarvis.llm_gateway.agenerate(
+            prompt, lambda slot: self.gemini.generate(prompt, slot.name), priority)
+
+    async def stream_gemini(self, prompt, priority=INTERACTIVE):
+        """Gemini's reply to prompt as text chunks, admitted by app.py's LLM gateway."""
+        chunks = await self.jarvis.llm_gateway.astream(lambda slot: self.gemini.stream(prompt, slot.name), priority)
+        async for chunk in chunks:
+            yield chunk
+
+    async def generate_text(self, prompt, semantic=None, priority=INTERACTIVE, cache=True):
+        self.jarvis.memory.observe_prompt(prompt)
+        semantic_cache = self.jarvis.subsystems.get('semantic_cache') if semantic and cache else None
+        cached = semantic_cache.lookup(*semantic) if semantic_cache else None
+        if cached:
+            return cached
+        async def compute():
+            return (await self.ask_gemini(prompt, priority)).strip()
+        start = time.perf_counter()
+        if cache:
+            text = await self.jarvis.gemini_cache.aget_or_compute(prompt_key(prompt), compute, should_cache=bool)
+        else:
+            text = await compute()
+        if text and semantic_cache:
+            semantic_cache.store(*semantic, text, time.perf_counter() - start)
+        return text
+
+    async def stream_text(self, prompt, semantic=None, cache=True):
+        self.jarvis.memory.observe_prompt(prompt)
+        semantic_cache = self.jarvis.subsystems.get('semantic_cache') if semantic and cache else None
+        key = prompt_key(prompt) if cache else None
+        cached = ((semantic_cache.lookup(*semantic) if semantic_cache else None)
+                  or (key and self.jarvis.gemini_cache.get(key)))
+        if cached:
+            yield cached
+            return
+        start = time.perf_counter()
+        chunks = []
+        async for text in self.stream_gemini(prompt):
+            chunks.append(text)
+            yield text
+        full_text = ''.join(chunks).strip()
+        if full_text:
+            if key:
+                self.jarvis.gemini_cache.set(key, full_text)
+            if semantic_cache:
+                semantic_cache.store(*semantic, full_text, time.perf_counter() - start)
+
+    async def fetch_weather(self, city):
+        async def compute():
+            params = {'q': city, 'appid': self.jarvis.WEATHER_API_KEY, 'units': 'metric'}
+            return await self.http.get_json('weather', WEATHER_URL, params=params)
+        return await self.jarvis.weather_cache.aget_or_compute(city_key(city), compute,
+                                                               should_cache=lambda data: data.get('cod') == 200)
+
+    async def fetch_top_headlines(self, language='en', page_size=3):
+        async def compute():
+            params = {'language': language, 'pageSize': page_size}
+            headers = {'X-Api-Key': self.jarvis.NEWS_API_KEY}
+            return await self.http.get_json('news', NEWS_URL, params=params, headers=headers)
+        return await self.jarvis.news_cache.aget_or_compute(
+            params_key(language=language, page_size=page_size), compute,
+            should_cache=lambda top: top.get('status') == 'ok' and bool(top.get('articles'))
+        )
+
+    async def run_command(self, command, intent, user_id, wait=True):
+        """Answer one command of a batch; the result carries its own timing."""
+        jarvis = self.jarvis
+        start = time.perf_counter()
+        result = {'query': command, 'intent': intent}
+        try:
+            context = await asyncio.to_thread(jarvis.load_context, user_id, command)
+            if intent in jarvis.TASK_INTENTS and not wait and self.gemini:
+                result.update(await asyncio.to_thread(jarvis.queue_ask, intent, command, user_id, context))
+            else:
+                result['response'] = await self.answer(intent, command, user_id, context)
+        except Exception as e:
+            logger.error("Error processing '%s': %s", command, e)
+            result['error'] = f"Error processing request: {str(e)}"
+        result['seconds'] = round(time.perf_counter() - start, 4)
+        return result
+
+    async def iter_commands(self, commands, user_id, wait=True):
+        """Async app.iter_commands: upstream-bound commands run as concurrent tasks, results in order."""
+        jarvis = self.jarvis
+        intents = [jarvis.router.match(command) for command in commands]
+        tasks = {i: asyncio.ensure_future(self.run_command(command, intent, user_id, wait))
+                 for i, (command, intent) in enumerate(zip(commands, intents))
+                 if intent in jarvis.CONCURRENT_INTENTS and len(commands) > 1}
+        try:
+            for i, (command, intent) in enumerate(zip(commands, intents)):
+                result = await tasks[i] if i in tasks else await self.run_command(command, intent, user_id, wait)
+                if 'response' in result and 'job_id' not in result:
+                    jarvis.remember_turn(user_id, command, result['response'])
+                yield result
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def answer(self, intent, clean_query, user_id, context):
+        jarvis = self.jarvis
+        prompt = jarvis.llm_prompt(intent, clean_query, context) if self.gemini else None
+        if prompt is not None:
+            try:
+                priority = BULK if intent in ('note', 'code') else INTERACTIVE
+                text = await self.generate_text(prompt, jarvis.semantic_key(intent, clean_query), priority,
+                                                cache=not jarvis.prompt_context(clean_query, context))
+                return text or "No response received from Gemini."
+            except Exception as e:
+                logger.error("Gemini error: %s", e)
+                return f"Error processing query: {str(e)}."
+        if intent == 'weather' and jarvis.WEATHER_API_KEY:
+            city = jarvis.parse_weather_city(clean_query)
+            try:
+                return jarvis.weather_reply(city, await self.fetch_weather(city))
+            except Exception as e:
+                logger.error("Weather API error: %s", e)
+                return f"Error fetching weather: {str(e)}"
+        if intent == 'news' and jarvis.NEWS_API_KEY:
+            try:
+                return jarvis.headlines_reply(await self.fetch_top_headlines())
+            except Exception as e:
+                logger.error("News API error: %s", e)
+                return f"Error fetching news: {str(e)}"
+        # Local intents (apps, reminders, system controls) keep their blocking handlers on a worker thread
+        return await asyncio.to_thread(jarvis.router.handle, intent, clean_query, user_id, context)
+
+
+def create_app(jarvis):
+    """Build the Quart app serving ASYNC_ROUTES for the loaded app module."""
+    service = AsyncJarvis(jarvis)
+    app = Quart(__name__)
+    # SSE replies may stream for longer than Quart's default response timeout
+    app.config['RESPONSE_TIMEOUT'] = None
+    app.extensions['jarvis'] = service
+    app.json = jarvis.TracedJSONProvider(app)
+
+    @app.before_serving
+    async def startup():
+        await service.start()
+
+    @app.after_serving
+    async def shutdown():
+        await service.stop()
+
+    # Each request runs in its own task and context, so its trace needs no explicit end
+    @app.before_request
+    async def begin_trace():
+        jarvis.tracer.begin(request.url_rule.rule if request.url_rule else 'unmatched')
+
+    @app.after_request
+    async def finish_trace(response):
+        trace = jarvis.tracer.finish(response.status_code)
+        if trace:
+            response.headers['Server-Timing'] = trace.server_timing()
+        return response
+
+    @app.after_request
+    async def allow_cors(response):
+        # Same policy as flask_cors' defaults on the Flask app
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+        response.headers.setdefault('Access-Control-Allow-Headers', 'Content-Type')
+        return response
+
+    async def parse_query():
+        data = await request.get_json(silent=True)
+        if not data or 'query' not in data:
+            logger.error("Invalid request: No query provided")
+            return None
+        return data.get('query', '').lower().strip(), data.get('user_id', 'user1'), bool(data.get('wait'))
+
+    def sse_response(events):
+        return Response(events, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    @app.route('/ask', methods=['POST'])
+    async def ask():
+        parsed = await parse_query()
+        if parsed is None:
+            return jsonify({'error': 'No query provided'}), 400
+        query, user_id, wait = parsed
+        logger.debug("Raw query received: %s (user: %s)", query, user_id)
+        try:
+            commands = jarvis.split_commands(query)
+            if len(commands) > 1:
+                results = [result async for result in service.iter_commands(commands, user_id, wait)]
+                return jsonify({'response': jarvis.merge_results(results), 'results': results})
+            clean_query = commands[0]
+            # History search scores a NumPy matrix; keep it off the event loop
+            context = await asyncio.to_thread(jarvis.load_context, user_id, clean_query)
+            intent = jarvis.router.match(clean_query)
+            # Slow intents go to app.py's task queue, as on the threaded server
+            if intent in jarvis.TASK_INTENTS and not wait and service.gemini:
+                return jsonify(await asyncio.to_thread(jarvis.queue_ask, intent, clean_query, user_id, context)), 202
+            response = await service.answer(intent, clean_query, user_id, context)
+            jarvis.remember_turn(user_id, clean_query, response)
+            logger.debug("Response: %s...", response[:100])
+            return jsonify({'response': response})
+        except Exception as e:
+            error_message = f"Error processing request: {str(e)}"
+            logger.error(error_message)
+            return jsonify({'error': error_message}), 500
+
+    @app.route('/ask/batch', methods=['POST'])
+    async def ask_batch():
+        batch, error = jarvis.parse_batch(await request.get_json(silent=True))
+        if error:
+            return jsonify({'error': error}), 400
+        start = time.perf_counter()
+        results = [result async for result in service.iter_commands(batch['commands'], batch['user_id'], batch['wait'])]
+        return jsonify({'results': results, 'seconds': round(time.perf_counter() - start, 4)})
+
+    @app.route('/ask/stream', methods=['POST'])
+    async def ask_stream():
+        parsed = await parse_query()
+        if parsed is None:
+            return jsonify({'error': 'No query provided'}), 400
+        query, user_id, _ = parsed
+        logger.debug("Raw streaming query received: %s (user: %s)", query, user_id)
+        commands = jarvis.split_commands(query)
+        if len(commands) > 1:
+            async def command_events():
+                results = []
+                async for result in service.iter_commands(commands, user_id):
+                    results.append(result)
+                    text = result.get('response') or result.get('error', '')
+                    yield jarvis.sse_event({'delta': text if len(results) == 1 else '\n\n' + text, 'result': result})
+                yield jarvis.sse_event({'response': jarvis.merge_results(results), 'results': results}, event='done')
+            return sse_response(command_events())
+        try:
+            clean_query = commands[0]
+            # History search scores a NumPy matrix; keep it off the event loop
+            context = await asyncio.to_thread(jarvis.load_context, user_id, clean_query)
+            intent = jarvis.router.match(clean_query)
+            prompt = jarvis.llm_prompt(intent, clean_query, context) if service.gemini else None
+            response = await service.answer(intent, clean_query, user_id, context) if prompt is None else None
+        except Exception as e:
+            error_message = f"Error processing request: {str(e)}"
+            logger.error(error_message)
+            return jsonify({'error': error_message}), 500
+
+        async def events():
+            full_response = response
+            if full_response is None:
+                chunks = []
+                try:
+                    async for chunk in service.stream_text(prompt, jarvis.semantic_key(intent, clean_query),
+                                                           cache=not jarvis.prompt_context(clean_query, context)):
+                        chunks.append(chunk)
+                        yield jarvis.sse_event({'delta': chunk})
+                except Exception as e:
+                    logger.error("Gemini streaming error: %s", e)
+                    yield jarvis.sse_event({'error': f"Error processing query: {str(e)}."}, event='error')
+                    return
+                full_response = ''.join(chunks).strip() or "No response received from Gemini."
+            else:
+                yield jarvis.sse_event({'delta': full_response})
+            jarvis.remember_turn(user_id, clean_query, full_response)
+            yield jarvis.sse_event({'response': full_response}, event='done')
+
+        return sse_response(events())
+
+    async def parse_chat():
+        data = await request.get_json(silent=True) or {}
+        return data.get('text', '').strip(), data.get('user_id', 'user1')
+
+    @app.route('/chat', methods=['POST'])
+    async def chat_post():
+        text, user_id = await parse_chat()
+        if not text:
+            return jsonify({"error": "Empty message"}), 400
+        if not service.gemini:
+            return jsonify({"error": "GEMINI_API_KEY not configured"}), 503
+        prompt = jarvis.friend_prompt(text, await asyncio.to_thread(jarvis.load_context, user_id, text), user_id)
+        jarvis.memory.observe_prompt(prompt)
+        try:
+            reply = (await service.ask_gemini(prompt)).strip()
+            jarvis.remember_turn(user_id, text, reply)
+            return jsonify({"user_message": text, "friend_reply": reply})
+        except Exception as e:
+            logger.error("AI friend chat error: %s", e)
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/chat/stream', methods=['POST'])
+    async def chat_stream():
+        text, user_id = await parse_chat()
+        if not text:
+            return jsonify({"error": "Empty message"}), 400
+        if not service.gemini:
+            return jsonify({"error": "GEMINI_API_KEY not configured"}), 503
+        prompt = jarvis.friend_prompt(text, await asyncio.to_thread(jarvis.load_context, user_id, text), user_id)
+        jarvis.memory.observe_prompt(prompt)
+
+        async def events():
+            chunks = []
+            try:
+                async for chunk in service.stream_gemini(prompt):
+                    chunks.append(chunk)
+                    yield jarvis.sse_event({'delta': chunk})
+            except Exception as e:
+                logger.error("AI friend chat stream error: %s", e)
+                yield jarvis.sse_event({'error': str(e)}, event='error')
+                return
+            reply = ''.join(chunks).strip()
+            jarvis.remember_turn(user_id, text, reply)
+            yield jarvis.sse_event({'user_message': text, 'friend_reply': reply}, event='done')
+
+        return sse_response(events())
+
+    @app.route('/events', methods=['GET'])
+    async def events():
+        user_id = request.args.get('user_id', 'user1')
+        last_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', ''))
+        last_id = int(last_id) if last_id.isdigit() else None
+        heartbeat = float(os.getenv('EVENTS_HEARTBEAT', '15'))
+        subscription = jarvis.event_bus.subscribe(user_id, loop=asyncio.get_running_loop())
+
+        async def stream():
+            try:
+                yield "retry: 3000\n\n"
+                sent = last_id or 0
+                if last_id is not None:
+                    for event in jarvis.event_bus.replay(user_id, last_id):
+                        sent = event['id']
+                        yield sse_format(event)
+                while True:
+                    batch = [event for event in await subscription.aget(timeout=heartbeat) if event['id'] > sent]
+                    if not batch:
+                        yield ": keepalive\n\n"
+                    for event in batch:
+                        sent = event['id']
+                        yield sse_format(event)
+            finally:
+                jarvis.event_bus.unsubscribe(subscription)
+
+        return sse_response(stream())
+
+    @app.route('/upstream/async/stats', methods=['GET'])
+    async def upstream_stats():
+        return jsonify(service.http.stats() if service.http else {})
+
+    return app
+
+
+def asgi_app(jarvis):
+    """One ASGI app: ASYNC_ROUTES go to Quart, every other path to the Flask app."""
+    quart_app = create_app(jarvis)
+    flask_app = AsyncioWSGIMiddleware(jarvis.app)
+
+    async def dispatch(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] not in ASYNC_ROUTES:
+            await flask_app(scope, receive, send)
+        else:
+            await quart_app(scope, receive, send)
+    return dispatch
+
+
+def serve(jarvis, host, port, certfile=None, keyfile=None):
+    """Run the ASGI app on hypercorn until interrupted."""
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    config.accesslog = None
+    if certfile and keyfile:
+        config.certfile = certfile
+        config.keyfile = keyfile
+    asyncio.run(hypercorn_serve(asgi_app(jarvis), config))
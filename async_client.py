@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from http_client import Upstream, CircuitOpenError, RetryableError
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncUpstream(Upstream):
+    """Upstream policy for coroutines, with a bound on concurrent calls.
+
+    At most `limit` calls are in flight at once; the rest wait on a
+    semaphore instead of piling onto the remote service. Retries, the
+    circuit breaker and latency histogram work as in Upstream.
+    """
+
+    def __init__(self, name, limit=64, retry_on=(aiohttp.ClientConnectionError, asyncio.TimeoutError, RetryableError),
+                 **options):
+        super().__init__(name, retry_on=retry_on, **options)
+        self.limit = limit
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the upstream's concurrency slots for the duration of the block."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def call(self, func):
+        """Await func() in a concurrency slot, with bounded retries and full-jitter backoff."""
+        async with self.slot():
+            return await self.attempt(func)
+
+    async def attempt(self, func):
+        """Like call(), for callers already holding a slot."""
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} is temporarily unavailable (circuit open)")
+            start = time.perf_counter()
+            try:
+                result = await func()
+            except Exception as e:
+                self._record(start, failed=True)
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                logger.debug("%s call failed (%s); retrying in %.2fs", self.name, e, delay)
+                await asyncio.sleep(delay)
+            else:
+                self._record(start, failed=False)
+                self.breaker.record_success()
+                return result
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({'limit': self.limit, 'in_flight': self.in_flight,
+                      'max_in_flight': self.max_in_flight, 'waiting': self.waiting})
+        return stats
+
+
+class AsyncHTTPClient:
+    """Async counterpart of HTTPClient: one pooled aiohttp session plus per-upstream limits.
+
+    limits maps upstream names to their maximum concurrent calls; other
+    upstreams get default_limit. Create it inside the event loop that uses it.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10.0, max_connections=512,
+                 limits=None, default_limit=64, **upstream_defaults):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_connections),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        )
+        self.limits = limits or {}
+        self.default_limit = default_limit
+        self.upstream_defaults = upstream_defaults
+        self.upstreams = {}
+
+    def upstream(self, name, **options):
+        """Return the named upstream, creating it with options on first use."""
+        if name not in self.upstreams:
+            options.setdefault('limit', self.limits.get(name, self.default_limit))
+            self.upstreams[name] = AsyncUpstream(name, **{**self.upstream_defaults, **options})
+        return self.upstreams[name]
+
+    @staticmethod
+    def _check(upstream, response):
+        if response.status == 429 or response.status >= 500:
+            response.release()
+            raise RetryableError(f"{upstream} returned HTTP {response.status}")
+
+    async def request_json(self, upstream, method, url, **kwargs):
+        """Send a request through the named upstream and decode its JSON body.
+
+        429/5xx responses are retried; other error bodies are returned as-is,
+        like the JSON the blocking clients hand back.
+        """
+        async def send():
+            async with self.session.request(method, url, **kwargs) as response:
+                self._check(upstream, response)
+                return await response.json(content_type=None)
+        return await self.upstream(upstream).call(send)
+
+    async def get_json(self, upstream, url, **kwargs):
+        return await self.request_json(upstream, 'GET', url, **kwargs)
+
+    async def post_json(self, upstream, url, **kwargs):
+        return await self.request_json(upstream, 'POST', url, **kwargs)
+
+    async def stream_lines(self, upstream, method, url, **kwargs):
+        """Yield response lines as they arrive, holding a concurrency slot until the body ends.
+
+        Only opening the stream is retried; a failure mid-body propagates.
+        """
+        target = self.upstream(upstream)
+        async with target.slot():
+            async def open_stream():
+                response = await self.session.request(method, url, **kwargs)
+                self._check(upstream, response)
+                return response
+            response = await target.attempt(open_stream)
+            try:
+                response.raise_for_status()
+                async for line in response.content:
+                    yield line.decode('utf-8').rstrip('\r\n')
+            finally:
+                response.release()
+
+    def stats(self):
+        return {name: u.stats() for name, u in self.upstreams.items()}
+
+    async def aclose(self):
+        await self.session.close()
@@ -0,0 +1,252 @@
+import logging
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+
+from http_client import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# CPU time per audio frame histogram bucket upper bounds, in seconds
+FRAME_CPU_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.032)
+
+
+class PcmRing:
+    """The last `seconds` of 16-bit mono audio in one preallocated array."""
+
+    def __init__(self, sample_rate, seconds):
+        self.sample_rate = sample_rate
+        self.samples = np.zeros(int(sample_rate * seconds), dtype=np.int16)
+        self.written = 0
+
+    def write(self, pcm):
+        n = len(pcm)
+        start = self.written % len(self.samples)
+        first = min(n, len(self.samples) - start)
+        self.samples[start:start + first] = pcm[:first]
+        if first < n:
+            self.samples[:n - first] = pcm[first:]
+        self.written += n
+
+    def read(self, start, count):
+        """Copy of samples [start, start + count) in stream positions, clipped to what the ring still holds."""
+        start = max(start, self.written - len(self.samples), 0)
+        count = max(0, min(count, self.written - start))
+        offset = start % len(self.samples)
+        if offset + count <= len(self.samples):
+            return self.samples[offset:offset + count].copy()
+        return np.concatenate((self.samples[offset:], self.samples[:offset + count - len(self.samples)]))
+
+
+class WakeEvent:
+    def __init__(self, keyword_index, sample, timestamp):
+        self.keyword_index = keyword_index
+        self.sample = sample
+        self.timestamp = timestamp
+
+
+class WakeWordListener:
+    """Continuous wake word detection over a microphone or recorded source.
+
+    The audio thread reads one engine frame at a time, hands the engine a
+    zero-copy int16 view of the capture bytes, and appends the frame to a
+    PcmRing holding the last ring_seconds of audio. Detections are queued to
+    a dispatcher thread that calls on_wake(event), so a slow callback never
+    stalls capture. If the source fails, it is reopened after retry_delay;
+    a finite source (a WAV file) ends the listener when exhausted.
+
+    engine needs frame_length, sample_rate and process(pcm) -> keyword
+    index or -1 (pvporcupine's interface). open_source() returns an object
+    with read(frame_count) -> bytes and close().
+    """
+
+    def __init__(self, engine, open_source, on_wake=None, ring_seconds=10, retry_delay=2.0):
+        self.engine = engine
+        self.open_source = open_source
+        self.on_wake = on_wake
+        self.retry_delay = retry_delay
+        self.ring = PcmRing(engine.sample_rate, ring_seconds)
+        self.frames = 0
+        self.detections = 0
+        self.source_errors = 0
+        self.cpu_seconds = 0.0
+        self.frame_cpu = LatencyHistogram(buckets=FRAME_CPU_BUCKETS)
+        self.running = False
+        self._events = queue.Queue()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        if self.running:
+            return False
+        self.running = True
+        self._threads = [threading.Thread(target=self._capture_loop, name='wake-word', daemon=True),
+                         threading.Thread(target=self._dispatch_loop, name='wake-word-events', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return True
+
+    def stop(self, wait=False):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        self._events.put(None)
+        if wait:
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join(timeout=5)
+
+    def _capture_loop(self):
+        frame_bytes = self.engine.frame_length * 2
+        try:
+            while self.running:
+                try:
+                    source = self.open_source()
+                except Exception as e:
+                    self.source_errors += 1
+                    logger.error("Wake word audio source error: %s", e)
+                    time.sleep(self.retry_delay)
+                    continue
+                logger.debug("Listening for wake word...")
+                try:
+                    while self.running:
+                        pcm = source.read(self.engine.frame_length)
+                        if len(pcm) < frame_bytes:
+                            logger.debug("Wake word audio source ended")
+                            return
+                        self.process(pcm)
+                except Exception as e:
+                    self.source_errors += 1
+                    logger.error("Wake word detection error: %s", e)
+                    time.sleep(self.retry_delay)
+                finally:
+                    source.close()
+        finally:
+            self.stop()
+
+    def process(self, pcm):
+        """Run one frame of little-endian int16 PCM bytes through the ring and the engine."""
+        start = time.thread_time()
+        keyword_index = self.engine.process(memoryview(pcm).cast('h'))
+        with self._cond:
+            self.ring.write(np.frombuffer(pcm, dtype=np.int16))
+            cpu = time.thread_time() - start
+            self.frame_cpu.observe(cpu)
+            self.frames += 1
+            self.cpu_seconds += cpu
+            if keyword_index >= 0:
+                self.detections += 1
+                self._events.put(WakeEvent(keyword_index, self.ring.written, time.time()))
+            self._cond.notify_all()
+        return keyword_index
+
+    def _dispatch_loop(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            logger.debug("Wake word %s detected", event.keyword_index)
+            if self.on_wake:
+                try:
+                    self.on_wake(event)
+                except Exception as e:
+                    logger.error("Wake word callback error: %s", e)
+
+    def audio_after(self, event, seconds, before=0.0, timeout=None):
+        """int16 samples from `before` seconds ahead of a detection to `seconds` after it.
+
+        Blocks until that audio has been captured, the listener stops, or timeout.
+        """
+        rate = self.engine.sample_rate
+        end = event.sample + int(seconds * rate)
+        with self._cond:
+            self._cond.wait_for(lambda: self.ring.written >= end or not self.running, timeout)
+            start = event.sample - int(before * rate)
+            return self.ring.read(start, end - start)
+
+    def stats(self):
+        with self._cond:
+            audio_seconds = self.frames * self.engine.frame_length / self.engine.sample_rate
+            return {
+                'running': self.running,
+                'frames': self.frames,
+                'detections': self.detections,
+                'source_errors': self.source_errors,
+                'audio_seconds': round(audio_seconds, 2),
+                'cpu_ms_per_frame': round(self.cpu_seconds / self.frames * 1000, 4) if self.frames else 0.0,
+                'cpu_fraction': round(self.cpu_seconds / audio_seconds, 5) if audio_seconds else 0.0,
+                'frame_cpu_seconds': self.frame_cpu.snapshot()
+            }
+
+
+class MicrophoneSource:
+    """PyAudio input stream in the shape WakeWordListener reads from."""
+
+    def __init__(self, pyaudio, sample_rate, frame_length):
+        self._pa = pyaudio.PyAudio()
+        try:
+            self._stream = self._pa.open(rate=sample_rate, channels=1, format=pyaudio.paInt16, input=True,
+                                         frames_per_buffer=frame_length)
+        except Exception:
+            self._pa.terminate()
+            raise
+
+    def read(self, frame_count):
+        return self._stream.read(frame_count, exception_on_overflow=False)
+
+    def close(self):
+        self._stream.close()
+        self._pa.terminate()
+
+
+class WavSource:
+    """16-bit mono WAV file as an audio source, optionally paced in real time."""
+
+    def __init__(self, path, realtime=False):
+        self._wav = wave.open(path, 'rb')
+        if self._wav.getsampwidth() != 2 or self._wav.getnchannels() != 1:
+            self._wav.close()
+            raise ValueError(f"{path} must be 16-bit mono PCM")
+        self.sample_rate = self._wav.getframerate()
+        self.realtime = realtime
+        self._started = time.perf_counter()
+        self._read = 0
+
+    def read(self, frame_count):
+        if self.realtime:
+            delay = self._started + self._read / self.sample_rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        pcm = self._wav.readframes(frame_count)
+        self._read += len(pcm) // 2
+        return pcm
+
+    def close(self):
+        self._wav.close()
+
+
+class EnergyEngine:
+    """Stub wake word engine: reports keyword 0 when a frame gets loud after a quiet stretch.
+
+    Stands in for Porcupine when feeding recorded audio (WAKE_WORD_ENGINE=energy).
+    """
+
+    def __init__(self, sample_rate=16000, frame_length=512, threshold=3000, quiet_frames=15):
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.threshold = threshold
+        self.quiet_frames = quiet_frames
+        self._quiet = quiet_frames
+
+    def process(self, pcm):
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        loud = np.sqrt(np.mean(samples.astype(np.float32) ** 2)) >= self.threshold
+        detected = loud and self._quiet >= self.quiet_frames
+        self._quiet = 0 if loud else self._quiet + 1
+        return 0 if detected else -1
+
+    def delete(self):
+        pass
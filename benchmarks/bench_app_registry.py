@@ -0,0 +1,130 @@
+"""App-name resolution for "open <app>" before and after AppRegistry.
+
+The registry is apps.json plus `extra` synthetic entries (default 500).
+Queries mix "open <name> [extra]", "<name> kholo" and names as speech
+recognition mishears them (a dropped, doubled or swapped letter, words
+split apart).
+
+before: the old handle_open lookup, one regex per APPS key per request
+        for "<name> kholo" and an exact dict lookup for "open <name>".
+after:  AppRegistry.find(), one precompiled matcher plus a trigram index.
+
+Reports per-query latency, how many misheard names each resolves to the
+intended app, and how long a (re)load of the config takes.
+
+Usage: python benchmarks/bench_app_registry.py [extra] [queries]
+"""
+import json
+import os
+import random
+import re
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from app_registry import AppRegistry  # noqa: E402
+
+
+def synthetic_config(extra, rng):
+    with open(os.path.join(ROOT, 'apps.json'), encoding='utf-8') as f:
+        config = json.load(f)
+    syllables = ['ka', 'ro', 'mi', 'tel', 'zen', 'pix', 'lo', 'va', 'nex', 'dor', 'qui', 'sta', 'bri', 'mo']
+    target = len(config) + extra
+    while len(config) < target:
+        name = ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        config.setdefault(name, {'url': f"https://{name}.example.com"})
+    return config
+
+
+def mishear(name, rng):
+    """A speech-recognition-like error: drop, double or swap a letter, or split the word."""
+    i = rng.randrange(1, len(name) - 1)
+    kind = rng.choice(('drop', 'double', 'swap', 'split'))
+    if kind == 'drop':
+        return name[:i] + name[i + 1:]
+    if kind == 'double':
+        return name[:i] + name[i] + name[i:]
+    if kind == 'swap':
+        return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+    return name[:i] + ' ' + name[i:]
+
+
+def workload(names, count, rng):
+    """(query, intended app) tuples."""
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names)
+        spoken = mishear(name, rng) if len(name) > 4 and rng.random() < 0.3 else name
+        form = rng.random()
+        if form < 0.5:
+            queries.append((f"open {spoken} {rng.choice(string.ascii_lowercase)}ofi music", name))
+        elif form < 0.8:
+            queries.append((f"{spoken} kholo", name))
+        else:
+            queries.append((f"please {spoken} kholo yaar", name))
+    return queries
+
+
+def before(apps, query):
+    """The lookup handle_open did before AppRegistry."""
+    match = re.search(r'(?:open|kholo|khol|launch|start|kholna)\s+(\w+)(?:\s+(.*))?', query, re.IGNORECASE)
+    if match:
+        name = match.group(1).strip().lower()
+        return name if name in apps else None
+    for key in apps.keys():
+        if re.search(r'\b' + re.escape(key) + r'\b', query, re.IGNORECASE):
+            return key
+    return None
+
+
+def after(registry, query):
+    verb = re.search(r'\b(?:open|kholo|khol|launch|start|kholna)\b', query, re.IGNORECASE)
+    before_text, after_text = query[:verb.start()], query[verb.end():]
+    key = registry.find(after_text)[0] if after_text.strip() else None
+    if key is None and before_text.strip():
+        key = registry.find(before_text, at_end=True)[0]
+    return key
+
+
+def measure(resolve, queries):
+    costs, correct, misheard_correct = [], 0, 0
+    for query, intended in queries:
+        start = time.perf_counter()
+        key = resolve(query)
+        costs.append(time.perf_counter() - start)
+        correct += key == intended
+        misheard_correct += key == intended and intended not in query
+    return costs, correct, misheard_correct
+
+
+def main():
+    extra = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    rng = random.Random(0)
+    config = synthetic_config(extra, rng)
+    path = os.path.join(tempfile.mkdtemp(prefix='jarvis-apps-'), 'apps.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+    start = time.perf_counter()
+    registry = AppRegistry(path)
+    load = time.perf_counter() - start
+    queries = workload(sorted(config), count, rng)
+    misheard = sum(intended not in query for query, intended in queries)
+
+    print(f"{len(config)} apps, {count} queries ({misheard} with a misheard name); config load {load * 1000:.1f} ms")
+    for label, resolve in (('before', lambda q: before(config, q)), ('after', lambda q: after(registry, q))):
+        costs, correct, misheard_correct = measure(resolve, queries)
+        print(f"{label:<7} median {statistics.median(costs) * 1e6:6.1f} us, "
+              f"mean {statistics.mean(costs) * 1e6:7.1f} us, p99 {sorted(costs)[int(len(costs) * 0.99)] * 1e6:7.1f} us; "
+              f"resolved {correct}/{count}, misheard {misheard_correct}/{misheard}")
+    print(f"        {registry.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Compound /ask: commands answered one after another vs concurrently.
+
+The utterance "what's the weather in <city>. show top headlines. tell me
+about <topic>. what time is it" goes through the Flask test client with
+weather, news and Gemini replaced by fakes that sleep for a fixed latency
+each, so no server or API key is needed. GEMINI_RPM is raised so the
+gateway's token bucket never holds the fake model back. The sequential
+run empties app.CONCURRENT_INTENTS; the concurrent run uses the default
+set. Reports the wall time of each request and the per-command seconds
+/ask returns.
+
+Exits non-zero unless the concurrent median is below the sequential one
+and within MARGIN of the slowest single command.
+
+Usage: python benchmarks/bench_ask_batch.py [weather_s] [news_s] [gemini_s] [runs]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['GEMINI_RPM'] = str(10 ** 9)
+# A fresh database each run, so earlier runs' cached answers never stand in for the fakes
+os.chdir(tempfile.mkdtemp(prefix='jarvis-ask-batch-'))
+
+import app as jarvis  # noqa: E402
+
+# Allowed overhead of the concurrent run over its slowest command, as a fraction
+MARGIN = 0.25
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def generate_content(self, prompt, stream=False):
+        time.sleep(self.delay)
+        return FakeResponse(f"About that: {prompt[:40]}")
+
+
+def fake_weather(delay):
+    def fetch(city):
+        time.sleep(delay)
+        return {'cod': 200, 'name': city.title(), 'main': {'temp': 31}, 'weather': [{'description': 'haze'}]}
+    return fetch
+
+
+def fake_headlines(delay):
+    def fetch(language='en', page_size=3):
+        time.sleep(delay)
+        return {'status': 'ok', 'articles': [{'title': 'Headline', 'source': {'name': 'Wire'}}]}
+    return fetch
+
+
+def run(client, runs, concurrent):
+    jarvis.CONCURRENT_INTENTS = set(concurrent)
+    walls, per_command = [], []
+    for i in range(runs):
+        # Fresh city and topic each run so the response caches never answer
+        query = f"what's the weather in city{i}{len(concurrent)}. show top headlines. " \
+                f"tell me about topic {i} {len(concurrent)}. what time is it"
+        start = time.perf_counter()
+        body = client.post('/ask', json={'query': query, 'user_id': 'bench'}).get_json()
+        walls.append(time.perf_counter() - start)
+        per_command.append([(r['intent'], r['seconds']) for r in body['results']])
+    return walls, per_command[-1]
+
+
+def main():
+    weather_s = float(sys.argv[1]) if len(sys.argv) > 1 else 0.3
+    news_s = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    gemini_s = float(sys.argv[3]) if len(sys.argv) > 3 else 0.6
+    runs = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+
+    jarvis.WEATHER_API_KEY = 'bench'
+    jarvis.fetch_weather = fake_weather(weather_s)
+    jarvis.fetch_top_headlines = fake_headlines(news_s)
+    jarvis.subsystems.override('news', object())
+    jarvis.subsystems.override('llm', FakeModel(gemini_s))
+    client = jarvis.app.test_client()
+    default = set(jarvis.CONCURRENT_INTENTS)
+
+    print(f"weather {weather_s}s, news {news_s}s, gemini {gemini_s}s, time local; {runs} runs")
+    print(f"{'mode':<12}{'median s':>10}{'min s':>8}   per command (last run)")
+    medians = {}
+    for name, concurrent in (('sequential', set()), ('concurrent', default)):
+        walls, per_command = run(client, runs, concurrent)
+        medians[name] = statistics.median(walls)
+        detail = ', '.join(f"{intent} {seconds:.3f}" for intent, seconds in per_command)
+        print(f"{name:<12}{medians[name]:>10.3f}{min(walls):>8.3f}   {detail}")
+    jarvis.storage.flush()
+
+    failures = []
+    slowest = max(weather_s, news_s, gemini_s)
+    if medians['concurrent'] > slowest * (1 + MARGIN):
+        failures.append(f"concurrent median {medians['concurrent']:.3f}s is over {1 + MARGIN:.2f}x "
+                        f"the slowest command ({slowest}s)")
+    if medians['concurrent'] >= medians['sequential']:
+        failures.append(f"concurrent median {medians['concurrent']:.3f}s is not below "
+                        f"sequential {medians['sequential']:.3f}s")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Load test /ask in the threaded and async serving modes against a local fake Gemini.
+
+Each mode runs `python app.py --server <mode> --port <port>` in a scratch
+directory with GEMINI_API_ENDPOINT pointing at an in-process fake Gemini
+that answers generateContent after a fixed delay. Distinct queries are sent
+so every request misses the response cache and goes upstream. Reports
+p50/p99 latency, throughput, the peak number of concurrent upstream calls
+the fake server saw, and the server's peak thread count (Linux only).
+
+Usage: python benchmarks/bench_async_serving.py [concurrency] [requests] [upstream_delay_seconds]
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import aiohttp
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+class FakeGemini:
+    """Minimal HTTP/1.1 keep-alive server answering Gemini generateContent calls."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+        self.port = None
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True).start()
+        self._ready.wait()
+        return self
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, '127.0.0.1', 0, backlog=2048)
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def reset(self):
+        self.peak = self.requests = 0
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                await reader.readexactly(length)
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+                self.requests += 1
+                try:
+                    await asyncio.sleep(self.delay)
+                finally:
+                    self.in_flight -= 1
+                payload = json.dumps({
+                    'candidates': [{'content': {'role': 'model', 'parts': [{'text': 'A concise fake answer.'}]},
+                                    'finishReason': 'STOP', 'index': 0}]
+                }).encode()
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                             b'Content-Length: %d\r\n\r\n' % len(payload) + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def thread_count(pid):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def start_server(mode, port, fake, workdir):
+    env = dict(os.environ, GEMINI_API_KEY='fake-key', GEMINI_API_ENDPOINT=f'http://127.0.0.1:{fake.port}',
+               HTTP_POOL_SIZE=os.getenv('HTTP_POOL_SIZE', '512'), JARVIS_RELOAD='0')
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'app.py'), '--server', mode, '--port', str(port)],
+                               cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+async def load(port, concurrency, total, mode):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(f'tell me about {mode} topic number {i}')
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                query = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    async with client.post(f'http://127.0.0.1:{port}/ask', json={'query': query, 'user_id': 'loadtest'}) as response:
+                        body = await response.json()
+                    if response.status != 200 or 'Error' in body.get('response', 'Error'):
+                        errors += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return sorted(latencies), errors, elapsed
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_mode(mode, fake, concurrency, total):
+    with tempfile.TemporaryDirectory() as workdir:
+        port = free_port()
+        process = start_server(mode, port, fake, workdir)
+        peak_threads = [thread_count(process.pid)]
+        done = threading.Event()
+
+        def sample_threads():
+            while not done.wait(0.05):
+                peak_threads.append(thread_count(process.pid))
+        sampler = threading.Thread(target=sample_threads, daemon=True)
+        sampler.start()
+        try:
+            fake.reset()
+            latencies, errors, elapsed = asyncio.run(load(port, concurrency, total, mode))
+        finally:
+            done.set()
+            sampler.join()
+            process.terminate()
+            process.wait(timeout=10)
+    threads = [n for n in peak_threads if n is not None]
+    return {
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+        'rps': total / elapsed,
+        'errors': errors,
+        'upstream_peak': fake.peak,
+        'threads_peak': max(threads) if threads else 'n/a'
+    }
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.5
+    fake = FakeGemini(delay).start()
+    print(f"{total} /ask requests, {concurrency} concurrent clients, fake Gemini latency {delay * 1000:.0f} ms")
+    print(f"{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}{'upstream peak':>15}{'threads peak':>14}")
+    for mode in ('threaded', 'async'):
+        r = run_mode(mode, fake, concurrency, total)
+        print(f"{mode:<10}{r['p50'] * 1000:>10.0f}{r['p99'] * 1000:>10.0f}{r['rps']:>10.1f}{r['errors']:>8}"
+              f"{r['upstream_peak']:>15}{r['threads_peak']:>14}")
+
+
+if __name__ == '__main__':
+    main()
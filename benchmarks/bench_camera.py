@@ -0,0 +1,152 @@
+"""Capture rate with snapshots: the old inline camera loop vs the ring pipeline.
+
+Both runs read from camera.SyntheticSource at a fixed frame rate and take a
+JPEG snapshot every `snapshot_every` frames. The inline loop writes the
+snapshot on the capture thread, as open_camera() used to; the pipeline
+hands it to the snapshot pool and also feeds an MJPEG consumer. Reports
+delivered frames per second, the longest gap between captured frames,
+frames the source produced while nobody was reading (missed), and the
+pipeline's ring drop counter.
+
+Then checks the ring with an unpaced source and exits non-zero on a
+failure: a pinned frame is never overwritten while capture continues;
+with every slot but the latest pinned, frames are counted as dropped;
+capture resumes once the pins are released; and every frame read is
+either captured or dropped.
+
+Usage: python benchmarks/bench_camera.py [seconds] [fps] [snapshot_every] [WIDTHxHEIGHT]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from camera import Camera, SyntheticSource  # noqa: E402
+
+
+def inline(seconds, fps, snapshot_every, size, directory):
+    source = SyntheticSource(*size, fps=fps)
+    frames, gaps, last = 0, [], time.perf_counter()
+    deadline = last + seconds
+    while time.perf_counter() < deadline:
+        ok, frame = source.read()
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+        frames += 1
+        if frames % snapshot_every == 0:
+            cv2.imwrite(os.path.join(directory, f'capture_{frames}.jpg'), frame)
+    return {'fps': frames / seconds, 'max_gap_ms': max(gaps) * 1000, 'missed': source.missed, 'dropped': 'n/a',
+            'stream_fps': 'n/a'}
+
+
+def pipeline(seconds, fps, snapshot_every, size, directory):
+    sources = []
+
+    def open_source():
+        sources.append(SyntheticSource(*size, fps=fps))
+        return sources[-1]
+
+    camera = Camera(open_source, snapshot_dir=directory)
+    gaps = []
+    streamed = 0
+
+    def stream():
+        nonlocal streamed
+        for _ in camera.mjpeg():
+            streamed += 1
+
+    def snapshots():
+        seq, last = 0, time.perf_counter()
+        while camera.active:
+            with camera.frame(after=seq, consumer='bench') as (new_seq, frame):
+                if frame is None:
+                    continue
+                now = time.perf_counter()
+                gaps.append((now - last) / (new_seq - seq))
+                last = now
+                if new_seq // snapshot_every != seq // snapshot_every:
+                    camera.snapshot()
+                seq = new_seq
+
+    camera.start(display=False)
+    threads = [threading.Thread(target=stream, daemon=True), threading.Thread(target=snapshots, daemon=True)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stats = camera.stats()
+    camera.stop(wait=True)
+    for thread in threads:
+        thread.join(timeout=5)
+    return {'fps': stats['captured'] / seconds, 'max_gap_ms': max(gaps[1:] or [0]) * 1000, 'missed': sources[0].missed,
+            'dropped': stats['dropped'], 'stream_fps': round(streamed / seconds, 1)}
+
+
+def ring_checks():
+    """Failures of the ring's pinning and drop accounting, as messages."""
+    sources = []
+
+    def open_source():
+        sources.append(SyntheticSource(64, 48, fps=0))
+        return sources[-1]
+
+    camera = Camera(open_source, slots=3)
+    camera.start(display=False)
+    failures = []
+    with camera.frame() as (seq, first):
+        original = first.copy()
+        captured = camera.stats()['captured']
+        time.sleep(0.1)
+        if camera.stats()['captured'] - captured <= camera.slots:
+            failures.append("capture stalled with one slot pinned")
+        if not np.array_equal(first, original):
+            failures.append("a pinned frame was overwritten")
+        with camera.frame(after=seq) as (_, second):
+            dropped = camera.stats()['dropped']
+            time.sleep(0.1)
+            stats = camera.stats()
+            if stats['pinned'] != 2 or stats['dropped'] <= dropped:
+                failures.append(f"with 2 of 3 slots pinned: {stats['pinned']} pinned, "
+                                f"{stats['dropped'] - dropped} dropped")
+            if not np.array_equal(first, original):
+                failures.append("a pinned frame was overwritten while frames were dropped")
+    captured = camera.stats()['captured']
+    time.sleep(0.1)
+    if camera.stats()['captured'] <= captured:
+        failures.append("capture did not resume after the pins were released")
+    camera.stop(wait=True)
+    stats = camera.stats()
+    print(f"ring: {stats['captured']} captured + {stats['dropped']} dropped of {sources[0].frames} frames read")
+    if stats['captured'] + stats['dropped'] != sources[0].frames:
+        failures.append(f"{sources[0].frames} frames read but {stats['captured']} captured + "
+                        f"{stats['dropped']} dropped")
+    return failures
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    fps = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    snapshot_every = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    size = tuple(int(n) for n in sys.argv[4].split('x')) if len(sys.argv) > 4 else (1280, 720)
+    print(f"{seconds:.0f} s at {fps:.0f} fps, {size[0]}x{size[1]}, JPEG snapshot every {snapshot_every} frames")
+    print(f"{'mode':<10}{'fps':>8}{'max gap ms':>12}{'missed':>8}{'dropped':>9}{'stream fps':>12}")
+    for name, run in (('inline', inline), ('pipeline', pipeline)):
+        with tempfile.TemporaryDirectory() as directory:
+            r = run(seconds, fps, snapshot_every, size, directory)
+        print(f"{name:<10}{r['fps']:>8.1f}{r['max_gap_ms']:>12.1f}{r['missed']:>8}{r['dropped']:>9}{r['stream_fps']:>12}")
+
+    failures = ring_checks()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
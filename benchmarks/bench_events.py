@@ -0,0 +1,174 @@
+"""Idle /events connections and broadcast fan-out, threaded vs async server.
+
+Each mode starts this script with --serve, which imports app.py, adds a
+thread that broadcasts one event per second on app.event_bus, and serves
+it the way app.py's __main__ does for that mode. The load side opens N SSE
+connections, waits until the server reports them all subscribed, samples
+the server's RSS and thread count (Linux only), and measures
+publish-to-receive latency of the next few broadcasts across every
+connection.
+
+A server that stops answering /events/stats under the load (the threaded
+server does at around 1000 connections on a small machine) is reported
+as saturated and the next mode still runs.
+
+Usage: python benchmarks/bench_events.py [connections] [broadcasts]
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import aiohttp
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def serve(mode, port):
+    sys.path.insert(0, ROOT)
+    import app as jarvis
+
+    def publisher():
+        time.sleep(2)
+        while True:
+            jarvis.event_bus.publish('bench', {'sent': time.time()})
+            time.sleep(1)
+
+    threading.Thread(target=publisher, daemon=True).start()
+    if mode == 'async':
+        from async_app import serve as serve_async
+        serve_async(jarvis, '127.0.0.1', port)
+    else:
+        # Same server app.py runs without SSL: the Werkzeug server, one thread per connection
+        jarvis.app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def proc_status(pid, field):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+async def listen(session, url, latencies, broadcasts, ready):
+    async with session.get(url) as response:
+        ready()
+        received = 0
+        async for line in response.content:
+            if line.startswith(b'data: '):
+                data = json.loads(line[6:])
+                if 'sent' in data:
+                    latencies.append(time.time() - data['sent'])
+                    received += 1
+                    if received >= broadcasts:
+                        return
+
+
+async def load(port, connections, broadcasts, pid):
+    latencies = []
+    opened = 0
+
+    def ready():
+        nonlocal opened
+        opened += 1
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = [asyncio.create_task(listen(session, f'http://127.0.0.1:{port}/events?user_id=u{i % 50}', latencies,
+                                            broadcasts, ready)) for i in range(connections)]
+        try:
+            deadline = time.monotonic() + 120
+            while time.monotonic() < deadline:
+                clients = await asyncio.to_thread(get_json, f'http://127.0.0.1:{port}/events/stats')
+                if clients['clients'] >= connections:
+                    break
+                await asyncio.sleep(0.5)
+            rss_kb, threads = proc_status(pid, 'VmRSS'), proc_status(pid, 'Threads')
+            await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 120)
+        except (OSError, asyncio.TimeoutError):
+            # Saturated server: drop the connections before run_mode reports it
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    return sorted(latencies), rss_kb, threads, opened
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))] if sorted_values else float('nan')
+
+
+def run_mode(mode, connections, broadcasts):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, JARVIS_RELOAD='0', WARM_UP='none', EVENTS_HEARTBEAT='30')
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, str(port)],
+                                   cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    get_json(f'http://127.0.0.1:{port}/events/stats')
+                    break
+                except OSError:
+                    if process.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError(f"{mode} server did not start")
+                    time.sleep(0.3)
+            idle_rss = proc_status(process.pid, 'VmRSS')
+            try:
+                latencies, rss_kb, threads, opened = asyncio.run(load(port, connections, broadcasts, process.pid))
+            except (OSError, asyncio.TimeoutError) as e:
+                return {'saturated': f"{type(e).__name__}: {e}"}
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                # A saturated server can be too busy closing sockets to exit on SIGTERM
+                process.kill()
+                process.wait()
+    per_connection = (rss_kb - idle_rss) / connections if rss_kb and idle_rss else float('nan')
+    return {'opened': opened, 'threads': threads, 'rss_mb': (rss_kb or 0) / 1024, 'kb_per_conn': per_connection,
+            'p50': percentile(latencies, 0.5), 'p99': percentile(latencies, 0.99), 'received': len(latencies)}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], int(sys.argv[3]))
+        return
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    broadcasts = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"{connections} idle /events connections, {broadcasts} broadcasts")
+    print(f"{'mode':<10}{'open':>7}{'threads':>9}{'RSS MB':>9}{'KB/conn':>9}{'p50 ms':>9}{'p99 ms':>9}{'received':>10}")
+    for mode in ('threaded', 'async'):
+        r = run_mode(mode, connections, broadcasts)
+        if 'saturated' in r:
+            print(f"{mode:<10}saturated: {r['saturated']}")
+            continue
+        print(f"{mode:<10}{r['opened']:>7}{r['threads']:>9}{r['rss_mb']:>9.1f}{r['kb_per_conn']:>9.1f}"
+              f"{r['p50'] * 1000:>9.1f}{r['p99'] * 1000:>9.1f}{r['received']:>10}")
+
+
+if __name__ == '__main__':
+    main()
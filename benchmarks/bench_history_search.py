@@ -0,0 +1,98 @@
+"""Search latency of the history index at 10k, 100k and 1M turns for one user.
+
+Random unit vectors are appended straight into a HistoryIndex in a scratch
+directory (embedding a million synthetic turns would dominate the run),
+then search_vector() is timed: per-segment matrix-vector products plus an
+argpartition top-k. A pure-Python scan is timed at the smallest size for
+comparison, and embedding throughput is reported separately.
+
+Usage: python benchmarks/bench_history_search.py [sizes] [searches] [k]
+    e.g. python benchmarks/bench_history_search.py 10000,100000,1000000 50 5
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from history_index import HistoryIndex, embed_turn  # noqa: E402
+
+DIM = 256
+APPEND_BATCH = 50000
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def random_unit_vectors(rng, rows):
+    vectors = rng.standard_normal((rows, DIM), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(index, rng, rows):
+    user = index._user('bench')
+    start = time.perf_counter()
+    for first in range(0, rows, APPEND_BATCH):
+        count = min(APPEND_BATCH, rows - first)
+        user.append(np.arange(first + 1, first + count + 1, dtype=np.int64), random_unit_vectors(rng, count))
+    user.flush()
+    return time.perf_counter() - start
+
+
+def time_searches(search, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+
+def python_scan(index, query, k):
+    rows = []
+    for segment in index._user('bench').segments:
+        for session_id, vector in zip(segment.ids[:segment.count], segment.vectors[:segment.count]):
+            rows.append((sum(float(a) * float(b) for a, b in zip(vector, query)), int(session_id)))
+    return sorted(rows, reverse=True)[:k]
+
+
+def embedding_rate(turns=2000):
+    query = 'tell me about the french revolution'
+    response = 'The French Revolution (1789-1799) overthrew the monarchy and established a republic in France. ' * 4
+    start = time.perf_counter()
+    for _ in range(turns):
+        embed_turn(query, response, DIM)
+    return turns / (time.perf_counter() - start)
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1].split(',')] if len(sys.argv) > 1 else [10000, 100000, 1000000]
+    searches = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    rng = np.random.default_rng(13)
+    queries = random_unit_vectors(rng, searches)
+
+    print(f"embedding: {embedding_rate():.0f} turns/s")
+    print(f"{'rows':>10}{'build s':>10}{'disk MB':>10}{'p50 ms':>10}{'p99 ms':>10}{'python scan ms':>16}")
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            index = HistoryIndex(storage=None, directory=directory, dim=DIM)
+            build_seconds = build(index, rng, rows)
+            disk_mb = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 2 ** 20
+            timings = time_searches(lambda q: index.search_vector('bench', q, k=k), queries)
+            scan = ''
+            if rows == min(sizes):
+                start = time.perf_counter()
+                python_scan(index, queries[0], k)
+                scan = f"{(time.perf_counter() - start) * 1000:.0f}"
+            print(f"{rows:>10}{build_seconds:>10.2f}{disk_mb:>10.0f}{percentile(timings, 0.5) * 1000:>10.2f}"
+                  f"{percentile(timings, 0.99) * 1000:>10.2f}{scan:>16}")
+            del index
+
+
+if __name__ == '__main__':
+    main()
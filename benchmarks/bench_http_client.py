@@ -0,0 +1,116 @@
+"""Exercise the outbound HTTP client against a local stub server.
+
+The stub serves a fast endpoint, a slow endpoint that exceeds the read
+timeout, and a failing endpoint returning HTTP 503. The report shows how
+retries, timeouts and the circuit breaker bound the time spent per call.
+
+Exits non-zero if a check fails: fast calls all succeed; slow and failing
+calls give up after the configured retries and then trip the breaker;
+after reset_timeout the breaker lets one half-open trial through, which
+re-opens it on failure and closes it on success.
+
+Usage: python benchmarks/bench_http_client.py
+"""
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from http_client import HTTPClient, CircuitOpenError
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path.startswith('/slow'):
+            time.sleep(2)
+        status = 503 if self.path.startswith('/fail') else 200
+        body = b'{"cod": 200}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # the client already gave up on a slow response
+
+    def log_message(self, *args):
+        pass
+
+
+def run(client, upstream, url, calls):
+    outcomes = {}
+    start = time.perf_counter()
+    for _ in range(calls):
+        try:
+            client.get(upstream, url)
+            outcome = 'ok'
+        except CircuitOpenError:
+            outcome = 'circuit open'
+        except Exception as e:
+            outcome = type(e).__name__
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    elapsed = time.perf_counter() - start
+    print(f"{upstream:5s} {calls} calls in {elapsed:6.2f}s  {outcomes}")
+    return outcomes
+
+
+def half_open(base, failures):
+    """Open a breaker, then check one trial call after reset_timeout decides its state."""
+    client = HTTPClient(connect_timeout=0.5, read_timeout=0.5, retries=1, backoff=0.01,
+                        failure_threshold=2, reset_timeout=0.2)
+    upstream = client.upstream('flaky')
+    run(client, 'flaky', f"{base}/fail", 3)
+    states = [upstream.breaker.state]
+    time.sleep(0.25)
+    calls = upstream.calls
+    run(client, 'flaky', f"{base}/fail", 1)
+    trial_attempts = upstream.calls - calls
+    states.append(upstream.breaker.state)
+    time.sleep(0.25)
+    run(client, 'flaky', f"{base}/fast", 1)
+    states.append(upstream.breaker.state)
+    print(f"breaker after failures, failed trial, good trial: {states}")
+    if states != ['open', 'open', 'closed']:
+        failures.append(f"breaker went {states}, expected ['open', 'open', 'closed']")
+    if trial_attempts != 1:
+        failures.append(f"half-open trial made {trial_attempts} attempts, expected 1")
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    client = HTTPClient(connect_timeout=0.5, read_timeout=0.5, retries=1, backoff=0.05,
+                        failure_threshold=3, reset_timeout=60)
+    failures = []
+    outcomes = run(client, 'fast', f"{base}/fast", 200)
+    if outcomes != {'ok': 200}:
+        failures.append(f"fast calls: {outcomes}")
+    for name, path in (('slow', '/slow'), ('fail', '/fail')):
+        outcomes = run(client, name, f"{base}{path}", 10)
+        # Call 1 gives up after 1 + retries attempts; the next attempt trips the breaker (threshold 3)
+        attempts = client.upstreams[name].calls
+        if attempts != 3 or outcomes.get('circuit open') != 9:
+            failures.append(f"{name}: {attempts} attempts and {outcomes}, expected 3 attempts and 9 circuit open")
+
+    for name, stats in client.stats().items():
+        print(name, stats)
+    half_open(base, failures)
+    server.shutdown()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
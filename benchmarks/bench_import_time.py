@@ -0,0 +1,64 @@
+"""Import-time report for app.py, with a regression threshold.
+
+Runs `python -X importtime -c "import app"` in a scratch directory, prints
+the slowest imports by cumulative time, and fails (exit status 1) when the
+total exceeds the threshold or when a module that should load lazily
+(camera, audio, LLM SDK, ...) is imported at module import time.
+
+Usage: python benchmarks/bench_import_time.py [max_import_ms] [top_n]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Top-level packages that app.py must only import inside its subsystem loaders
+LAZY_MODULES = ('cv2', 'numpy', 'pvporcupine', 'pyaudio', 'pycaw', 'comtypes', 'pythoncom',
+                'screen_brightness_control', 'langdetect', 'newsapi', 'google.generativeai')
+
+
+def import_times():
+    """Return [(module, self_us, cumulative_us)] in import order."""
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import sys; sys.path.insert(0, {ROOT!r}); import app'],
+                                cwd=workdir, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-2000:])
+        raise SystemExit(f"import app failed with exit status {result.returncode}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    max_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 750.0
+    top_n = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    rows = import_times()
+    total_ms = next(cumulative for name, _, cumulative in rows if name == 'app') / 1000
+
+    print(f"{'module':<50}{'self ms':>10}{'cumulative ms':>15}")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:top_n]:
+        print(f"{name:<50}{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}")
+
+    eager = sorted({name for name, _, _ in rows for lazy in LAZY_MODULES if name == lazy or name.startswith(lazy + '.')})
+    print(f"\nimport app: {total_ms:.0f} ms (threshold {max_ms:.0f} ms)")
+    failed = False
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager[:10])}{' ...' if len(eager) > 10 else ''}")
+        failed = True
+    if total_ms > max_ms:
+        print(f"FAIL: import time over threshold by {total_ms - max_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
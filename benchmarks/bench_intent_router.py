@@ -0,0 +1,129 @@
+"""Microbenchmark and parity check for the /ask intent router.
+
+Compares the single-pass IntentRouter against a replica of the original
+if/elif chain from ask() over a corpus of real queries.
+
+Usage: python benchmarks/bench_intent_router.py [iterations]
+"""
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from app_registry import AppRegistry  # noqa: E402
+from intents import IntentRouter, CLOSE_VERB  # noqa: E402
+
+APP_KEYS = ['whatsapp', 'youtube', 'facebook', 'google', 'twitter', 'instagram', 'github', 'linkedin',
+            'reddit', 'stackoverflow', 'gmail', 'netflix', 'calculator', 'vscode', 'chrome', 'edge',
+            'firefox', 'notepad', 'wikipedia']
+
+CORPUS = [
+    'set volume to 100', 'set volume to 10', 'what is java', "today's news", "today's headline",
+    'set brightness to 100', 'set brightness to 10', 'open youtube search a kachori recipe',
+    'hello world in java code', 'what time is it', "what's the date today", 'toggle notebook',
+    'clear notebook', 'show my reminders', 'delete my lecture reminder', 'set reminder for meeting at 3pm',
+    'remind me to call mom at 6 pm tomorrow', 'meeting at 4pm', 'put the system to sleep',
+    'sleep and then shutdown', 'restart the computer', 'reboot', 'power off now', 'lock the screen',
+    'open https://example.com', 'go to www.python.org', 'chrome kholo', 'kholo whatsapp', 'launch vscode',
+    'send a whatsapp message to +91 98765 43210 saying hello', 'weather in pune', 'what was the weather in delhi',
+    'show top headlines', 'open camera', 'generate note on photosynthesis', 'note down quantum computing',
+    'write a program in java to reverse a string', 'give me a code python for bubble sort',
+    'explain photosynthesis', 'who is the prime minister of india', 'what is my url', 'jarvis link please',
+    'tell me a joke', 'what was my previous question', 'how does a black hole form',
+    'summarize the french revolution', 'translate good morning to hindi', 'crome kholo yaar',
+    'sometimes i cannot sleep', 'what is a deadlock', 'delete my meeting reminder', 'standby then power off',
+    'notebook of startups', 'call me at 5 about the appointment', 'give me a code in javascript',
+    'how to quit smoking', 'who is the best rock band', 'how close is the moon to earth',
+    'google how close is the moon', 'close chrome', 'chrome band karo', 'quit notepad',
+]
+
+# Queries the router deliberately routes differently from the original chain,
+# which had no close intent
+CHANGED = {'close chrome': 'close', 'chrome band karo': 'close', 'quit notepad': 'close'}
+
+
+def legacy_route(q):
+    """Replica of the routing conditions of the original if/elif chain."""
+    if any(k in q for k in ['jarvis url', 'jarvis link', 'my url', 'my link', 'web url', 'server url', 'local url']):
+        return 'jarvis_url'
+    elif 'time' in q:
+        return 'time'
+    elif 'date' in q:
+        return 'date'
+    elif 'toggle notebook' in q:
+        return 'toggle_notebook'
+    elif 'clear notebook' in q:
+        return 'clear_notebook'
+    elif 'show my reminders' in q:
+        return 'show_reminders'
+    elif 'delete my' in q and 'reminder' in q:
+        return 'delete_reminder'
+    elif any(re.search(p, q, re.IGNORECASE) for p in [
+        r'\b(remind\s+(?:me\s+)?|set\s+reminder|reminder\s+(?:for\s+)?)\b',
+        r'\b(meeting|lecture|call|task|appointment)\s+(?:reminder|at)\b'
+    ]):
+        return 'set_reminder'
+    elif re.search(r'\b(sleep|standby)\b', q, re.IGNORECASE) and not re.search(r'\b(shutdown|power\s+off)\b', q, re.IGNORECASE):
+        return 'sleep'
+    elif 'restart' in q or 'reboot' in q:
+        return 'restart'
+    elif re.search(r'\b(shutdown|power\s+off)\b', q, re.IGNORECASE):
+        return 'shutdown'
+    elif 'lock' in q:
+        return 'lock'
+    elif re.search(r'\b(?:https?://|www\.)', q, re.IGNORECASE):
+        return 'url'
+    elif any(k in q for k in ['open', 'kholo', 'khol', 'launch', 'start', 'kholna']):
+        # The original open branch also scanned APPS keys with a fresh regex each
+        if not re.search(r'(?:open|kholo|khol|launch|start|kholna)\s+(\w+)(?:\s+(.*))?', q, re.IGNORECASE):
+            for key in APP_KEYS:
+                if re.search(r'\b' + re.escape(key) + r'\b', q, re.IGNORECASE):
+                    break
+        return 'open'
+    elif 'whatsapp message' in q:
+        return 'whatsapp_message'
+    elif 'weather' in q:
+        return 'weather'
+    elif 'news' in q or 'headlines' in q:
+        return 'news'
+    elif 'volume' in q:
+        return 'volume'
+    elif 'brightness' in q:
+        return 'brightness'
+    elif 'camera' in q:
+        return 'camera'
+    elif 'note' in q or 'generate note' in q:
+        return 'note'
+    elif re.search(r'(write\s+a\s+program|code\s+in|give\s+me\s+a\s+code)\s+(java|python|javascript|c\+\+|c#)', q, re.IGNORECASE):
+        return 'code'
+    return 'fallback'
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    router = IntentRouter()
+    # The close guard app.py binds: a known app must be named next to the verb
+    apps = AppRegistry(os.path.join(ROOT, 'apps.json'))
+    router.guard('close')(lambda query: apps.find_around(query, CLOSE_VERB)[0] is not None)
+
+    expected = {q: CHANGED.get(q, legacy_route(q)) for q in CORPUS}
+    mismatches = [(q, expected[q], router.match(q)) for q in CORPUS if expected[q] != router.match(q)]
+    for q, old, new in mismatches:
+        print(f"MISMATCH {q!r}: expected={old} router={new}")
+    print(f"Parity: {len(CORPUS) - len(mismatches)}/{len(CORPUS)} queries routed identically")
+
+    fallback = [q for q in CORPUS if legacy_route(q) == 'fallback']
+    for label, corpus in (('all queries', CORPUS), ('fallback only', fallback)):
+        legacy = timeit.timeit(lambda: [legacy_route(q) for q in corpus], number=iterations)
+        single = timeit.timeit(lambda: [router.match(q) for q in corpus], number=iterations)
+        per = iterations * len(corpus)
+        print(f"{label:14s} chain: {legacy / per * 1e6:7.2f} us/query   router: {single / per * 1e6:7.2f} us/query   "
+              f"speedup: {legacy / single:.1f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
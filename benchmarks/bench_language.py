@@ -0,0 +1,139 @@
+"""Per-message language detection cost for /chat, before and after LanguageDetector.
+
+The corpus mixes Hindi (Devanagari), Hinglish (romanized Hindi, like the
+"chrome kholo" commands), English and Marathi. Three users each send a
+conversation of long and short messages, with the repeats a chat sees.
+
+before: langdetect.detect(text) per message, as friend_prompt() used to
+        call it; the first call also loads the language profiles.
+after:  LanguageDetector.detect(text, user_id), profiles loaded at
+        warm-up (reported separately), fixed seed, per-user sticky
+        language and LRU.
+
+Also reports how many texts langdetect labels differently across runs
+(unseeded) and the labels each approach gives a user's short messages.
+
+Usage: python benchmarks/bench_language.py [rounds]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from language import LanguageDetector  # noqa: E402
+
+CONVERSATIONS = {
+    'hindi': [
+        "मुझे आज का मौसम बताओ, क्या बारिश होगी?",
+        "हाँ",
+        "कल सुबह मुझे दवाई लेने की याद दिलाना",
+        "ठीक है",
+        "मेरे लिए एक अच्छी कहानी सुनाओ जो बच्चों को पसंद आए",
+        "धन्यवाद",
+        "chrome kholo",
+        "yaar aaj bahut thak gaya hoon, kuch mazedaar baat karo",
+        "haan",
+        "theek hai bhai, kal baat karte hain",
+        "whatsapp kholo aur mummy ko message bhejo",
+        "acha",
+    ],
+    'english': [
+        "What's the weather like in Pune this evening?",
+        "ok",
+        "Remind me to call the dentist tomorrow at nine",
+        "thanks!",
+        "Can you explain how photosynthesis works in simple terms?",
+        "cool",
+        "Tell me something interesting about black holes",
+        "nice",
+        "What should I cook for dinner with rice and lentils?",
+        "sure",
+    ],
+    'marathi': [
+        "आज पुण्यात हवामान कसे आहे ते सांग",
+        "हो",
+        "उद्या सकाळी मला औषध घ्यायची आठवण करून दे",
+        "बरं",
+        "मला एक छान गोष्ट सांग जी मुलांना आवडेल",
+        "धन्यवाद",
+        "माझ्या आईला व्हॉट्सअॅपवर संदेश पाठव",
+        "ठीक आहे",
+    ],
+}
+
+
+def messages(rounds):
+    """(user_id, text) in arrival order: the conversations interleaved, repeated `rounds` times."""
+    longest = max(len(texts) for texts in CONVERSATIONS.values())
+    return [(user, texts[i]) for _ in range(rounds) for i in range(longest)
+            for user, texts in CONVERSATIONS.items() if i < len(texts)]
+
+
+def before(stream):
+    from langdetect import detect
+    start = time.perf_counter()
+    detect(stream[0][1])
+    first = time.perf_counter() - start
+    costs, labels = [], {}
+    for user_id, text in stream:
+        start = time.perf_counter()
+        try:
+            language = detect(text)
+        except Exception:
+            language = 'en'
+        costs.append(time.perf_counter() - start)
+        labels.setdefault(user_id, []).append(language)
+    return first, costs, labels
+
+
+def after(stream):
+    start = time.perf_counter()
+    detector = LanguageDetector()
+    load = time.perf_counter() - start
+    costs, labels = [], {}
+    for user_id, text in stream:
+        start = time.perf_counter()
+        language = detector.detect(text, user_id)
+        costs.append(time.perf_counter() - start)
+        labels.setdefault(user_id, []).append(language)
+    return load, costs, labels, detector.stats()
+
+
+def unstable(texts, runs=5):
+    from langdetect import detect
+    changed = 0
+    for text in texts:
+        try:
+            changed += len({detect(text) for _ in range(runs)}) > 1
+        except Exception:
+            pass
+    return changed
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    stream = messages(rounds)
+    first, before_costs, before_labels = before(stream)
+    load, after_costs, after_labels, stats = after(stream)
+    texts = sorted({text for _, text in stream})
+
+    print(f"{len(stream)} messages ({len(texts)} distinct) from {len(CONVERSATIONS)} users, {rounds} rounds")
+    print(f"before: first call (loads profiles) {first * 1000:.0f} ms; "
+          f"per message median {statistics.median(before_costs) * 1e6:.0f} us, "
+          f"mean {statistics.mean(before_costs) * 1e6:.0f} us")
+    print(f"after:  profile load at warm-up {load * 1000:.0f} ms; "
+          f"per message median {statistics.median(after_costs) * 1e6:.1f} us, "
+          f"mean {statistics.mean(after_costs) * 1e6:.1f} us")
+    print(f"        {stats}")
+    print(f"unseeded langdetect gave varying labels for {unstable(texts)} of {len(texts)} texts over 5 runs")
+    print("labels in the first round (before -> after):")
+    for user in CONVERSATIONS:
+        n = len(CONVERSATIONS[user])
+        print(f"  {user:<8} {' '.join(before_labels[user][:n])}")
+        print(f"  {'':<8} {' '.join(after_labels[user][:n])}")
+
+
+if __name__ == '__main__':
+    main()
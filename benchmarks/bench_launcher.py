@@ -0,0 +1,137 @@
+"""Cost to a request of opening an app, before and after Launcher, using harmless commands.
+
+`sleep <seconds>` stands in for an app left open and `true` for one that
+exits at once.
+
+1. blocking: subprocess.run([app]), the old Linux/macOS branch of
+   handle_open; the request waits until the app exits.
+2. fire and forget: subprocess.Popen(app, shell=True), the old Windows
+   branch; nothing waits for the child, so it lingers as a zombie.
+3. launcher: Launcher.launch(); reports spawn latency, zombies left after
+   the apps exit, and how long close() takes to reap `count` running apps.
+
+Exits non-zero unless the launcher leaves no zombies and no apps running
+after they exit, close() signals and reaps every app, an app ignoring
+SIGTERM is killed kill_after seconds later, a spawn failure raises, and
+an app exiting with an error right after launch counts as a failed launch.
+
+Usage: python benchmarks/bench_launcher.py [count] [seconds]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from launcher import Launcher  # noqa: E402
+
+
+def zombies():
+    """This process's children that have exited but not been reaped."""
+    count = 0
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        count += fields[0] == 'Z' and int(fields[1]) == os.getpid()
+    return count
+
+
+def timed(func, count):
+    costs = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        costs.append(time.perf_counter() - start)
+    return costs
+
+
+def describe(costs):
+    return (f"median {statistics.median(costs) * 1000:8.2f} ms, "
+            f"max {max(costs) * 1000:8.2f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    sleeper = ['sleep', str(seconds)]
+    print(f"{count} launches of `sleep {seconds:g}` (an app left open) and `true` (one that exits at once)")
+
+    costs = timed(lambda: subprocess.run(sleeper), 3)
+    print(f"blocking        {describe(costs)} per request (3 launches)")
+
+    children = []
+    costs = timed(lambda: children.append(subprocess.Popen('true', shell=True)), count)
+    time.sleep(0.5)
+    print(f"fire and forget {describe(costs)} per request; {zombies()} zombies after they exit")
+    for child in children:
+        child.wait()
+
+    launcher = Launcher(poll_interval=0.1)
+    costs = timed(lambda: launcher.launch('sleep', sleeper, user_id='bench'), count)
+    costs += timed(lambda: launcher.launch('true', ['true'], user_id='bench'), count)
+    time.sleep(0.5)
+    print(f"launcher        {describe(costs)} per request; {len(launcher.running())} running, "
+          f"{zombies()} zombies while the sleeps run")
+    time.sleep(seconds + 0.5)
+    running, left = len(launcher.running()), zombies()
+    print(f"                {running} running, {left} zombies after they exit")
+    failures = []
+    if running or left:
+        failures.append(f"{running} apps running and {left} zombies after every app exited")
+
+    for _ in range(count):
+        launcher.launch('sleep', ['sleep', '60'], user_id='bench')
+    start = time.perf_counter()
+    closed = launcher.close('bench', 'sleep')
+    close_seconds = time.perf_counter() - start
+    while launcher.running():
+        time.sleep(0.01)
+    left = zombies()
+    print(f"close: {closed} apps signalled in {close_seconds * 1000:.1f} ms, all reaped after "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms; {left} zombies")
+    if closed != count or left:
+        failures.append(f"close signalled {closed} of {count} apps and left {left} zombies")
+
+    stubborn = Launcher(poll_interval=0.05, kill_after=0.3)
+    launch = stubborn.launch('stubborn', ['sh', '-c', 'trap "" TERM; sleep 60'], user_id='bench')
+    time.sleep(0.2)
+    start = time.perf_counter()
+    stubborn.close('bench', 'stubborn')
+    while stubborn.running() and time.perf_counter() - start < 5:
+        time.sleep(0.01)
+    print(f"an app ignoring SIGTERM exited with {launch.returncode} after "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms (kill_after 300 ms)")
+    if launch.returncode != -9:
+        failures.append(f"an app ignoring SIGTERM exited with {launch.returncode}, expected -9 (killed)")
+    stubborn.shutdown()
+
+    try:
+        launcher.launch('missing', ['/nonexistent/app'], user_id='bench')
+        failures.append("launching a missing program did not raise")
+    except OSError as e:
+        print(f"spawn failure surfaces to the caller: {e.__class__.__name__}")
+    launcher.launch('broken', ['sh', '-c', 'exit 3'], user_id='bench')
+    time.sleep(0.5)
+    stats = launcher.stats()
+    del stats['recent_exits']
+    print(f"stats: {stats}")
+    if stats['spawn_failures'] != 1 or stats['early_failures'] != 1 or stats['exited'] != 3 * count + 1:
+        failures.append(f"{stats['spawn_failures']} spawn failures, {stats['early_failures']} early failures and "
+                        f"{stats['exited']} exits, expected 1, 1 and {3 * count + 1}")
+    launcher.shutdown()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
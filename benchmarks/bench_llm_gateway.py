@@ -0,0 +1,225 @@
+"""LLM gateway against fake Gemini models that enforce a rate limit.
+
+Each fake model answers after a fixed latency and raises a
+ResourceExhausted-style error when called more than `limit` times in any
+one-second window, like the API's per-minute quota sped up 60x. No API key
+or server is needed.
+
+1. A burst of requests from many threads straight at the model, and the
+   same burst through an LLMGateway sized to the limit: throttled calls,
+   failed requests and wall time.
+2. The same burst with one fallback model: the gateway spreads the overflow.
+3. Priority: a flood of BULK requests, then INTERACTIVE ones a moment
+   later; median queue wait of each.
+4. Coalescing: identical prompts sent at once; calls that reach the model.
+5. Retries: every prompt's first call fails with a transient error, through
+   a gateway whose upstream retries nothing itself (as app.py builds it);
+   the gateway's retries each wait for a token, so the fake is not throttled.
+
+Exits non-zero if the gateway lets a call be throttled or a request fail,
+admits calls faster than the limit, serves BULK ahead of INTERACTIVE,
+sends identical concurrent prompts more than once, or retries a call
+without waiting for a token.
+
+Usage: python benchmarks/bench_llm_gateway.py [limit_per_s] [requests] [latency_s]
+"""
+import collections
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from http_client import Upstream  # noqa: E402
+from llm_gateway import LLMGateway, INTERACTIVE, BULK, QuotaExceeded, is_throttle  # noqa: E402
+
+
+class ResourceExhausted(Exception):
+    """Stand-in for google.api_core.exceptions.ResourceExhausted."""
+    code = 429
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self, model_name, limit, latency):
+        self.model_name = model_name
+        self.limit = limit
+        self.latency = latency
+        self.calls = 0
+        self.throttled = 0
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False):
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.limit:
+                self.throttled += 1
+                raise ResourceExhausted(f"429 Quota exceeded for {self.model_name}")
+            self._recent.append(now)
+            self.calls += 1
+        time.sleep(self.latency)
+        return FakeResponse(f"{self.model_name}: {prompt}")
+
+
+class FlakyModel(FakeModel):
+    """Fails the first call for each prompt with a transient (non-quota) error."""
+
+    def __init__(self, model_name, limit, latency):
+        super().__init__(model_name, limit, latency)
+        self.failed = set()
+
+    def generate_content(self, prompt, stream=False):
+        with self._lock:
+            first = prompt not in self.failed
+            self.failed.add(prompt)
+        if first:
+            raise ConnectionError(f"connection reset for {prompt}")
+        return super().generate_content(prompt, stream)
+
+
+def burst(send, requests, workers=32):
+    failures = []
+
+    def one(i):
+        try:
+            send(f"prompt {i}")
+        except Exception as e:
+            failures.append(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(requests)))
+    return time.perf_counter() - start, len(failures)
+
+
+def gateway_for(models, limit, **options):
+    primary, *alternatives = models
+    # Burst of 1 keeps the fake's one-second sliding window from seeing two seconds' worth of calls
+    return LLMGateway(lambda: primary, rpm=limit * 60, burst=1,
+                      fallbacks=(lambda name: [(m.model_name, m) for m in alternatives]) if alternatives else None,
+                      **options)
+
+
+def throttling(limit, requests, latency):
+    rows = []
+    direct = FakeModel('primary', limit, latency)
+    rows.append(('direct', *burst(direct.generate_content, requests), direct.throttled, direct.calls))
+
+    model = FakeModel('primary', limit, latency)
+    gateway = gateway_for([model], limit, max_wait=60)
+    rows.append(('gateway', *burst(gateway.generate, requests), model.throttled, model.calls))
+
+    models = [FakeModel('primary', limit, latency), FakeModel('fallback', limit, latency)]
+    gateway = gateway_for(models, limit, max_wait=60)
+    wall, failed = burst(gateway.generate, requests)
+    rows.append(('gateway+fallback', wall, failed, sum(m.throttled for m in models),
+                 '/'.join(str(m.calls) for m in models)))
+    return rows
+
+
+def priority_waits(limit, requests, latency):
+    gateway = gateway_for([FakeModel('primary', limit, latency)], limit, max_wait=120)
+    waits = {INTERACTIVE: [], BULK: []}
+
+    def one(i, priority):
+        start = time.perf_counter()
+        slot = gateway.acquire(priority)
+        waits[priority].append(time.perf_counter() - start)
+        slot.model.generate_content(f"prompt {i}")
+
+    threads = [threading.Thread(target=one, args=(i, BULK)) for i in range(requests)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    interactive = [threading.Thread(target=one, args=(i, INTERACTIVE)) for i in range(max(1, requests // 5))]
+    for thread in interactive:
+        thread.start()
+    for thread in threads + interactive:
+        thread.join()
+    return statistics.median(waits[BULK]), statistics.median(waits[INTERACTIVE])
+
+
+def coalescing(limit, requests, latency, window):
+    model = FakeModel('primary', limit, latency)
+    gateway = gateway_for([model], limit, coalesce_window=window)
+    barrier = threading.Barrier(requests)
+
+    def one(_):
+        barrier.wait()
+        return gateway.generate('the same prompt')
+
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        list(pool.map(one, range(requests)))
+    return model.calls, gateway.coalesced
+
+
+def retrying(limit, requests, latency):
+    model = FlakyModel('primary', limit, latency)
+    upstream = Upstream('gemini', retries=0, retry_on=(Exception,), give_up=is_throttle, failure_threshold=10 ** 6)
+    gateway = gateway_for([model], limit, max_wait=60, upstream=upstream, backoff=0.01)
+    wall, failed = burst(gateway.generate, requests)
+    return wall, failed, model.throttled, gateway.retried
+
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+
+    print(f"fake limit {limit} calls/s per model, {requests} requests, {latency}s latency")
+    print(f"{'mode':<18}{'wall s':>8}{'failed':>8}{'throttled':>11}{'calls':>10}")
+    failures = []
+    # With a burst of 1, n admissions take at least (n - 1) / limit seconds; allow 10% for timer slack
+    min_wall = 0.9 * (requests - 1) / limit
+    for name, wall, failed, throttled, calls in throttling(limit, requests, latency):
+        print(f"{name:<18}{wall:>8.2f}{failed:>8}{throttled:>11}{calls!s:>10}")
+        if name == 'direct':
+            continue
+        if failed or throttled:
+            failures.append(f"{name}: {failed} failed, {throttled} throttled")
+        if name == 'gateway' and (calls != requests or wall < min_wall):
+            failures.append(f"gateway: {calls} calls in {wall:.2f}s, expected {requests} in >= {min_wall:.2f}s")
+        if name == 'gateway+fallback' and '0' in calls.split('/'):
+            failures.append(f"gateway+fallback: calls {calls} not spread over both models")
+
+    bulk, interactive = priority_waits(limit, requests, latency)
+    print(f"priority: median queue wait bulk {bulk:.2f}s, interactive {interactive:.2f}s")
+    if interactive >= bulk:
+        failures.append(f"interactive waited {interactive:.2f}s, bulk {bulk:.2f}s")
+
+    for window in (0.0, 0.01):
+        calls, coalesced = coalescing(limit, requests, latency, window)
+        print(f"coalescing, window {window * 1000:.0f} ms: {requests} identical prompts -> "
+              f"{calls} model call(s), {coalesced} coalesced")
+        if calls != 1 or coalesced != requests - 1:
+            failures.append(f"coalescing, window {window * 1000:.0f} ms: {calls} calls, {coalesced} coalesced")
+
+    wall, failed, throttled, retried = retrying(limit, requests, latency)
+    print(f"retries: {requests} prompts failing once -> {retried} retried, {failed} failed, "
+          f"{throttled} throttled, {wall:.2f}s")
+    min_wall = 0.9 * (2 * requests - 1) / limit
+    if retried != requests or failed or throttled or wall < min_wall:
+        failures.append(f"retries: {retried} retried, {failed} failed, {throttled} throttled in {wall:.2f}s, "
+                        f"expected {requests} retried in >= {min_wall:.2f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except QuotaExceeded as e:
+        sys.exit(f"gateway gave up: {e}")
@@ -0,0 +1,92 @@
+"""Memory and thread cost of pending reminders: heap scheduler vs. one Timer each.
+
+Schedules N reminders spread over the next 30 days with reminders.ReminderScheduler
+(all in memory, and with the default one-hour lazy window), then starts a
+smaller number of threading.Timer objects the way the old code did.
+
+Usage: python benchmarks/bench_reminders.py [reminders] [timers]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from migrations import migrate
+from reminders import ReminderScheduler
+from storage import Storage
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def measure(label, build):
+    threads_before = threading.active_count()
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:38s} {elapsed:7.2f}s  heap {current / 2**20:7.1f} MiB  "
+          f"rss +{(rss_bytes() - rss_before) / 2**20:7.1f} MiB  +{threading.active_count() - threads_before} threads")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    timers = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    now = time.time()
+    due = [now + random.uniform(60, 30 * 86400) for _ in range(count)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, 'bench.db'))
+        with storage.connection() as conn:
+            migrate(conn)
+            conn.executemany("INSERT INTO reminders (user_id, task, reminder_time, created_at, due_at) VALUES (?, ?, ?, ?, ?)",
+                             [(f"user{i % 500}", f"task {i}", '', now, int(d)) for i, d in enumerate(due)])
+            conn.commit()
+
+        def heap_scheduler(window):
+            def build():
+                scheduler = ReminderScheduler(storage, lambda user_id, task: None, window=window).start()
+                while scheduler._window_end == 0:  # wait for the first window load
+                    time.sleep(0.001)
+                return scheduler
+            return build
+
+        for label, build in ((f"heap scheduler, {count} in memory", heap_scheduler(31 * 86400)),
+                             (f"heap scheduler, 1h window of {count}", heap_scheduler(3600))):
+            scheduler = measure(label, build)
+            print(f"    {scheduler.stats()}")
+            start = time.perf_counter()
+            for reminder_id in range(1, 1001):
+                scheduler.cancel(reminder_id)
+            print(f"    1000 cancels in {(time.perf_counter() - start) * 1000:.1f} ms")
+            scheduler.stop()
+        storage.close()
+
+    def timer_threads():
+        started = [threading.Timer(d - now, lambda: None) for d in due[:timers]]
+        for t in started:
+            t.start()
+        return started
+
+    started = measure(f"threading.Timer x {timers}", timer_threads)
+    for t in started:
+        t.cancel()
+    print(f"    extrapolated to {count}: {count} threads")
+
+
+if __name__ == '__main__':
+    main()
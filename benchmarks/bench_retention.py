@@ -0,0 +1,162 @@
+"""Database size and query latency before and after session retention.
+
+Builds a synthetic sessions history of `rows` rows (default 1M) spread over
+`users` users and two years, about one answer in ten a ~3 KB code answer,
+then runs SessionRetention with a per-user limit of `max_rows` live rows
+and 180 days. Reports, before and after archiving and vacuuming:
+
+- database file size (main file plus WAL) and live sessions rows
+- latency of the queries Jarvis runs on sessions: the memory replay
+  (newest turns of a user), a per-user count and a history index sync batch
+- how long archiving and the one-time switch to incremental vacuum took
+- /history/export-style NDJSON throughput for one user, archive included
+
+Usage: python benchmarks/bench_retention.py [rows] [users] [max_rows]
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from migrations import migrate  # noqa: E402
+from retention import SessionRetention  # noqa: E402
+from storage import Storage  # noqa: E402
+
+WORDS = '''weather reminder tomorrow meeting python function return value list error traceback import
+module class object string number today news headline market cricket score movie song play open
+chrome whatsapp message mummy dinner rice lentils recipe explain simple terms photosynthesis black
+hole planet distance light year summary note project deadline report email schedule alarm morning'''.split()
+
+CODE = '''def {name}(items):
+    """Return the {adj} items, sorted."""
+    result = []
+    for item in items:
+        if item.{attr} > {n}:
+            result.append(item)
+    return sorted(result, key=lambda item: item.{attr})
+'''
+
+
+def sentence(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize() + '.'
+
+
+def response_pool(rng, size=5000):
+    pool = []
+    for i in range(size):
+        if i % 10 == 0:
+            blocks = [CODE.format(name=rng.choice(WORDS), adj=rng.choice(WORDS), attr=rng.choice(WORDS),
+                                  n=rng.randint(0, 99)) for _ in range(8)]
+            pool.append(sentence(rng, 20) + '\n```python\n' + '\n'.join(blocks) + '```\n' + sentence(rng, 30))
+        else:
+            pool.append(' '.join(sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(2, 6))))
+    return pool
+
+
+def build(path, rows, users, seed=0):
+    rng = random.Random(seed)
+    pool = response_pool(rng)
+    queries = [sentence(rng, rng.randint(3, 10)) for _ in range(2000)]
+    storage = Storage(path)
+    with storage.connection() as conn:
+        migrate(conn)
+        start = datetime.now() - timedelta(days=730)
+        step = timedelta(days=730) / rows
+        batch = []
+        for i in range(rows):
+            batch.append((f"user{rng.randrange(users)}", rng.choice(queries), rng.choice(pool), start + step * i))
+            if len(batch) == 10000:
+                conn.executemany("INSERT INTO sessions (user_id, query, response, timestamp) VALUES (?, ?, ?, ?)", batch)
+                batch = []
+        conn.executemany("INSERT INTO sessions (user_id, query, response, timestamp) VALUES (?, ?, ?, ?)", batch)
+        conn.commit()
+    storage.compact()
+    return storage
+
+
+def size(path):
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def latency(storage, users, repeat=200):
+    rng = random.Random(1)
+    queries = {
+        'memory replay': ("SELECT query, response FROM sessions WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                          lambda: (f"user{rng.randrange(users)}", 18)),
+        'per-user count': ("SELECT COUNT(*) FROM sessions WHERE user_id = ?",
+                           lambda: (f"user{rng.randrange(users)}",)),
+        'index sync batch': ("SELECT id, user_id, query, response FROM sessions WHERE id > ? ORDER BY id LIMIT ?",
+                             lambda: (0, 5000)),
+    }
+    results = {}
+    for name, (sql, params) in queries.items():
+        costs = []
+        for _ in range(repeat if name != 'index sync batch' else 10):
+            args = params()
+            start = time.perf_counter()
+            storage.fetchall(sql, args)
+            costs.append(time.perf_counter() - start)
+        results[name] = statistics.median(costs)
+    return results
+
+
+def report(label, path, storage, users):
+    live = storage.fetchone("SELECT COUNT(*) FROM sessions")[0]
+    print(f"{label}: {size(path) / 1e6:8.1f} MB, {live} live rows")
+    for name, seconds in latency(storage, users).items():
+        print(f"  {name:<17} {seconds * 1000:8.2f} ms median")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    max_rows = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    path = os.path.join(tempfile.mkdtemp(prefix='jarvis-retention-'), 'jarvis_sessions.db')
+
+    start = time.perf_counter()
+    storage = build(path, rows, users)
+    print(f"{rows} rows for {users} users over 730 days built in {time.perf_counter() - start:.0f}s")
+    report('before', path, storage, users)
+
+    retention = SessionRetention(storage, max_rows=max_rows, max_age=180 * 86400)
+    start = time.perf_counter()
+    archived = retention.archive()
+    archive_seconds = time.perf_counter() - start
+    storage.compact()
+    print(f"archived {archived} rows ({retention.codec}) in {archive_seconds:.1f}s "
+          f"({archived / archive_seconds:.0f} rows/s); file before vacuum {size(path) / 1e6:.1f} MB")
+    start = time.perf_counter()
+    retention.vacuum(full=True)
+    print(f"switch to incremental auto-vacuum (one full VACUUM): {time.perf_counter() - start:.1f}s")
+    report('after', path, storage, users)
+    stats = retention.stats()
+    print(f"  archive: {stats['archive_blobs']} blobs, {stats['archived_rows']} rows, "
+          f"{stats['archive_bytes'] / 1e6:.1f} MB")
+
+    start = time.perf_counter()
+    count = total = 0
+    for record in retention.export('user0'):
+        total += len(json.dumps(record, ensure_ascii=False)) + 1
+        count += 1
+    seconds = time.perf_counter() - start
+    print(f"export user0: {count} rows, {total / 1e6:.1f} MB NDJSON in {seconds * 1000:.0f} ms "
+          f"({count / seconds:.0f} rows/s)")
+
+    # Later runs only trim what the limits newly exceed and hand back free pages incrementally
+    retention.max_rows = max_rows // 4
+    start = time.perf_counter()
+    archived = retention.archive()
+    freed = retention.vacuum(pages=2000)
+    print(f"next run at {retention.max_rows} rows per user: archived {archived} rows and freed {freed} pages "
+          f"in {time.perf_counter() - start:.1f}s; {size(path) / 1e6:.1f} MB")
+    storage.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""Several Jarvis worker processes sharing one database: duplicates and throughput.
+
+1. Schedulers: N worker processes share a fresh SQLite database, each with
+   its own ReminderScheduler and a JobEngine running an exclusive job every
+   `interval` seconds, claimed through state.SQLiteState. Reports how many
+   of the stored reminders were delivered, and how often, and the job's
+   total runs against the runs one worker alone would make. The same job
+   without a claim function shows what every worker running it looks like.
+2. The same exclusive job in N threads sharing a FakeRedis through
+   state.RedisState.
+3. Semantic cache: N processes each claim a worker slot, store `entries`
+   answers in a SemanticCache over the shared database and read them back;
+   reports answers lost or swapped for another worker's.
+4. Task dedup: N processes submit the same `keys` dedup keys to their own
+   TaskQueue at once; reports submissions that failed and keys that got
+   more than one in-flight task.
+5. Throughput: N processes import app.py against one database and answer
+   /ask "what time is it" through the Flask test client for `seconds`;
+   requests per second for 1, 2 .. N workers. This only scales with the
+   CPU cores available.
+
+Exits non-zero if a reminder is lost or delivered twice, the claimed
+exclusive job runs more often than one worker alone would run it, the
+semantic cache loses or swaps an answer, or a task submission fails or
+creates a second in-flight task for a key.
+
+Usage: python benchmarks/bench_scale_out.py [workers] [seconds] [reminders]
+"""
+import collections
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from jobs import JobEngine  # noqa: E402
+from migrations import migrate  # noqa: E402
+from reminders import ReminderScheduler  # noqa: E402
+from semantic_cache import SemanticCache  # noqa: E402
+from state import SQLiteState, RedisState, FakeRedis, claim_worker_slot, slot_path  # noqa: E402
+from storage import Storage  # noqa: E402
+from tasks import TaskQueue  # noqa: E402
+
+INTERVAL = 0.25
+
+
+def scheduler_worker(db_path, seconds, shared, start_at, results):
+    storage = Storage(db_path)
+    state = SQLiteState(storage)
+    delivered = []
+    runs = []
+    reminders = ReminderScheduler(storage, lambda user_id, task: delivered.append(task))
+    engine = JobEngine(claim=state.claim if shared else None)
+    time.sleep(max(0.0, start_at - time.time()))
+    reminders.start()
+    engine.every(INTERVAL, 'tick', lambda: runs.append(time.time()), exclusive=True)
+    engine.start()
+    time.sleep(seconds)
+    engine.shutdown()
+    reminders.stop()
+    storage.close()
+    results.put((len(runs), delivered))
+
+
+def run_schedulers(workers, seconds, reminder_count, shared):
+    directory = tempfile.mkdtemp(prefix='jarvis-scale-')
+    db_path = os.path.join(directory, 'jarvis_sessions.db')
+    storage = Storage(db_path)
+    with storage.connection() as conn:
+        migrate(conn)
+    start_at = time.time() + 2.0
+    for i in range(reminder_count):
+        due_at = int(start_at + 1 + (seconds - 2) * i / reminder_count)
+        storage.insert("INSERT INTO reminders (user_id, task, reminder_time, created_at, due_at) VALUES (?, ?, ?, ?, ?)",
+                       ('bench', f"task {i}", '', start_at, due_at))
+    storage.close()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=scheduler_worker, args=(db_path, seconds, shared, start_at, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    deliveries = collections.Counter(task for _, delivered in outcomes for task in delivered)
+    return {
+        'job_runs': sum(runs for runs, _ in outcomes),
+        'per_worker': [runs for runs, _ in outcomes],
+        'delivered': len(deliveries),
+        'duplicates': sum(count - 1 for count in deliveries.values()),
+    }
+
+
+def run_redis_threads(workers, seconds):
+    client = FakeRedis()
+    engines, runs = [], []
+    for i in range(workers):
+        engine = JobEngine(claim=RedisState(client, owner=f"worker-{i}").claim)
+        engine.every(INTERVAL, 'tick', lambda i=i: runs.append(i), exclusive=True)
+        engines.append(engine.start())
+        time.sleep(INTERVAL / workers)
+    time.sleep(seconds)
+    for engine in engines:
+        engine.shutdown()
+    return len(runs), collections.Counter(runs)
+
+
+def semantic_worker(db_path, entries, barrier, results):
+    storage = Storage(db_path)
+    path = os.path.join(os.path.dirname(db_path), 'semantic_cache.f32')
+    shard = claim_worker_slot(path)
+    cache = SemanticCache(storage, path=slot_path(path, shard), shard=shard, capacity=entries)
+    tag = os.getpid()
+    rng = random.Random(tag)
+    questions = [' '.join(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(8)) for _ in range(3))
+                 for _ in range(entries)]
+    barrier.wait()
+    for i, question in enumerate(questions):
+        cache.store('general', question, f"{tag}:{i}")
+    barrier.wait()
+    wrong = sum(cache.lookup('general', question) != f"{tag}:{i}" for i, question in enumerate(questions))
+    storage.close()
+    results.put(wrong)
+
+
+def run_semantic_cache(workers, entries):
+    directory = tempfile.mkdtemp(prefix='jarvis-scale-')
+    db_path = os.path.join(directory, 'jarvis_sessions.db')
+    storage = Storage(db_path)
+    with storage.connection() as conn:
+        migrate(conn)
+    storage.close()
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    barrier = context.Barrier(workers)
+    processes = [context.Process(target=semantic_worker, args=(db_path, entries, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    wrong = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return wrong
+
+
+def submit_worker(db_path, keys, barrier, results):
+    storage = Storage(db_path)
+    # Not started: only submit() is under test, so no task runs and every key stays in flight
+    queue = TaskQueue(storage, {})
+    barrier.wait()
+    errors = []
+    for i in range(keys):
+        try:
+            queue.submit('ask', {'i': i}, dedup_key=f"key {i}", upstream='gemini', user_id=str(os.getpid()))
+        except Exception as e:
+            errors.append(type(e).__name__)
+    storage.close()
+    results.put(errors)
+
+
+def run_task_dedup(workers, keys):
+    directory = tempfile.mkdtemp(prefix='jarvis-scale-')
+    db_path = os.path.join(directory, 'jarvis_sessions.db')
+    storage = Storage(db_path)
+    with storage.connection() as conn:
+        migrate(conn)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    barrier = context.Barrier(workers)
+    processes = [context.Process(target=submit_worker, args=(db_path, keys, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    errors = collections.Counter(error for _ in processes for error in results.get())
+    for process in processes:
+        process.join()
+    tasks = storage.fetchone("SELECT COUNT(*), COUNT(DISTINCT dedup_key) FROM tasks")
+    requests = storage.fetchone("SELECT COUNT(*) FROM task_requests")[0]
+    storage.close()
+    return errors, tasks[0], tasks[1], requests
+
+
+def ask_worker(directory, seconds, barrier, results):
+    os.chdir(directory)
+    os.environ['LOG_LEVEL'] = 'WARNING'
+    import app as jarvis
+    client = jarvis.app.test_client()
+    barrier.wait()
+    count, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        client.post('/ask', json={'query': 'what time is it', 'user_id': 'bench'})
+        count += 1
+    jarvis.storage.flush()
+    results.put(count)
+
+
+def run_throughput(workers, seconds):
+    directory = tempfile.mkdtemp(prefix='jarvis-scale-')
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    barrier = context.Barrier(workers)
+    processes = [context.Process(target=ask_worker, args=(directory, seconds, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / seconds
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    reminder_count = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    expected = seconds / INTERVAL
+
+    print(f"{workers} workers, {seconds:g}s, {reminder_count} reminders, exclusive job every {INTERVAL}s "
+          f"(~{expected:.0f} runs for one worker); {os.cpu_count()} CPU(s)")
+    failures = []
+    # One run per occurrence, plus one for an occurrence falling due as the workers stop
+    max_runs = int(expected) + 1
+    for shared in (False, True):
+        outcome = run_schedulers(workers, seconds, reminder_count, shared)
+        label = 'sqlite claims' if shared else 'no claims'
+        print(f"  {label:<14} job runs {outcome['job_runs']:>4} {outcome['per_worker']}; reminders delivered "
+              f"{outcome['delivered']}/{reminder_count}, duplicates {outcome['duplicates']}")
+        if outcome['delivered'] != reminder_count or outcome['duplicates']:
+            failures.append(f"{label}: {outcome['delivered']}/{reminder_count} reminders delivered, "
+                            f"{outcome['duplicates']} duplicates")
+        if shared and not 0 < outcome['job_runs'] <= max_runs:
+            failures.append(f"{label}: exclusive job ran {outcome['job_runs']} times, expected 1..{max_runs}")
+    total, per_worker = run_redis_threads(workers, seconds)
+    print(f"  {'fake redis':<14} job runs {total:>4} {[per_worker[i] for i in range(workers)]}")
+    # The threads start staggered over one interval, so one more occurrence can fall due
+    if not 0 < total <= max_runs + 1:
+        failures.append(f"fake redis: exclusive job ran {total} times, expected 1..{max_runs + 1}")
+
+    entries = 200
+    wrong = run_semantic_cache(workers, entries)
+    print(f"  {'semantic cache':<14} {wrong}/{workers * entries} answers lost or swapped between workers")
+    if wrong:
+        failures.append(f"semantic cache: {wrong} answers lost or swapped")
+
+    keys = 200
+    errors, tasks, distinct, requests = run_task_dedup(workers, keys)
+    print(f"  {'task dedup':<14} {tasks} tasks for {distinct}/{keys} keys, {requests}/{workers * keys} requests "
+          f"recorded, errors {dict(errors)}")
+    if errors or tasks != keys or distinct != keys or requests != workers * keys:
+        failures.append(f"task dedup: {tasks} tasks for {distinct} keys, {requests} requests, errors {dict(errors)}")
+
+    print("/ask 'what time is it' throughput:")
+    for n in sorted({1, 2, workers}):
+        print(f"  {n} worker(s): {run_throughput(n, seconds):8.0f} req/s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Session writes under /ask load: shared connection vs. pooled storage with group commit.
+
+N threads post /ask questions through the Flask test client, each its own
+user, with the Gemini model stubbed out, so every request runs routing,
+context loading, the gateway and the session write of a real answer.
+"before" swaps storage.log_session for the old pattern: one shared
+connection and a commit after every INSERT (serialized with a lock, since
+the original shared cursor was not thread-safe). "after" is app.py as it
+ships, with storage.Storage's background writer.
+
+Exits non-zero unless every request is answered and leaves one sessions row.
+
+Usage: python benchmarks/bench_session_writes.py [threads] [requests_per_thread]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+RESPONSE = 'Photosynthesis is the process by which green plants make food from light. ' * 8
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    model_name = 'stub'
+
+    def generate_content(self, prompt, stream=False):
+        return FakeResponse(RESPONSE)
+
+
+def run_threads(jarvis, threads, per_thread):
+    """Post threads x per_thread /ask requests; returns (seconds, requests answered)."""
+    answered = []
+
+    def worker(n):
+        client = jarvis.app.test_client()
+        ok = 0
+        for i in range(per_thread):
+            response = client.post('/ask', json={'query': f"summarize topic {n} {i}", 'user_id': f"user{n}"})
+            ok += response.status_code == 200 and response.get_json().get('response') == RESPONSE.strip()
+        answered.append(ok)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    jarvis.storage.flush()
+    return time.perf_counter() - start, sum(answered)
+
+
+def old_writer(path):
+    """log_session as app.py wrote sessions before storage.Storage."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    c = conn.cursor()
+    lock = threading.Lock()
+
+    def write(*row):
+        with lock:
+            c.execute("INSERT INTO sessions (user_id, query, response, timestamp) VALUES (?, ?, ?, ?)", row)
+            conn.commit()
+    return write
+
+
+def sessions(jarvis):
+    return jarvis.storage.fetchone('SELECT COUNT(*) FROM sessions')[0]
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    total = threads * per_thread
+    os.chdir(tempfile.mkdtemp(prefix='jarvis-sessions-'))
+    os.environ.update({'GEMINI_API_KEY': 'stub', 'GEMINI_RPM': str(10 ** 9), 'SEMANTIC_CACHE': '0',
+                       'HISTORY_INDEX': '0', 'LOG_LEVEL': 'ERROR'})
+    import app as jarvis
+    jarvis.subsystems.override('llm', FakeModel())
+
+    failures = []
+    results = {}
+    log_session = jarvis.storage.log_session
+    for label, writer in (('before', old_writer(jarvis.storage.path)), ('after', log_session)):
+        jarvis.storage.log_session = writer
+        rows = sessions(jarvis)
+        results[label], answered = run_threads(jarvis, threads, per_thread)
+        written = sessions(jarvis) - rows
+        if answered != total or written != total:
+            failures.append(f"{label}: {answered} of {total} requests answered, {written} sessions rows written")
+    jarvis.storage.log_session = log_session
+
+    print(f"{threads} threads x {per_thread} /ask requests")
+    print(f"  before: {total / results['before']:10.0f} requests/s")
+    print(f"  after:  {total / results['after']:10.0f} requests/s   ({results['before'] / results['after']:.1f}x)")
+    print(f"  after: {jarvis.storage.rows_written} rows in {jarvis.storage.batches_written} commits")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
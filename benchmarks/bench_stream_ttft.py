@@ -0,0 +1,66 @@
+"""Time-to-first-token for /ask versus /ask/stream with a local fake model.
+
+The fake model yields chunks with a fixed delay, standing in for Gemini.
+Responses go through the Flask test client, so no server or API key is needed.
+
+Usage: python benchmarks/bench_stream_ttft.py [chunks] [delay_seconds]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as jarvis
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Mimics GenerativeModel.generate_content, with and without stream=True."""
+
+    def __init__(self, chunks, delay):
+        self.chunks = chunks
+        self.delay = delay
+
+    def generate_content(self, prompt, stream=False):
+        if stream:
+            return self._stream()
+        time.sleep(self.delay * len(self.chunks))
+        return FakeChunk(''.join(self.chunks))
+
+    def _stream(self):
+        for chunk in self.chunks:
+            time.sleep(self.delay)
+            yield FakeChunk(chunk)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    jarvis.subsystems.override('llm', FakeModel([f"Sentence {i} of the example program explanation. " for i in range(count)], delay))
+    client = jarvis.app.test_client()
+    # Distinct prompts so neither request is served from the response cache
+    start = time.perf_counter()
+    client.post('/ask', json={'query': 'write a program in java to sort an array'})
+    blocking = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post('/ask/stream', json={'query': 'write a program in java to reverse a list'}, buffered=False)
+    stream = iter(response.response)
+    next(stream)
+    first_token = time.perf_counter() - start
+    for _ in stream:
+        pass
+    streamed_total = time.perf_counter() - start
+    response.close()
+
+    print(f"/ask          time to first byte: {blocking * 1000:8.1f} ms")
+    print(f"/ask/stream   time to first token: {first_token * 1000:8.1f} ms   (complete in {streamed_total * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
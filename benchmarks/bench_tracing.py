@@ -0,0 +1,79 @@
+"""Cost of request tracing and of debug logging that is switched off.
+
+1. A disabled logger.debug call with an f-string message (formatted before
+   the call), with %-style arguments (formatted only if emitted), and
+   behind an isEnabledFor() level guard.
+2. tracing.span() around an empty block, outside a request (no trace) and
+   inside one, and tracing.record().
+3. /ask for a local intent through the Flask test client: median latency
+   and the median of each Server-Timing span.
+
+Usage: python benchmarks/bench_tracing.py [requests]
+"""
+import logging
+import os
+import statistics
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tracing  # noqa: E402
+
+
+def logging_costs(number=200000):
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.INFO)
+    query, user_id, response = 'what is the weather in pune', 'user1', 'Weather in Pune: 31°C, haze. ' * 20
+    cases = {
+        'f-string': lambda: logger.debug(f"Raw query received: {query} (user: {user_id}) -> {response[:100]}..."),
+        '%-style': lambda: logger.debug("Raw query received: %s (user: %s) -> %s...", query, user_id, response[:100]),
+        'level guard': lambda: logger.isEnabledFor(logging.DEBUG) and logger.debug(
+            "Raw query received: %s (user: %s) -> %s...", query, user_id, response[:100]),
+    }
+    return {name: timeit.timeit(func, number=number) / number * 1e9 for name, func in cases.items()}
+
+
+def span_costs(number=200000):
+    def in_span():
+        with tracing.span('bench'):
+            pass
+
+    costs = {'span, no request': timeit.timeit(in_span, number=number) / number * 1e9}
+    tracer = tracing.Tracer()
+    token = tracer.begin('/bench')
+    costs['span, in request'] = timeit.timeit(in_span, number=number) / number * 1e9
+    costs['record, in request'] = timeit.timeit(lambda: tracing.record('bench', 0.001), number=number) / number * 1e9
+    tracer.end(token)
+    return costs
+
+
+def ask_breakdown(requests):
+    import app as jarvis
+    client = jarvis.app.test_client()
+    totals, spans = [], {}
+    for _ in range(requests):
+        response = client.post('/ask', json={'query': 'what time is it', 'user_id': 'bench'})
+        for part in response.headers['Server-Timing'].split(', '):
+            name, duration = part.split(';dur=')
+            (totals if name == 'total' else spans.setdefault(name, [])).append(float(duration))
+    jarvis.storage.flush()
+    return statistics.median(totals), {name: statistics.median(values) for name, values in spans.items()}
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print("disabled logger.debug (ns per call):")
+    for name, ns in logging_costs().items():
+        print(f"  {name:<22}{ns:>8.0f}")
+    print("tracing (ns per call):")
+    for name, ns in span_costs().items():
+        print(f"  {name:<22}{ns:>8.0f}")
+    total, spans = ask_breakdown(requests)
+    print(f"/ask 'what time is it', {requests} requests: median {total:.3f} ms")
+    for name, ms in spans.items():
+        print(f"  {name:<22}{ms:>8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Wake word front end: PCM decoding cost and a recorded-audio run through a stub engine.
+
+1. Per-frame decoding of 512 int16 samples, the old way
+   (struct.unpack_from("h" * n) into a tuple) against the zero-copy
+   memoryview.cast('h') and numpy.frombuffer views, each also passed
+   through the ctypes conversion pvporcupine does in process().
+2. A generated WAV (noise with loud bursts standing in for the wake word)
+   is fed through WakeWordListener with audio.EnergyEngine. Reports
+   detections against the number of bursts, CPU per frame, and the length
+   of a post-wake capture read from the ring.
+
+Exits non-zero unless every burst is detected once, every frame of the
+recording is processed, and each capture holds 0.25 s before plus 0.5 s
+after the detection (the last may be cut short by the end of the audio).
+
+Usage: python benchmarks/bench_wake_word.py [seconds_of_audio] [bursts]
+"""
+import ctypes
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from audio import EnergyEngine, WakeWordListener, WavSource  # noqa: E402
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 512
+
+
+def write_wav(path, seconds, bursts):
+    rng = np.random.default_rng(15)
+    samples = rng.normal(0, 300, int(seconds * SAMPLE_RATE))
+    spacing = seconds / bursts
+    # At most 0.6 s, and short enough to leave EnergyEngine the quiet stretch it needs between bursts
+    t = np.arange(int(min(0.6, 0.4 * spacing) * SAMPLE_RATE)) / SAMPLE_RATE
+    for i in range(bursts):
+        start = int((i + 0.5) * spacing * SAMPLE_RATE)
+        samples[start:start + len(t)] += 9000 * np.sin(2 * np.pi * 440 * t)
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(np.clip(samples, -32768, 32767).astype('<i2').tobytes())
+
+
+def decode_costs(number=20000):
+    pcm = np.random.default_rng(1).integers(-32768, 32767, FRAME_LENGTH, dtype=np.int16).tobytes()
+    c_frame = ctypes.c_short * FRAME_LENGTH
+    cases = {
+        'struct.unpack_from': lambda: struct.unpack_from("h" * FRAME_LENGTH, pcm),
+        'memoryview.cast': lambda: memoryview(pcm).cast('h'),
+        'numpy.frombuffer': lambda: np.frombuffer(pcm, dtype=np.int16),
+        'struct + ctypes': lambda: c_frame(*struct.unpack_from("h" * FRAME_LENGTH, pcm)),
+        'memoryview + ctypes': lambda: c_frame(*memoryview(pcm).cast('h')),
+        'frombuffer + ctypes': lambda: c_frame(*np.frombuffer(pcm, dtype=np.int16)),
+    }
+    return {name: timeit.timeit(func, number=number) / number * 1e6 for name, func in cases.items()}
+
+
+def run_listener(path, bursts):
+    engine = EnergyEngine(sample_rate=SAMPLE_RATE, frame_length=FRAME_LENGTH)
+    events = []
+    captured = []
+    done = threading.Event()
+
+    def on_wake(event):
+        events.append(event)
+        captured.append(len(listener.audio_after(event, 0.5, before=0.25, timeout=2)))
+
+    listener = WakeWordListener(engine, lambda: WavSource(path), on_wake=on_wake, ring_seconds=5)
+    start = time.perf_counter()
+    listener.start()
+    while listener.running:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    done.set()
+    listener.stop(wait=True)
+    return listener.stats(), events, captured, elapsed
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    bursts = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    if seconds < bursts:
+        sys.exit("Need at least one second of audio per burst")
+
+    print(f"decode one {FRAME_LENGTH}-sample frame (us):")
+    for name, us in decode_costs().items():
+        print(f"  {name:<22}{us:>8.2f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'wake.wav')
+        write_wav(path, seconds, bursts)
+        stats, events, captured, elapsed = run_listener(path, bursts)
+    print(f"\n{seconds:.0f} s of audio processed in {elapsed:.2f} s")
+    print(f"detections: {stats['detections']} of {bursts} bursts; listener kept running after each")
+    print(f"cpu per frame: {stats['cpu_ms_per_frame']:.4f} ms ({stats['cpu_fraction'] * 100:.3f}% of real time)")
+    print(f"post-wake captures (0.25 s before + 0.5 s after): {captured} samples")
+
+    failures = []
+    if stats['detections'] != bursts or len(events) != bursts:
+        failures.append(f"{stats['detections']} detections ({len(events)} events) for {bursts} bursts")
+    frames = int(seconds * SAMPLE_RATE) // FRAME_LENGTH
+    if stats['frames'] != frames or stats['source_errors']:
+        failures.append(f"{stats['frames']} of {frames} frames processed, {stats['source_errors']} source errors")
+    full = int(0.75 * SAMPLE_RATE)
+    if any(length != full for length in captured[:-1]) or not captured or not full / 3 < captured[-1] <= full:
+        failures.append(f"captures of {captured} samples, expected {full} each")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+# Key helpers: normalize inputs so equivalent requests share one entry
+def prompt_key(prompt):
+    return hashlib.sha256(' '.join(prompt.split()).encode('utf-8')).hexdigest()
+
+def city_key(city):
+    return ' '.join(city.lower().split())
+
+def params_key(**params):
+    return json.dumps(params, sort_keys=True)
+
+
+# In-memory LRU backend: OrderedDict of key -> (expires_at, value)
+class MemoryCacheBackend:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace, key, value, ttl):
+        with self._lock:
+            self._entries[(namespace, key)] = (time.time() + ttl, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# SQLite backend: survives restarts; values are stored as JSON in the
+# response_cache table (see migrations.py) through the shared Storage pool.
+# The table is trimmed to max_entries every `evict_every` writes, so it can
+# run that many entries over in between
+class SQLiteCacheBackend:
+    def __init__(self, storage, max_entries=5000, evict_every=100):
+        self.storage = storage
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.storage.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+
+    def get(self, namespace, key):
+        now = time.time()
+        with self.storage.connection() as conn:
+            row = conn.execute('SELECT value, expires_at FROM response_cache WHERE namespace = ? AND key = ?',
+                               (namespace, key)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute('DELETE FROM response_cache WHERE namespace = ? AND key = ?', (namespace, key))
+                conn.commit()
+                return None
+            conn.execute('UPDATE response_cache SET last_access = ? WHERE namespace = ? AND key = ?',
+                         (now, namespace, key))
+            conn.commit()
+        return json.loads(row[0])
+
+    def set(self, namespace, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        with self.storage.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?)',
+                         (namespace, key, json.dumps(value), now + ttl, now))
+            if evict:
+                count = conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute('''DELETE FROM response_cache WHERE rowid IN (
+                        SELECT rowid FROM response_cache ORDER BY last_access LIMIT ?)''', (count - self.max_entries,))
+            conn.commit()
+
+    def clear(self):
+        self.storage.execute('DELETE FROM response_cache')
+
+
+# Redis backend: one cache shared by every worker; Redis expires entries itself
+class RedisCacheBackend:
+    def __init__(self, client, prefix='jarvis:cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, namespace, key):
+        value = self.client.get(f"{self.prefix}{namespace}:{key}")
+        return json.loads(value) if value is not None else None
+
+    def set(self, namespace, key, value, ttl):
+        self.client.set(f"{self.prefix}{namespace}:{key}", json.dumps(value), ex=max(1, int(ttl)))
+
+    def clear(self):
+        names = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if names:
+            self.client.delete(*names)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """TTL cache for one upstream backend with single-flight miss handling.
+
+    Concurrent misses for the same key wait on the first caller's upstream
+    request instead of issuing their own.
+    """
+
+    def __init__(self, namespace, backend, ttl):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._inflight = {}
+        self._async_inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.backend.get(self.namespace, key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(self.namespace, key, value, self.ttl)
+
+    def get_or_compute(self, key, compute, should_cache=None):
+        """Return the cached value for key, calling compute() on a miss.
+
+        Values for which should_cache(value) is false are returned but not stored.
+        """
+        value = self.backend.get(self.namespace, key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            if flight.value is not None and (should_cache is None or should_cache(flight.value)):
+                self.backend.set(self.namespace, key, flight.value, self.ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    async def aget_or_compute(self, key, compute, should_cache=None):
+        """Coroutine form of get_or_compute; compute is an async callable.
+
+        Concurrent misses within one event loop await the first caller's call.
+        """
+        value = self.backend.get(self.namespace, key)
+        flight = self._async_inflight.get(key)
+        with self._lock:
+            if value is not None or flight is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is not None:
+            return value
+        if flight is not None:
+            return await asyncio.shield(flight)
+
+        flight = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await compute()
+            if value is not None and (should_cache is None or should_cache(value)):
+                self.backend.set(self.namespace, key, value, self.ttl)
+            flight.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # followers re-raise it; don't log it as unretrieved
+            raise
+        finally:
+            del self._async_inflight[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0
+            }
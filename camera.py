@@ -0,0 +1,333 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Frames used for the frame rate estimate
+FPS_WINDOW = 60
+
+
+class SyntheticSource:
+    """cv2.VideoCapture stand-in producing a moving gradient at a fixed rate.
+
+    Used with CAMERA_SOURCE=synthetic and by the camera benchmark, so the
+    pipeline can run without a webcam. Like a webcam driver, it does not
+    queue frames for a slow reader: frames that came due while nobody was
+    reading are lost and counted in missed. read() fills the caller's buffer
+    in place, like VideoCapture.read(image) does for a matching buffer.
+    """
+
+    def __init__(self, width=640, height=480, fps=30.0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames = 0
+        self.missed = 0
+        self._next_at = time.perf_counter()
+        self._gradient = (np.arange(width, dtype=np.uint16)[None, :] + np.arange(height, dtype=np.uint16)[:, None]) % 256
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self, image=None):
+        if not self._opened:
+            return False, image
+        if self.fps:
+            period = 1 / self.fps
+            late = int((time.perf_counter() - self._next_at) / period)
+            if late > 0:
+                self.missed += late
+                self.frames += late
+                self._next_at += late * period
+            delay = self._next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_at += period
+        if image is None or image.shape != (self.height, self.width, 3):
+            image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        shift = self.frames % 256
+        np.add(self._gradient, shift, out=image[:, :, 0], casting='unsafe')
+        image[:, :, 1] = self._gradient
+        image[:, :, 2] = shift
+        self.frames += 1
+        return True, image
+
+    def release(self):
+        self._opened = False
+
+
+class _Consumer:
+    def __init__(self):
+        self.frames = 0
+        self.skipped = 0
+
+
+class Camera:
+    """Webcam capture into a preallocated ring of frame buffers.
+
+    One capture thread reads each frame into a free slot of the ring and
+    publishes it as the latest frame. Consumers (the OpenCV window, the
+    snapshot writer pool and /camera/stream clients) pin the latest slot
+    while they use it and read it in place; the capture thread only ever
+    fills slots that are neither pinned nor latest, so nothing is copied
+    and nothing is allocated per frame. When every other slot is pinned the
+    frame is read into a spare buffer and counted as dropped.
+    """
+
+    def __init__(self, open_source, slots=8, snapshot_dir='.', snapshot_workers=1, max_pending_snapshots=4,
+                 jpeg_quality=80):
+        self.open_source = open_source
+        self.slots = max(3, slots)
+        self.snapshot_dir = snapshot_dir
+        self.max_pending_snapshots = max_pending_snapshots
+        self.jpeg_quality = jpeg_quality
+        self.active = False
+        self.captured = 0
+        self.dropped = 0
+        self.read_failures = 0
+        self.snapshots = 0
+        self.snapshots_rejected = 0
+        self._frames = None
+        self._spare = None
+        self._slot_seq = [0] * self.slots
+        self._pins = [0] * self.slots
+        self._latest = -1
+        self._seq = 0
+        self._times = deque(maxlen=FPS_WINDOW)
+        self._consumers = {}
+        self._pending_snapshots = 0
+        self._jpeg = (0, None)
+        self._encode_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._generation = 0
+        self._snapshot_pool = ThreadPoolExecutor(max_workers=snapshot_workers, thread_name_prefix='camera-snapshot')
+
+    def start(self, display=True):
+        """Start capturing on a background thread (and a display window if display)."""
+        with self._cond:
+            if self.active:
+                return False
+            self.active = True
+            self._latest = -1
+            self._generation += 1
+            generation = self._generation
+        self._threads = [threading.Thread(target=self._capture_loop, args=(generation,), name='camera-capture', daemon=True)]
+        if display:
+            self._threads.append(threading.Thread(target=self._display_loop, name='camera-display', daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return True
+
+    def stop(self, wait=False, generation=None):
+        with self._cond:
+            # A capture thread winding down must not stop a session started after it
+            if generation is not None and generation != self._generation:
+                return
+            self.active = False
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                if thread is not threading.current_thread():
+                    thread.join(timeout=5)
+
+    def _allocate(self, first):
+        # The ring is sized from the first frame and reused for the whole session
+        if self._frames is None or self._frames.shape[1:] != first.shape:
+            self._frames = np.empty((self.slots,) + first.shape, dtype=first.dtype)
+            self._spare = np.empty(first.shape, dtype=first.dtype)
+            logger.debug("Camera ring allocated: %s x %s", self.slots, first.shape)
+
+    def _free_slot(self):
+        for offset in range(1, self.slots):
+            slot = (self._latest + offset) % self.slots
+            if self._pins[slot] == 0:
+                return slot
+        return None
+
+    def _capture_loop(self, generation):
+        try:
+            source = self.open_source()
+        except Exception as e:
+            logger.error("Could not open camera: %s", e)
+            self.stop(generation=generation)
+            return
+        try:
+            if not source.isOpened():
+                logger.error("Could not open camera")
+                return
+            ok, first = source.read()
+            if not ok:
+                logger.error("Failed to capture frame")
+                return
+            self._allocate(first)
+            self._frames[0] = first
+            self._publish(0)
+            while self.active and generation == self._generation:
+                with self._cond:
+                    slot = self._free_slot()
+                    if slot is None:
+                        self.dropped += 1
+                buffer = self._frames[slot] if slot is not None else self._spare
+                ok, frame = source.read(buffer)
+                if not ok:
+                    self.read_failures += 1
+                    logger.error("Failed to capture frame")
+                    break
+                if not np.may_share_memory(frame, buffer):
+                    # The driver changed resolution or ignored the buffer
+                    if frame.shape != buffer.shape:
+                        logger.warning("Camera frame shape changed to %s; stopping capture", frame.shape)
+                        break
+                    np.copyto(buffer, frame)
+                if slot is not None:
+                    self._publish(slot)
+        finally:
+            source.release()
+            self.stop(generation=generation)
+            logger.debug("Camera capture stopped")
+
+    def _publish(self, slot):
+        with self._cond:
+            self._seq += 1
+            self._slot_seq[slot] = self._seq
+            self._latest = slot
+            self.captured += 1
+            self._times.append(time.perf_counter())
+            self._cond.notify_all()
+
+    @contextmanager
+    def frame(self, after=0, timeout=1.0, consumer=None):
+        """Pin and yield (seq, frame) for the first frame newer than after.
+
+        frame is a read-only view into the ring, valid only inside the block.
+        Yields (None, None) if no newer frame arrives within timeout or the
+        camera stops.
+        """
+        with self._cond:
+            ready = self._cond.wait_for(lambda: not self.active or (self._latest >= 0 and self._seq > after), timeout)
+            if not ready or self._latest < 0 or self._seq <= after:
+                slot = None
+            else:
+                slot = self._latest
+                self._pins[slot] += 1
+                seq = self._slot_seq[slot]
+                if consumer is not None:
+                    stats = self._consumers.setdefault(consumer, _Consumer())
+                    stats.frames += 1
+                    stats.skipped += max(0, seq - after - 1) if after else 0
+        if slot is None:
+            yield None, None
+            return
+        try:
+            view = self._frames[slot]
+            view.flags.writeable = False
+            yield seq, view
+        finally:
+            with self._cond:
+                self._pins[slot] -= 1
+
+    def _display_loop(self):
+        seq = 0
+        try:
+            while self.active:
+                with self.frame(after=seq, consumer='display') as (new_seq, frame):
+                    if frame is None:
+                        continue
+                    seq = new_seq
+                    cv2.imshow('JARVIS Camera', frame)
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('c'):
+                    self.snapshot()
+                elif key == ord('q'):
+                    logger.debug("Camera feed closed by 'q' key")
+                    self.stop()
+        except cv2.error as e:
+            logger.warning("Camera window unavailable: %s", e)
+        finally:
+            try:
+                cv2.destroyAllWindows()
+            except cv2.error:
+                pass
+
+    def snapshot(self):
+        """Queue a JPEG of the latest frame on the snapshot pool; returns its path, or None if busy or idle."""
+        with self._cond:
+            if self._pending_snapshots >= self.max_pending_snapshots or self._latest < 0:
+                self.snapshots_rejected += 1
+                return None
+            self._pending_snapshots += 1
+        path = os.path.join(self.snapshot_dir, f"capture_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jpg")
+        self._snapshot_pool.submit(self._write_snapshot, path)
+        return path
+
+    def _write_snapshot(self, path):
+        try:
+            with self.frame(after=0, timeout=0, consumer='snapshot') as (_, frame):
+                if frame is not None and cv2.imwrite(path, frame):
+                    self.snapshots += 1
+                    logger.debug("Picture captured: %s", path)
+        except Exception as e:
+            logger.error("Snapshot error: %s", e)
+        finally:
+            with self._cond:
+                self._pending_snapshots -= 1
+
+    def jpeg(self, after=0, timeout=1.0):
+        """(seq, JPEG bytes) of the first frame newer than after; one encode per frame for all clients."""
+        with self._encode_lock:
+            seq, data = self._jpeg
+            if seq > after:
+                return seq, data
+            with self.frame(after=after, timeout=timeout, consumer='stream') as (seq, frame):
+                if frame is None:
+                    return None, None
+                ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                return None, None
+            self._jpeg = (seq, encoded.tobytes())
+            return self._jpeg
+
+    def mjpeg(self, boundary='frame'):
+        """multipart/x-mixed-replace body for browsers; ends when the camera stops."""
+        seq = 0
+        while self.active:
+            new_seq, data = self.jpeg(after=seq)
+            if data is None:
+                continue
+            seq = new_seq
+            yield (f"--{boundary}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+                   + data + b"\r\n")
+
+    def fps(self):
+        with self._cond:
+            if len(self._times) < 2:
+                return 0.0
+            return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+    def stats(self):
+        fps = self.fps()
+        with self._cond:
+            return {
+                'active': self.active,
+                'fps': round(fps, 2),
+                'captured': self.captured,
+                'dropped': self.dropped,
+                'read_failures': self.read_failures,
+                'slots': self.slots,
+                'pinned': sum(1 for pins in self._pins if pins),
+                'frame_shape': list(self._frames.shape[1:]) if self._frames is not None else None,
+                'snapshots': self.snapshots,
+                'snapshots_rejected': self.snapshots_rejected,
+                'consumers': {name: {'frames': c.frames, 'skipped': c.skipped} for name, c in self._consumers.items()}
+            }
@@ -0,0 +1,143 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def sse_format(event):
+    """One Server-Sent Events message; the id lets a reconnecting EventSource resume."""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+class Subscription:
+    """One connected client: a bounded queue of events plus a way to wake its reader.
+
+    Readers are either threads (get) or coroutines on one event loop (aget).
+    When the queue is full the oldest event is dropped and counted, so a slow
+    or stalled client costs at most max_queue events of memory and never
+    blocks publishers. Wakeups are coalesced: a burst of events schedules one
+    call on the reader's loop, not one per event.
+    """
+
+    def __init__(self, user_id, max_queue, loop=None):
+        self.user_id = user_id
+        self.max_queue = max_queue
+        self.loop = loop
+        self.dropped = 0
+        self.delivered = 0
+        self.connected_at = time.time()
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._woken = False
+        self._ready = asyncio.Event() if loop else threading.Event()
+
+    def push(self, event):
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(event)
+            if self._woken:
+                return
+            self._woken = True
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        else:
+            self._ready.set()
+
+    def drain(self):
+        with self._lock:
+            events = list(self._queue)
+            self._queue.clear()
+            self._woken = False
+            self._ready.clear()
+            self.delivered += len(events)
+        return events
+
+    def get(self, timeout=None):
+        """Block up to timeout for events; returns a possibly empty list."""
+        self._ready.wait(timeout)
+        return self.drain()
+
+    async def aget(self, timeout=None):
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.drain()
+
+
+class EventBus:
+    """Fan-out of server events (reminders, wake word, daily news, task results) to connected clients.
+
+    publish() may be called from any thread. An event with a user_id goes to
+    that user's subscriptions; one without goes to everyone. The last
+    replay_size events per user (and of broadcasts) are kept so a client
+    reconnecting with Last-Event-ID gets what it missed.
+    """
+
+    def __init__(self, max_queue=100, replay_size=50):
+        self.max_queue = max_queue
+        self.replay_size = replay_size
+        self.published = 0
+        # Totals of subscriptions that have disconnected
+        self._delivered = 0
+        self._dropped = 0
+        self._ids = itertools.count(1)
+        self._subscriptions = {}
+        self._replay = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, loop=None):
+        subscription = Subscription(user_id, self.max_queue, loop)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._delivered += subscription.delivered
+                self._dropped += subscription.dropped
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, event_type, data, user_id=None):
+        with self._lock:
+            event = {'id': next(self._ids), 'type': event_type, 'data': data, 'user_id': user_id, 'time': time.time()}
+            self.published += 1
+            self._replay.setdefault(user_id, deque(maxlen=self.replay_size)).append(event)
+            if user_id is None:
+                targets = [s for subscriptions in self._subscriptions.values() for s in subscriptions]
+            else:
+                targets = list(self._subscriptions.get(user_id, ()))
+        for subscription in targets:
+            subscription.push(event)
+        logger.debug("Event %s #%s sent to %s clients", event_type, event['id'], len(targets))
+        return event
+
+    def replay(self, user_id, last_id):
+        """Buffered events for user_id (and broadcasts) newer than last_id, oldest first."""
+        with self._lock:
+            events = [e for key in (user_id, None) for e in self._replay.get(key, ()) if e['id'] > last_id]
+        return sorted(events, key=lambda e: e['id'])
+
+    def stats(self):
+        with self._lock:
+            subscriptions = [s for group in self._subscriptions.values() for s in group]
+            users = len(self._subscriptions)
+            delivered, dropped = self._delivered, self._dropped
+        return {
+            'clients': len(subscriptions),
+            'users': users,
+            'published': self.published,
+            'delivered': delivered + sum(s.delivered for s in subscriptions),
+            'dropped': dropped + sum(s.dropped for s in subscriptions)
+        }
@@ -0,0 +1,218 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from http_client import LatencyHistogram
+from semantic_cache import embed
+
+logger = logging.getLogger(__name__)
+
+# Characters of each response that go into a turn's vector
+RESPONSE_CHARS = 400
+
+
+def embed_turn(query, response, dim):
+    """Unit vector for one query/response pair; the query carries twice the weight."""
+    vector = embed(query, dim) + 0.5 * embed((response or '')[:RESPONSE_CHARS], dim)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Segment:
+    def __init__(self, vectors, ids):
+        self.vectors = vectors
+        self.ids = ids
+        self.count = int(np.count_nonzero(ids))
+
+    @property
+    def capacity(self):
+        return len(self.ids)
+
+
+class _UserIndex:
+    """One user's turn vectors, in .npy segment files that double in size.
+
+    Segments are never resized or replaced while mapped, so appends need no
+    copying and work on platforms that cannot rename an open mapping.
+    """
+
+    def __init__(self, prefix, dim, first_segment_rows):
+        self.prefix = prefix
+        self.dim = dim
+        self.first_segment_rows = first_segment_rows
+        self.segments = []
+        for number in range(len(glob.glob(f'{prefix}.*.ids.npy'))):
+            self.segments.append(_Segment(np.load(f'{prefix}.{number}.vectors.npy', mmap_mode='r+'),
+                                          np.load(f'{prefix}.{number}.ids.npy', mmap_mode='r+')))
+
+    @property
+    def count(self):
+        return sum(segment.count for segment in self.segments)
+
+    @property
+    def last_id(self):
+        for segment in reversed(self.segments):
+            if segment.count:
+                return int(segment.ids[segment.count - 1])
+        return 0
+
+    def _add_segment(self):
+        number = len(self.segments)
+        rows = self.first_segment_rows << number
+        vectors = np.lib.format.open_memmap(f'{self.prefix}.{number}.vectors.npy', mode='w+',
+                                            dtype=np.float32, shape=(rows, self.dim))
+        ids = np.lib.format.open_memmap(f'{self.prefix}.{number}.ids.npy', mode='w+', dtype=np.int64, shape=(rows,))
+        self.segments.append(_Segment(vectors, ids))
+
+    def append(self, ids, vectors):
+        start = 0
+        while start < len(ids):
+            if not self.segments or self.segments[-1].count == self.segments[-1].capacity:
+                self._add_segment()
+            segment = self.segments[-1]
+            take = min(len(ids) - start, segment.capacity - segment.count)
+            segment.vectors[segment.count:segment.count + take] = vectors[start:start + take]
+            # ids last: a row only counts once its id is written
+            segment.ids[segment.count:segment.count + take] = ids[start:start + take]
+            segment.count += take
+            start += take
+
+    def flush(self):
+        for segment in self.segments:
+            segment.vectors.flush()
+            segment.ids.flush()
+
+    def score(self, vector, skip_latest=0):
+        """(session ids, cosine scores) for every indexed turn but the newest skip_latest."""
+        filled = [(segment.ids[:segment.count], segment.vectors[:segment.count]) for segment in self.segments if segment.count]
+        if not filled:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = np.concatenate([ids for ids, _ in filled])
+        scores = np.concatenate([vectors @ vector for _, vectors in filled])
+        end = max(0, len(ids) - skip_latest)
+        return ids[:end], scores[:end]
+
+
+class HistoryIndex:
+    """Nearest-neighbour search over each user's past turns in the sessions table.
+
+    Turns are embedded with the semantic cache's hashed character n-grams
+    and appended to a per-user matrix of unit vectors, so a search is one
+    matrix-vector product per segment plus an argpartition top-k. sync()
+    indexes sessions rows newer than the last indexed id, in batches; the
+    matrices are .npy memmaps under directory, so a restart only embeds
+    rows written since the previous sync.
+    """
+
+    def __init__(self, storage, directory='history_index', dim=256, first_segment_rows=1024, batch_size=1000):
+        self.storage = storage
+        self.directory = directory
+        self.dim = dim
+        self.first_segment_rows = first_segment_rows
+        self.batch_size = batch_size
+        self.searches = 0
+        self.search_seconds = LatencyHistogram()
+        self._users = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._state_path = os.path.join(directory, 'state.json')
+
+        state = {}
+        if os.path.exists(self._state_path):
+            with open(self._state_path) as f:
+                state = json.load(f)
+        if state.get('dim') != dim and os.path.isdir(directory):
+            logger.info("History index dimension changed to %s; rebuilding %s", dim, directory)
+            shutil.rmtree(directory)
+            state = {}
+        os.makedirs(directory, exist_ok=True)
+        self.indexed_through = state.get('indexed_through', 0)
+
+    def _user(self, user_id):
+        index = self._users.get(user_id)
+        if index is None:
+            key = hashlib.sha1(str(user_id).encode('utf-8')).hexdigest()[:16]
+            index = self._users[user_id] = _UserIndex(os.path.join(self.directory, key), self.dim, self.first_segment_rows)
+        return index
+
+    def _save_state(self):
+        temp_path = self._state_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'dim': self.dim, 'indexed_through': self.indexed_through}, f)
+        os.replace(temp_path, self._state_path)
+
+    def sync(self, limit=None):
+        """Index sessions rows added since the last sync; returns the number indexed."""
+        indexed = 0
+        with self._sync_lock:
+            while limit is None or indexed < limit:
+                batch = self.batch_size if limit is None else min(self.batch_size, limit - indexed)
+                rows = self.storage.fetchall('SELECT id, user_id, query, response FROM sessions WHERE id > ? ORDER BY id LIMIT ?',
+                                             (self.indexed_through, batch))
+                if not rows:
+                    break
+                by_user = {}
+                for session_id, user_id, query, response in rows:
+                    by_user.setdefault(user_id, []).append((session_id, embed_turn(query or '', response or '', self.dim)))
+                with self._lock:
+                    for user_id, turns in by_user.items():
+                        index = self._user(user_id)
+                        # Rows indexed before a crash that lost state.json are skipped
+                        turns = [turn for turn in turns if turn[0] > index.last_id]
+                        if turns:
+                            index.append(np.array([session_id for session_id, _ in turns], dtype=np.int64),
+                                         np.stack([vector for _, vector in turns]))
+                            index.flush()
+                self.indexed_through = rows[-1][0]
+                self._save_state()
+                indexed += len(rows)
+        if indexed:
+            logger.debug("History index: %s turns indexed through session %s", indexed, self.indexed_through)
+        return indexed
+
+    def search_vector(self, user_id, vector, k=5, skip_latest=0, min_score=0.0):
+        """Top-k (session_id, score) pairs for a query vector, best first."""
+        start = time.perf_counter()
+        with self._lock:
+            ids, scores = self._user(user_id).score(vector, skip_latest)
+        if len(ids) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.argsort(-scores[top])]
+        results = [(int(ids[i]), float(scores[i])) for i in top if scores[i] >= min_score]
+        self.searches += 1
+        self.search_seconds.observe(time.perf_counter() - start)
+        return results
+
+    def search(self, user_id, text, k=5, skip_latest=0, min_score=0.0):
+        """Top-k past turns of user_id most similar to text, as dicts, best first."""
+        matches = self.search_vector(user_id, embed_turn(text, '', self.dim), k, skip_latest, min_score)
+        if not matches:
+            return []
+        placeholders = ','.join('?' * len(matches))
+        rows = {row[0]: row for row in self.storage.fetchall(
+            f'SELECT id, query, response, timestamp FROM sessions WHERE id IN ({placeholders})',
+            [session_id for session_id, _ in matches])}
+        return [{'id': session_id, 'query': rows[session_id][1], 'response': rows[session_id][2],
+                 'timestamp': rows[session_id][3], 'score': round(score, 4)}
+                for session_id, score in matches if session_id in rows]
+
+    def stats(self):
+        with self._lock:
+            rows = sum(index.count for index in self._users.values())
+            users = len(self._users)
+        return {
+            'indexed_through': self.indexed_through,
+            'loaded_users': users,
+            'loaded_rows': rows,
+            'searches': self.searches,
+            'search_seconds': self.search_seconds.snapshot()
+        }
@@ -0,0 +1,202 @@
+import bisect
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class CircuitOpenError(Exception):
+    """Raised when an upstream's circuit breaker is rejecting calls."""
+
+
+class RetryableError(Exception):
+    """Raised for upstream responses worth retrying (HTTP 429 and 5xx)."""
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.total += seconds
+
+    def snapshot(self):
+        with self._lock:
+            count = sum(self.counts)
+            cumulative = 0
+            buckets = {}
+            for bound, n in zip(list(self.buckets) + ['+Inf'], self.counts):
+                cumulative += n
+                buckets[str(bound)] = cumulative
+            return {'count': count, 'sum': round(self.total, 4), 'buckets': buckets}
+
+
+class CircuitBreaker:
+    """Open after failure_threshold consecutive failures; allow one trial call after reset_timeout."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+                return True
+            return self.state == 'closed'
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning("Circuit opened after %s consecutive failures", self.failures)
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class Upstream:
+    """Retry, circuit-breaker and latency bookkeeping for one upstream service.
+
+    Errors for which give_up(error) is true (such as quota errors) are
+    raised at once: they are not retried and do not count against the
+    circuit breaker, since the upstream did answer.
+    """
+
+    def __init__(self, name, retries=2, backoff=0.25, max_backoff=4.0,
+                 failure_threshold=5, reset_timeout=30.0, retry_on=(requests.ConnectionError, requests.Timeout, RetryableError),
+                 give_up=None):
+        self.name = name
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_on = retry_on
+        self.give_up = give_up
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyHistogram()
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _record(self, start, failed):
+        elapsed = time.perf_counter() - start
+        self.latency.observe(elapsed)
+        tracing.record(f"upstream_{self.name}", elapsed)
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+
+    def _should_retry(self, error, attempt):
+        """Record a failed attempt with the circuit breaker; True if it is worth another try."""
+        if self.give_up is not None and self.give_up(error):
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        return attempt < self.retries and isinstance(error, self.retry_on)
+
+    def call(self, func):
+        """Run func() with bounded retries and full-jitter exponential backoff."""
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} is temporarily unavailable (circuit open)")
+            start = time.perf_counter()
+            try:
+                result = func()
+            except Exception as e:
+                self._record(start, failed=True)
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                logger.debug("%s call failed (%s); retrying in %.2fs", self.name, e, delay)
+                time.sleep(delay)
+            else:
+                self._record(start, failed=False)
+                self.breaker.record_success()
+                return result
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'circuit': self.breaker.state,
+            'latency_seconds': self.latency.snapshot()
+        }
+
+
+class TimeoutSession(requests.Session):
+    """requests.Session that never waits longer than its configured timeouts."""
+
+    def __init__(self, connect_timeout, read_timeout):
+        super().__init__()
+        self.timeout = (connect_timeout, read_timeout)
+
+    def request(self, method, url, **kwargs):
+        timeout = kwargs.get('timeout')
+        if timeout is None or isinstance(timeout, (int, float)) and timeout > self.timeout[1]:
+            kwargs['timeout'] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+class HTTPClient:
+    """Shared outbound client: one pooled, keep-alive session plus per-upstream policies.
+
+    pool_maxsize bounds concurrent connections per host; with pool_block the
+    caller waits for a free connection instead of opening extra sockets.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10.0, pool_maxsize=10, **upstream_defaults):
+        self.session = TimeoutSession(connect_timeout, read_timeout)
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.upstream_defaults = upstream_defaults
+        self.upstreams = {}
+        self._lock = threading.Lock()
+
+    def upstream(self, name, **options):
+        """Return the named upstream, creating it with options on first use."""
+        with self._lock:
+            if name not in self.upstreams:
+                self.upstreams[name] = Upstream(name, **{**self.upstream_defaults, **options})
+            return self.upstreams[name]
+
+    def get(self, upstream, url, **kwargs):
+        """GET url through the named upstream; 429/5xx responses are retried."""
+        def send():
+            response = self.session.get(url, **kwargs)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise RetryableError(f"{upstream} returned HTTP {response.status_code}")
+            return response
+        return self.upstream(upstream).call(send)
+
+    def stats(self):
+        with self._lock:
+            upstreams = dict(self.upstreams)
+        return {name: u.stats() for name, u in upstreams.items()}
+
+    def close(self):
+        self.session.close()
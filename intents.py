@@ -0,0 +1,142 @@
+import re
+import logging
+
+from tracing import span, note_intent
+
+logger = logging.getLogger(__name__)
+
+
+# Verbs of the open and close intents; their handlers look for the app name on either side
+OPEN_VERB = re.compile(r'\b(?:open|kholo|khol|launch|start|kholna)\b', re.IGNORECASE)
+CLOSE_VERB = re.compile(r'\b(?:close|quit|band(?:\s+kar\w*)?)\b', re.IGNORECASE)
+
+
+# Intent declaration. keywords are literal triggers matched anywhere in the
+# (lowercased) query; pattern is an optional regex the query must also satisfy,
+# and guard an optional function of the query, bound with IntentRouter.guard.
+class Intent:
+    def __init__(self, name, keywords=(), pattern=None):
+        self.name = name
+        self.keywords = tuple(keywords)
+        self.pattern = re.compile(pattern) if pattern else None
+        self.handler = None
+        self.guard = None
+
+    def accepts(self, query):
+        if self.pattern is not None and self.pattern.search(query) is None:
+            return False
+        return self.guard is None or self.guard(query)
+
+
+# Intents in priority order. Order matters: the first intent that matches wins,
+# mirroring the original if/elif chain in ask(). Intents with a pattern list
+# keywords that must appear whenever the pattern matches.
+DEFAULT_INTENTS = [
+    Intent('jarvis_url', ['jarvis url', 'jarvis link', 'my url', 'my link', 'web url', 'server url', 'local url']),
+    Intent('time', ['time']),
+    Intent('date', ['date']),
+    Intent('toggle_notebook', ['toggle notebook']),
+    Intent('clear_notebook', ['clear notebook']),
+    Intent('show_reminders', ['show my reminders']),
+    Intent('delete_reminder', ['delete my'], r'reminder'),
+    Intent('set_reminder', ['remind', 'meeting', 'lecture', 'call', 'task', 'appointment'],
+           r'\b(remind\s+(?:me\s+)?|set\s+reminder|reminder\s+(?:for\s+)?)\b'
+           r'|\b(meeting|lecture|call|task|appointment)\s+(?:reminder|at)\b'),
+    # Sleep only when no shutdown/power off appears anywhere in the query
+    Intent('sleep', ['sleep', 'standby'], r'(?s)^(?!.*\b(?:shutdown|power\s+off)\b).*?\b(?:sleep|standby)\b'),
+    Intent('restart', ['restart', 'reboot']),
+    Intent('shutdown', ['shutdown', 'power'], r'\b(shutdown|power\s+off)\b'),
+    Intent('lock', ['lock']),
+    Intent('url', ['http', 'www.'], r'\b(?:https?://|www\.)'),
+    # Only when a known app is named next to the verb (guard bound in app.py):
+    # "how close is the moon" and "quit smoking" go to the fallback
+    Intent('close', ['close', 'quit', 'band'], CLOSE_VERB.pattern),
+    Intent('open', ['open', 'kholo', 'khol', 'launch', 'start', 'kholna']),
+    Intent('whatsapp_message', ['whatsapp message']),
+    Intent('weather', ['weather']),
+    Intent('news', ['news', 'headlines']),
+    Intent('volume', ['volume']),
+    Intent('brightness', ['brightness']),
+    Intent('camera', ['camera']),
+    Intent('note', ['note']),
+    Intent('code', ['write', 'code', 'give'],
+           r'(write\s+a\s+program|code\s+in|give\s+me\s+a\s+code)\s+(java|python|javascript|c\+\+|c#)'),
+]
+
+
+class IntentRouter:
+    """Route a query to the highest-priority matching intent.
+
+    Every keyword is compiled into one overlapping literal alternation, so a
+    single scan yields all candidate intents. Candidates are then checked in
+    priority order; only intents with a pattern pay for a second regex.
+    """
+
+    def __init__(self, intents=None, fallback='fallback'):
+        self.intents = list(intents if intents is not None else DEFAULT_INTENTS)
+        self.fallback = Intent(fallback)
+        self._by_name = {intent.name: intent for intent in self.intents}
+        self._by_name[fallback] = self.fallback
+        self._priorities = self._index_keywords()
+        self._matcher = self._compile()
+
+    def _index_keywords(self):
+        priorities = {}
+        for priority, intent in enumerate(self.intents):
+            for keyword in intent.keywords:
+                priorities.setdefault(keyword, set()).add(priority)
+        # The scan reports only the longest keyword at each position, so a
+        # keyword also implies every keyword that is a prefix of it.
+        for keyword in priorities:
+            for other in priorities:
+                if other != keyword and keyword.startswith(other):
+                    priorities[keyword] = priorities[keyword] | priorities[other]
+        return {keyword: sorted(p) for keyword, p in priorities.items()}
+
+    def _compile(self):
+        keywords = sorted(self._priorities, key=len, reverse=True)
+        return re.compile('(?=(' + '|'.join(re.escape(k) for k in keywords) + '))')
+
+    def match(self, query):
+        """Return the name of the intent that handles query."""
+        with span('intent'):
+            name = self._match(query.lower())
+        note_intent(name)
+        return name
+
+    def _match(self, query):
+        candidates = set()
+        for keyword in self._matcher.findall(query):
+            candidates.update(self._priorities[keyword])
+        for priority in sorted(candidates):
+            intent = self.intents[priority]
+            if intent.accepts(query):
+                return intent.name
+        return self.fallback.name
+
+    def handler(self, name):
+        """Decorator binding a handler function to a declared intent."""
+        def decorator(func):
+            self._by_name[name].handler = func
+            return func
+        return decorator
+
+    def guard(self, name):
+        """Decorator binding a check of the lowercased query to a declared intent.
+
+        The intent is skipped, and lower-priority ones tried, when it returns false.
+        """
+        def decorator(func):
+            self._by_name[name].guard = func
+            return func
+        return decorator
+
+    def handle(self, name, *args, **kwargs):
+        """Run the handler bound to the named intent."""
+        intent = self._by_name[name]
+        if intent.handler is None:
+            raise LookupError(f"No handler registered for intent '{name}'")
+        return intent.handler(*args, **kwargs)
+
+    def dispatch(self, query, *args, **kwargs):
+        return self.handle(self.match(query), *args, **kwargs)
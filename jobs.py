@@ -0,0 +1,276 @@
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+# Recurrence rules: next_after(ts) returns the first run time (epoch seconds) strictly after ts
+class Interval:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def next_after(self, ts):
+        return ts + self.seconds
+
+    def occurrence(self, ts):
+        """(id, seconds to keep a claim on it) of the run at ts, the same in every worker.
+
+        Workers start at different times, so runs are matched by the
+        interval-long slot they fall in rather than by exact time.
+        """
+        return int(ts // self.seconds), 2 * self.seconds
+
+    def __str__(self):
+        return f"every {self.seconds}s"
+
+
+class DailyAt:
+    """Local wall-clock time of day, optionally limited to some weekdays (0 = Monday)."""
+
+    def __init__(self, hour, minute=0, weekdays=None):
+        self.hour = hour
+        self.minute = minute
+        self.weekdays = sorted(set(weekdays)) if weekdays is not None else None
+
+    def next_after(self, ts):
+        now = datetime.fromtimestamp(ts)
+        candidate = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if candidate <= now:
+            candidate += timedelta(days=1)
+        while self.weekdays is not None and candidate.weekday() not in self.weekdays:
+            candidate += timedelta(days=1)
+        return candidate.timestamp()
+
+    def occurrence(self, ts):
+        return int(ts), 86400
+
+    def __str__(self):
+        if self.weekdays is None:
+            days = 'day'
+        elif self.weekdays == [0, 1, 2, 3, 4]:
+            days = 'weekday'
+        elif self.weekdays == [5, 6]:
+            days = 'weekend'
+        else:
+            days = ','.join(WEEKDAYS[d] for d in self.weekdays)
+        return f"{days} {self.hour:02d}:{self.minute:02d}"
+
+    def describe(self):
+        """Human-readable form, e.g. 'every weekday at 09:00 AM'."""
+        days, _ = str(self).split()
+        at = datetime(2000, 1, 1, self.hour, self.minute).strftime('%I:%M %p')
+        return f"every {days.replace(',', ', ')} at {at}"
+
+    @classmethod
+    def parse(cls, rule):
+        """Parse a stored rule such as 'weekday 09:00' or 'monday,friday 18:30'."""
+        days, at = rule.split()
+        hour, minute = (int(part) for part in at.split(':'))
+        if days == 'day':
+            weekdays = None
+        elif days == 'weekday':
+            weekdays = [0, 1, 2, 3, 4]
+        elif days == 'weekend':
+            weekdays = [5, 6]
+        else:
+            weekdays = [WEEKDAYS.index(d) for d in days.split(',')]
+        return cls(hour, minute, weekdays)
+
+
+def parse_recurrence(text):
+    """Parse phrases like 'every weekday at 9am' or 'every monday at 6:30 pm' into a DailyAt.
+
+    Returns None when text has no 'every ... at <time>' phrase.
+    """
+    match = re.search(r'\bevery\s+(day|weekday|weekend|(?:(?:%s)s?(?:\s*(?:,|and)\s*)?)+)\s+at\s+(\d{1,2})(?::(\d{2}))?\s*(am|pm)?'
+                      % '|'.join(WEEKDAYS), text, re.IGNORECASE)
+    if not match:
+        return None
+    days, hour, minute, meridiem = match.group(1).lower(), int(match.group(2)), int(match.group(3) or 0), match.group(4)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'pm' else 0)
+    if hour > 23 or minute > 59:
+        return None
+    if days == 'day':
+        weekdays = None
+    elif days == 'weekday':
+        weekdays = [0, 1, 2, 3, 4]
+    elif days == 'weekend':
+        weekdays = [5, 6]
+    else:
+        weekdays = [WEEKDAYS.index(d) for d in re.findall('|'.join(WEEKDAYS), days)]
+    return DailyAt(hour, minute, weekdays)
+
+
+class Job:
+    def __init__(self, name, func, next_run, rule=None, exclusive=False):
+        self.name = name
+        self.func = func
+        self.next_run = next_run
+        self.rule = rule
+        self.exclusive = exclusive
+        self.cancelled = False
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def stats(self):
+        return {
+            'schedule': str(self.rule) if self.rule else 'once',
+            'next_run': self.next_run,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'avg_lateness': round(self.total_lateness / self.runs, 4) if self.runs else 0.0,
+            'max_lateness': round(self.max_lateness, 4)
+        }
+
+
+class JobEngine:
+    """Run one-shot and recurring jobs from a single thread that sleeps until the next is due.
+
+    Jobs live in a min-heap on next run time; the thread waits on a condition
+    variable that is notified when an earlier job is added or on shutdown.
+    The clock is injectable, and run_pending() can be driven directly in tests.
+
+    When several workers schedule the same jobs, claim(key, ttl) (such as
+    state.SQLiteState.claim) decides which one runs each occurrence of an
+    exclusive job; the others skip it.
+    """
+
+    def __init__(self, clock=time.time, claim=None):
+        self.clock = clock
+        self.claim = claim
+        self.jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def schedule(self, name, func, rule=None, at=None, exclusive=False):
+        """Add a job running func() at `at` (one-shot) or per rule (recurring).
+
+        A job with the same name replaces the existing one. An exclusive job
+        runs in only one of the workers sharing the engine's claim function.
+        """
+        if rule is None and at is None:
+            raise ValueError(f"job {name!r} needs a rule or an at time")
+        with self._cond:
+            if name in self.jobs:
+                self.jobs[name].cancelled = True
+            next_run = at if at is not None else rule.next_after(self.clock())
+            job = Job(name, func, next_run, rule, exclusive)
+            self.jobs[name] = job
+            heapq.heappush(self._heap, (next_run, next(self._seq), job))
+            self._cond.notify()
+            return job
+
+    def every(self, seconds, name, func, exclusive=False):
+        return self.schedule(name, func, rule=Interval(seconds), exclusive=exclusive)
+
+    def daily(self, at, name, func, weekdays=None, exclusive=False):
+        hour, minute = (int(part) for part in at.split(':'))
+        return self.schedule(name, func, rule=DailyAt(hour, minute, weekdays), exclusive=exclusive)
+
+    def once(self, at, name, func, exclusive=False):
+        return self.schedule(name, func, at=at, exclusive=exclusive)
+
+    def cancel(self, name):
+        with self._cond:
+            job = self.jobs.pop(name, None)
+            if job:
+                job.cancelled = True
+            return job is not None
+
+    def run_pending(self):
+        """Run every job that is due now; returns how many ran."""
+        ran = 0
+        while True:
+            with self._cond:
+                now = self.clock()
+                job = self._pop_due(now)
+                if job is None:
+                    return ran
+            self._run_job(job, now)
+            ran += 1
+
+    def _pop_due(self, now):
+        while self._heap and self._heap[0][0] <= now:
+            scheduled, _, job = heapq.heappop(self._heap)
+            if not job.cancelled and job.next_run == scheduled:
+                return job
+        return None
+
+    def _claimed(self, job):
+        """True if this worker should run the job's current occurrence."""
+        if not job.exclusive or self.claim is None:
+            return True
+        occurrence, ttl = job.rule.occurrence(job.next_run) if job.rule else (int(job.next_run), 86400)
+        try:
+            return self.claim(f"job:{job.name}:{occurrence}", ttl)
+        except Exception as e:
+            logger.error("Could not claim job '%s'; skipping this run: %s", job.name, e)
+            return False
+
+    def _run_job(self, job, now):
+        lateness = max(0.0, now - job.next_run)
+        ran = self._claimed(job)
+        if ran:
+            try:
+                job.func()
+            except Exception as e:
+                job.failures += 1
+                logger.error("Job '%s' failed: %s", job.name, e)
+        with self._cond:
+            if ran:
+                job.runs += 1
+                job.total_lateness += lateness
+                job.max_lateness = max(job.max_lateness, lateness)
+            else:
+                job.skipped += 1
+            if job.rule and not job.cancelled:
+                # Skip runs missed while busy rather than replaying them
+                job.next_run = job.rule.next_after(max(self.clock(), job.next_run))
+                heapq.heappush(self._heap, (job.next_run, next(self._seq), job))
+            elif self.jobs.get(job.name) is job:
+                del self.jobs[job.name]
+
+    def _run(self):
+        while True:
+            self.run_pending()
+            with self._cond:
+                if self._stopped:
+                    return
+                timeout = self._heap[0][0] - self.clock() if self._heap else None
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='job-engine', daemon=True)
+            self._thread.start()
+        return self
+
+    def shutdown(self, wait=True):
+        """Stop the engine thread; a job already running is allowed to finish."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if wait and self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def stats(self):
+        with self._cond:
+            return {name: job.stats() for name, job in self.jobs.items()}
@@ -0,0 +1,119 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Common romanized Hindi (Hinglish) words. langdetect's Hindi profile is
+# Devanagari only, so "chrome kholo" otherwise comes out as Somali or Indonesian.
+ROMAN_HINDI_WORDS = frozenset('''
+    aap aaj acha accha aur bahut batao bata bhai bhejo band chahiye chalo dekho haan hai hain hoon hum
+    jaldi kab kaise kal karo karna karte kholo khol kholna kuch kya kyun mera meri mere mujhe mujhko nahi
+    nahin paas raha rahi sab samjha suno theek thik tum tumhara yaar yahan woh wala wali
+'''.split())
+
+_WORDS = re.compile(r"[a-z]+")
+
+
+class LanguageDetector:
+    """langdetect with its profiles loaded once, a fixed seed and a sticky language per user.
+
+    langdetect samples n-grams at random, so the same text can be labelled
+    differently from one call to the next; with a fixed seed it is
+    deterministic, which also makes results safe to cache. The last
+    cache_size texts are kept in an LRU. Each user keeps the last language
+    detected with at least `confidence`: messages with fewer than
+    min_letters letters ("ok", "haan", "thanks!") reuse it without being
+    detected, and a less confident detection does not replace it. Only the
+    first max_chars characters of a message are examined, and romanized
+    Hindi is recognised by its common words before langdetect is tried.
+    """
+
+    def __init__(self, default='en', seed=0, min_letters=12, confidence=0.9, cache_size=1024, max_users=10000,
+                 max_chars=500):
+        # A private factory rather than langdetect.detect(), which loads profiles on
+        # its first call and shares one unseeded factory with every other caller
+        from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+        self.factory = DetectorFactory()
+        self.factory.load_profile(PROFILES_DIRECTORY)
+        self.factory.set_seed(seed)
+        self.default = default
+        self.min_letters = min_letters
+        self.confidence = confidence
+        self.cache_size = cache_size
+        self.max_users = max_users
+        self.max_chars = max_chars
+        self.detections = 0
+        self.cache_hits = 0
+        self.sticky_hits = 0
+        self.failures = 0
+        self._cache = OrderedDict()
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _identify(self, text):
+        """(language, probability) of text's most likely language."""
+        words = _WORDS.findall(text.lower())
+        if words:
+            hindi = sum(word in ROMAN_HINDI_WORDS for word in words)
+            if hindi >= 2 or hindi / len(words) >= 0.4:
+                return 'hi', 1.0
+        detector = self.factory.create()
+        detector.set_max_text_length(self.max_chars)
+        detector.append(text)
+        best = detector.get_probabilities()[0]
+        return best.lang, best.prob
+
+    def detect(self, text, user_id=None):
+        """Language code of text, using and updating user_id's sticky language."""
+        text = text.strip()
+        with self._lock:
+            sticky = self._users.get(user_id) if user_id is not None else None
+            if sticky is not None:
+                self._users.move_to_end(user_id)
+                if sum(ch.isalpha() for ch in text) < self.min_letters:
+                    self.sticky_hits += 1
+                    return sticky
+            result = self._cache.get(text)
+            if result is not None:
+                self._cache.move_to_end(text)
+                self.cache_hits += 1
+
+        if result is None:
+            try:
+                result = self._identify(text)
+            except Exception as e:
+                # No letters to go on (emoji, digits, an empty message)
+                logger.debug("Language detection failed for %r: %s", text[:40], e)
+                with self._lock:
+                    self.failures += 1
+                return sticky or self.default
+            with self._lock:
+                self.detections += 1
+                self._cache[text] = result
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        language, probability = result
+        if user_id is None:
+            return language
+        if probability < self.confidence:
+            return sticky or language
+        with self._lock:
+            self._users[user_id] = language
+            self._users.move_to_end(user_id)
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return language
+
+    def stats(self):
+        with self._lock:
+            return {
+                'detections': self.detections,
+                'cache_hits': self.cache_hits,
+                'sticky_hits': self.sticky_hits,
+                'failures': self.failures,
+                'cached_texts': len(self._cache),
+                'users': len(self._users)
+            }
@@ -0,0 +1,193 @@
+import collections
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = os.name == 'nt'
+
+
+class Launch:
+    """One app process started by a Launcher."""
+
+    def __init__(self, key, user_id, process, spawn_seconds, started_at):
+        self.key = key
+        self.user_id = user_id
+        self.process = process
+        self.pid = process.pid
+        self.spawn_seconds = spawn_seconds
+        self.started_at = started_at
+        self.exited_at = None
+        self.returncode = None
+        self.closed = False
+        self.kill_at = None
+        self.failed = False
+
+    def to_dict(self, now):
+        return {
+            'app': self.key,
+            'pid': self.pid,
+            'running': self.exited_at is None,
+            'seconds': round((self.exited_at or now) - self.started_at, 3),
+            'returncode': self.returncode,
+            'closed': self.closed,
+            'failed': self.failed
+        }
+
+
+class Launcher:
+    """Start apps as detached processes without waiting for them to exit.
+
+    launch() returns as soon as the child is spawned: in its own session
+    (process group) on POSIX, detached from the console on Windows, with
+    stdin/stdout/stderr on /dev/null. One reaper thread polls the children
+    every poll_interval seconds, collecting their exit status so none is
+    left a zombie. A child that exits with an error within early_exit
+    seconds counts as a failed launch and is passed to on_exit, as is every
+    child that exits. close() signals the apps a user launched and kills
+    any still running kill_after seconds later.
+    """
+
+    def __init__(self, poll_interval=0.5, early_exit=2.0, kill_after=5.0, history=200, on_exit=None,
+                 clock=time.monotonic):
+        self.poll_interval = poll_interval
+        self.early_exit = early_exit
+        self.kill_after = kill_after
+        self.on_exit = on_exit
+        self.clock = clock
+        self.launched = 0
+        self.spawn_failures = 0
+        self.early_failures = 0
+        self.exited = 0
+        self.closed = 0
+        self._running = []
+        self._finished = collections.deque(maxlen=history)
+        self._spawn_seconds = collections.deque(maxlen=history)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def launch(self, key, args, shell=False, user_id=None):
+        """Spawn args for app key on behalf of user_id and return its Launch; OSError if it can't start."""
+        options = {'stdin': subprocess.DEVNULL, 'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL,
+                   'close_fds': True, 'shell': shell}
+        if WINDOWS:
+            options['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            # Its own process group, so close() reaches anything the app itself starts
+            options['start_new_session'] = True
+        start = time.perf_counter()
+        try:
+            process = subprocess.Popen(args, **options)
+        except OSError:
+            with self._cond:
+                self.spawn_failures += 1
+            raise
+        spawn_seconds = time.perf_counter() - start
+        launch = Launch(key, user_id, process, spawn_seconds, self.clock())
+        with self._cond:
+            self.launched += 1
+            self._spawn_seconds.append(spawn_seconds)
+            self._running.append(launch)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._reap_loop, name='launcher-reaper', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        logger.debug("Launched %s (pid %s) in %.1f ms", key, process.pid, spawn_seconds * 1000)
+        return launch
+
+    def running(self, user_id=None, key=None):
+        with self._cond:
+            return [launch for launch in self._running if launch.exited_at is None
+                    and (user_id is None or launch.user_id == user_id) and (key is None or launch.key == key)]
+
+    def close(self, user_id, key):
+        """Ask user_id's running key apps to exit; returns how many were signalled."""
+        launches = self.running(user_id, key)
+        now = self.clock()
+        for launch in launches:
+            self._signal(launch, force=False)
+            with self._cond:
+                launch.closed = True
+                launch.kill_at = now + self.kill_after
+                self.closed += 1
+        with self._cond:
+            self._cond.notify()
+        return len(launches)
+
+    def _signal(self, launch, force):
+        try:
+            if WINDOWS:
+                # The shell=True wrapper is a cmd.exe; /T takes the app with it
+                command = ['taskkill', '/T', '/PID', str(launch.pid)] + (['/F'] if force else [])
+                subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+            else:
+                os.killpg(launch.pid, signal.SIGKILL if force else signal.SIGTERM)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.debug("Could not signal %s (pid %s): %s", launch.key, launch.pid, e)
+
+    def _reap_loop(self):
+        while True:
+            with self._cond:
+                while not self._running and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                self._cond.wait(self.poll_interval)
+                launches = list(self._running)
+            now = self.clock()
+            for launch in launches:
+                returncode = launch.process.poll()
+                if returncode is None:
+                    if launch.kill_at is not None and now >= launch.kill_at:
+                        logger.info("%s (pid %s) ignored close; killing it", launch.key, launch.pid)
+                        self._signal(launch, force=True)
+                        launch.kill_at = None
+                    continue
+                self._finish(launch, returncode, now)
+
+    def _finish(self, launch, returncode, now):
+        with self._cond:
+            launch.returncode = returncode
+            launch.exited_at = now
+            launch.failed = returncode != 0 and not launch.closed and now - launch.started_at <= self.early_exit
+            self._running.remove(launch)
+            self._finished.append(launch)
+            self.exited += 1
+            self.early_failures += launch.failed
+        if launch.failed:
+            logger.warning("%s (pid %s) exited with %s right after launch", launch.key, launch.pid, returncode)
+        if self.on_exit:
+            try:
+                self.on_exit(launch)
+            except Exception as e:
+                logger.error("Launcher on_exit callback failed: %s", e)
+
+    def shutdown(self):
+        """Stop reaping; launched apps keep running."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    def stats(self):
+        now = self.clock()
+        with self._cond:
+            spawn = sorted(self._spawn_seconds)
+            running = {}
+            for launch in self._running:
+                running.setdefault(str(launch.user_id), []).append(launch.to_dict(now))
+            return {
+                'launched': self.launched,
+                'spawn_failures': self.spawn_failures,
+                'early_failures': self.early_failures,
+                'exited': self.exited,
+                'closed': self.closed,
+                'spawn_ms_median': round(spawn[len(spawn) // 2] * 1000, 2) if spawn else None,
+                'spawn_ms_max': round(spawn[-1] * 1000, 2) if spawn else None,
+                'running': running,
+                'recent_exits': [launch.to_dict(now) for launch in list(self._finished)[-10:]]
+            }
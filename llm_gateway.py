@@ -0,0 +1,427 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from http_client import CircuitOpenError, LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Request priorities; when quota is short, lower numbers are admitted first
+INTERACTIVE, BULK = 0, 1
+
+# How often a waiting coroutine re-checks its place in the queue (threads are notified instead)
+ASYNC_POLL_SECONDS = 0.02
+
+# Queue wait histogram bucket upper bounds, in seconds
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class QuotaExceeded(RuntimeError):
+    """Raised when no model has quota for a request within the gateway's max_wait."""
+
+
+def is_throttle(error):
+    """True for quota and rate-limit errors: HTTP 429, google.api_core's ResourceExhausted."""
+    if type(error).__name__ in ('ResourceExhausted', 'TooManyRequests') or getattr(error, 'code', None) == 429:
+        return True
+    message = str(error).lower()
+    return '429' in message or 'quota' in message or 'rate limit' in message
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`. Not thread-safe; LLMGateway holds its lock."""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now):
+        """Seconds until a token is available."""
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def drain(self, now):
+        self._refill(now)
+        self.tokens = 0.0
+
+
+class ModelSlot:
+    """A model and its own token bucket: Gemini quotas are per model."""
+
+    def __init__(self, name, model, rate, burst, now):
+        self.name = name
+        self.model = model
+        self.bucket = TokenBucket(rate, burst, now)
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.throttled = 0
+
+    def take(self, now):
+        return now >= self.cooldown_until and self.bucket.take(now)
+
+    def wait_time(self, now):
+        return max(self.cooldown_until - now, self.bucket.wait_time(now))
+
+    def stats(self, now):
+        return {
+            'calls': self.calls,
+            'throttled': self.throttled,
+            'tokens': round(min(self.bucket.burst, self.bucket.tokens + (now - self.bucket.updated) * self.bucket.rate), 2),
+            'rpm': round(self.bucket.rate * 60, 2),
+            'cooling_down_seconds': round(max(0.0, self.cooldown_until - now), 2)
+        }
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LLMGateway:
+    """Admission control for Gemini calls, shared by the Flask and async apps.
+
+    Each model has a token bucket of `rpm` requests per minute (bursts of up
+    to `burst`). Requests wait in one priority queue, INTERACTIVE ahead of
+    BULK and first come first served within a priority, and the request at
+    the head takes a token from the first model that has one. Identical
+    prompts in flight at the same time share a single call; a non-zero
+    coalesce_window holds each new prompt that long first, so repeats
+    arriving within the window are answered by the same call. Distinct
+    prompts are never combined: generate_content takes one prompt per call.
+
+    primary() returns the current model (None when Gemini is not
+    configured). fallbacks(primary_name) returns alternative (name, model)
+    pairs; it is called once, the first time the primary runs out of local
+    quota or is throttled by the API, and each alternative gets its own
+    bucket of `fallback_rpm`. A throttled model is skipped for `cooldown`
+    seconds. Requests that cannot be admitted within max_wait seconds fail
+    with QuotaExceeded.
+
+    A failed call that is not a throttle is retried up to `retries` times
+    with jittered exponential backoff, each attempt taking a token of its
+    own. Sync calls go through `upstream` (circuit breaker, latency) when
+    given; build it with retries=0, since retries it made itself would
+    bypass the token buckets.
+    """
+
+    def __init__(self, primary, rpm, burst=None, fallbacks=None, fallback_rpm=None, max_wait=30.0,
+                 coalesce_window=0.0, cooldown=15.0, retries=2, backoff=0.25, max_backoff=4.0, upstream=None,
+                 clock=time.monotonic):
+        self.primary = primary
+        self.rate = rpm / 60.0
+        self.burst = burst or max(1, int(rpm) // 4)
+        self.fallbacks = fallbacks
+        self.fallback_rate = (fallback_rpm or rpm) / 60.0
+        self.max_wait = max_wait
+        self.coalesce_window = coalesce_window
+        self.cooldown = cooldown
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.upstream = upstream
+        self.clock = clock
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.retried = 0
+        self.fallback_calls = 0
+        self.wait_seconds = LatencyHistogram(buckets=WAIT_BUCKETS)
+        self._slots = {}
+        self._primary = None
+        self._fallbacks_loaded = False
+        self._waiting = []
+        self._seq = itertools.count()
+        self._inflight = {}
+        self._async_inflight = {}
+        self._cond = threading.Condition()
+
+    def prepare(self):
+        """Register the current primary model, and the fallbacks once it runs short; may block on the network."""
+        model = self.primary()
+        if model is None:
+            raise RuntimeError("GEMINI_API_KEY not configured")
+        with self._cond:
+            if self._primary is None or self._primary.model is not model:
+                name = getattr(model, 'model_name', None) or 'primary'
+                slot = self._slots.pop(name, None) or ModelSlot(name, model, self.rate, self.burst, self.clock())
+                slot.model = model
+                self._primary = slot
+                # The primary is always tried first
+                self._slots = {name: slot, **self._slots}
+            if not self._needs_fallbacks():
+                return
+            self._fallbacks_loaded = True
+        self._load_fallbacks(self._primary.name)
+
+    def _needs_fallbacks(self):
+        return (self.fallbacks is not None and not self._fallbacks_loaded
+                and self._primary.wait_time(self.clock()) > 0)
+
+    def _prepared(self):
+        with self._cond:
+            return self._primary is not None and not self._needs_fallbacks()
+
+    def _load_fallbacks(self, primary_name):
+        try:
+            alternatives = [(name, model) for name, model in self.fallbacks(primary_name) if name != primary_name]
+        except Exception as e:
+            logger.warning("Could not list fallback models: %s", e)
+            return
+        now = self.clock()
+        with self._cond:
+            for name, model in alternatives:
+                self._slots.setdefault(name, ModelSlot(name, model, self.fallback_rate, self.burst, now))
+            self._cond.notify_all()
+        logger.info("Gemini fallback models: %s", [name for name, _ in alternatives])
+
+    def _try(self, entry, now):
+        """(slot, None) if entry is admitted, else (None, seconds until a model frees up, or None if not at the head)."""
+        if self._waiting[0] is not entry:
+            return None, None
+        for slot in self._slots.values():
+            if slot.take(now):
+                heapq.heappop(self._waiting)
+                slot.calls += 1
+                if slot is not self._primary:
+                    self.fallback_calls += 1
+                return slot, None
+        return None, min(slot.wait_time(now) for slot in self._slots.values())
+
+    def _leave(self, entry, start, admitted):
+        if not admitted:
+            self._waiting.remove(entry)
+            heapq.heapify(self._waiting)
+            self.rejected += 1
+        self.wait_seconds.observe(self.clock() - start)
+        self._cond.notify_all()
+
+    def _rejection(self, last_error):
+        if last_error is not None:
+            return QuotaExceeded(f"Gemini quota exhausted: {last_error}")
+        return QuotaExceeded(f"Gemini quota exhausted; no model was free within {self.max_wait:g}s")
+
+    def acquire(self, priority=INTERACTIVE, deadline=None, last_error=None):
+        """Wait for a model with quota to spare, in priority order; returns its ModelSlot."""
+        self.prepare()
+        start = self.clock()
+        deadline = start + self.max_wait if deadline is None else deadline
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            slot = None
+            try:
+                while True:
+                    now = self.clock()
+                    slot, wait = self._try(entry, now)
+                    if slot is not None:
+                        return slot
+                    if now >= deadline:
+                        raise self._rejection(last_error)
+                    self._cond.wait(deadline - now if wait is None else min(wait, deadline - now))
+            finally:
+                self._leave(entry, start, slot is not None)
+
+    async def aacquire(self, priority=INTERACTIVE, deadline=None, last_error=None):
+        """Coroutine form of acquire(); polls instead of holding a thread while it waits."""
+        if not self._prepared():
+            await asyncio.to_thread(self.prepare)
+        start = self.clock()
+        deadline = start + self.max_wait if deadline is None else deadline
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+        slot = None
+        try:
+            while True:
+                with self._cond:
+                    now = self.clock()
+                    slot, wait = self._try(entry, now)
+                if slot is not None:
+                    return slot
+                if now >= deadline:
+                    raise self._rejection(last_error)
+                await asyncio.sleep(min(ASYNC_POLL_SECONDS if wait is None else wait, deadline - now))
+        finally:
+            with self._cond:
+                self._leave(entry, start, slot is not None)
+
+    def _throttle(self, slot, error):
+        with self._cond:
+            now = self.clock()
+            slot.throttled += 1
+            self.throttled += 1
+            slot.cooldown_until = now + self.cooldown
+            slot.bucket.drain(now)
+        logger.warning("Gemini model %s throttled, cooling down for %ss: %s", slot.name, self.cooldown, error)
+
+    def _retry_delay(self, slot, error, failures):
+        """Seconds to back off before trying again after error, or None to raise it."""
+        if is_throttle(error):
+            self._throttle(slot, error)
+            return 0.0
+        if isinstance(error, CircuitOpenError) or failures > self.retries:
+            return None
+        with self._cond:
+            self.retried += 1
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (failures - 1)))
+        logger.debug("Gemini call failed (%s); retrying in %.2fs", error, delay)
+        return delay
+
+    def _dispatch(self, call, priority):
+        """call(slot) on admitted models until one succeeds; every attempt is admitted separately."""
+        with self._cond:
+            self.requests += 1
+        deadline = self.clock() + self.max_wait
+        last_error = None
+        failures = 0
+        while True:
+            slot = self.acquire(priority, deadline, last_error)
+            try:
+                if self.upstream is not None:
+                    return self.upstream.call(lambda: call(slot))
+                return call(slot)
+            except Exception as e:
+                failures += not is_throttle(e)
+                delay = self._retry_delay(slot, e, failures)
+                if delay is None:
+                    raise
+                last_error = e
+                time.sleep(delay)
+
+    async def _adispatch(self, call, priority):
+        with self._cond:
+            self.requests += 1
+        deadline = self.clock() + self.max_wait
+        last_error = None
+        failures = 0
+        while True:
+            slot = await self.aacquire(priority, deadline, last_error)
+            try:
+                return await call(slot)
+            except Exception as e:
+                failures += not is_throttle(e)
+                delay = self._retry_delay(slot, e, failures)
+                if delay is None:
+                    raise
+                last_error = e
+                await asyncio.sleep(delay)
+
+    def generate(self, prompt, priority=INTERACTIVE):
+        """model.generate_content(prompt) on the first model with quota; concurrent repeats share the call."""
+        with self._cond:
+            flight = self._inflight.get(prompt)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[prompt] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+        try:
+            if self.coalesce_window:
+                time.sleep(self.coalesce_window)
+            flight.value = self._dispatch(lambda slot: slot.model.generate_content(prompt), priority)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._cond:
+                del self._inflight[prompt]
+            flight.done.set()
+
+    def stream(self, prompt, priority=INTERACTIVE):
+        """Streaming generate_content(prompt); not shared, since each caller consumes its own chunks.
+
+        The first chunk is fetched during admission so a throttled stream
+        moves on to the next model before anything reaches the caller.
+        """
+        return self._dispatch(lambda slot: _started(slot.model.generate_content(prompt, stream=True)), priority)
+
+    async def agenerate(self, prompt, call, priority=INTERACTIVE):
+        """Coroutine form of generate(): awaits call(slot), where slot.name is the model to ask."""
+        flight = self._async_inflight.get(prompt)
+        if flight is not None:
+            with self._cond:
+                self.coalesced += 1
+            return await asyncio.shield(flight)
+        flight = self._async_inflight[prompt] = asyncio.get_running_loop().create_future()
+        try:
+            if self.coalesce_window:
+                await asyncio.sleep(self.coalesce_window)
+            value = await self._adispatch(call, priority)
+            flight.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # followers re-raise it; don't log it as unretrieved
+            raise
+        finally:
+            del self._async_inflight[prompt]
+
+    async def astream(self, call, priority=INTERACTIVE):
+        """Coroutine form of stream(): call(slot) returns an async iterator of text chunks."""
+        async def start(slot):
+            chunks = call(slot)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                return _aiter_from(None, chunks)
+            return _aiter_from(first, chunks)
+        return await self._adispatch(start, priority)
+
+    def stats(self):
+        with self._cond:
+            now = self.clock()
+            return {
+                'requests': self.requests,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'throttled': self.throttled,
+                'retried': self.retried,
+                'fallback_calls': self.fallback_calls,
+                'waiting': len(self._waiting),
+                'wait_seconds': self.wait_seconds.snapshot(),
+                'models': {name: slot.stats(now) for name, slot in self._slots.items()}
+            }
+
+
+def _started(chunks):
+    """Fetch the first item of an iterable now; return an iterator over all of it."""
+    chunks = iter(chunks)
+    for first in chunks:
+        return itertools.chain((first,), chunks)
+    return iter(())
+
+
+async def _aiter_from(first, chunks):
+    if first is not None:
+        yield first
+    async for chunk in chunks:
+        yield chunk
@@ -0,0 +1,146 @@
+import logging
+import re
+import threading
+from collections import OrderedDict, deque
+
+from http_client import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Prompt size histogram bucket upper bounds, in estimated tokens
+PROMPT_TOKEN_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def clip(text, max_tokens):
+    """Trim text to about max_tokens, cutting at a word boundary."""
+    text = ' '.join(text.split())
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + '...'
+
+
+def condense_turns(summary, turns, max_tokens):
+    """Fold turns into the rolling summary: one line per turn, oldest lines dropped past max_tokens."""
+    lines = summary.splitlines() if summary else []
+    for query, response in turns:
+        first_sentence = re.split(r'(?<=[.!?])\s', response.strip(), maxsplit=1)[0]
+        lines.append(f"- User asked: {clip(query, 24)}; Jarvis: {clip(first_sentence, 40)}")
+    while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > max_tokens:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+
+class _UserMemory:
+    def __init__(self, recent_turns):
+        self.turns = deque(maxlen=recent_turns)
+        self.summary = ''
+        self.context = None
+
+
+class ConversationMemory:
+    """Per-user conversation context for Gemini prompts, under a token budget.
+
+    The newest turns live in a per-user ring buffer and go into the prompt
+    verbatim. When the buffer is full, its oldest half is folded into a
+    rolling summary in one step, so the summary is only recomputed when the
+    window slides; the assembled context is cached until the next turn.
+    Buffers are loaded from the sessions table on a user's first request.
+    """
+
+    def __init__(self, storage, recent_turns=6, token_budget=1024, summary_tokens=256,
+                 max_users=1000, summarize=condense_turns):
+        self.storage = storage
+        self.recent_turns = recent_turns
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.max_users = max_users
+        self.summarize = summarize
+        self.slides = 0
+        self.context_hits = 0
+        self.context_builds = 0
+        self.prompt_tokens = LatencyHistogram(buckets=PROMPT_TOKEN_BUCKETS)
+        self.context_tokens = LatencyHistogram(buckets=PROMPT_TOKEN_BUCKETS)
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user(self, user_id):
+        memory = self._users.get(user_id)
+        if memory is not None:
+            self._users.move_to_end(user_id)
+            return memory
+        memory = self._users[user_id] = _UserMemory(self.recent_turns)
+        if len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        # Replay enough history to rebuild the window and a short summary
+        rows = self.storage.fetchall("SELECT query, response FROM sessions WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                                     (user_id, self.recent_turns * 3))
+        for query, response in reversed(rows):
+            self._append(memory, query or '', response or '')
+        return memory
+
+    def _append(self, memory, query, response):
+        if len(memory.turns) == memory.turns.maxlen:
+            folded = [memory.turns.popleft() for _ in range(len(memory.turns) - self.recent_turns // 2)]
+            memory.summary = self.summarize(memory.summary, folded, self.summary_tokens)
+            self.slides += 1
+        memory.turns.append((query, response))
+        memory.context = None
+
+    def record(self, user_id, query, response):
+        with self._lock:
+            self._append(self._user(user_id), query, response)
+
+    def context(self, user_id):
+        """Conversation context for the user's next prompt, within token_budget."""
+        with self._lock:
+            memory = self._user(user_id)
+            if memory.context is not None:
+                self.context_hits += 1
+                return memory.context
+            self.context_builds += 1
+            context = memory.context = self._build(memory)
+        self.context_tokens.observe(estimate_tokens(context))
+        return context
+
+    def _build(self, memory):
+        # The summary is already capped at summary_tokens by summarize()
+        parts = [f"Summary of earlier conversation:\n{memory.summary}"] if memory.summary else []
+        header = "Recent conversation:\n"
+        remaining = self.token_budget - sum(estimate_tokens(part) + 1 for part in parts) - estimate_tokens(header)
+        turns = []
+        # Oldest first, so budget left over by short turns goes to the newer ones
+        for index, (query, response) in enumerate(memory.turns):
+            share = remaining // (len(memory.turns) - index)
+            if share < 16:
+                continue
+            query = clip(query, share // 3)
+            turn = f"User: {query}\nJarvis: {clip(response, share - estimate_tokens(query) - 4)}"
+            turns.append(turn)
+            remaining -= estimate_tokens(turn) + 1
+        if turns:
+            parts.append(header + '\n'.join(turns))
+        return '\n'.join(parts)
+
+    def observe_prompt(self, prompt):
+        """Record the size of a prompt sent to Gemini; returns its estimated tokens."""
+        tokens = estimate_tokens(prompt)
+        self.prompt_tokens.observe(tokens)
+        return tokens
+
+    def stats(self):
+        with self._lock:
+            users = len(self._users)
+        return {
+            'users': users,
+            'slides': self.slides,
+            'context_builds': self.context_builds,
+            'context_hits': self.context_hits,
+            'context_tokens': self.context_tokens.snapshot(),
+            'prompt_tokens': self.prompt_tokens.snapshot()
+        }
@@ -0,0 +1,171 @@
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Format used by set_one_time_reminder() for reminder_time
+REMINDER_TIME_FORMAT = '%I:%M %p on %B %d, %Y'
+
+
+def reminder_due_at(reminder_time):
+    """Epoch seconds for a stored reminder_time string, or None if unparseable."""
+    try:
+        return int(datetime.strptime(reminder_time, REMINDER_TIME_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        try:
+            from dateutil.parser import parse
+            return int(parse(reminder_time, fuzzy=True).timestamp())
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+
+def _create_base_tables(conn):
+    conn.execute('CREATE TABLE IF NOT EXISTS sessions (user_id TEXT, query TEXT, response TEXT, timestamp DATETIME)')
+    conn.execute('CREATE TABLE IF NOT EXISTS reminders (user_id TEXT, task TEXT, reminder_time TEXT, created_at DATETIME)')
+
+
+def _add_primary_keys(conn):
+    # SQLite cannot add a primary key in place, so rebuild both tables
+    conn.execute('''CREATE TABLE sessions_new (
+        id INTEGER PRIMARY KEY, user_id TEXT, query TEXT, response TEXT, timestamp DATETIME)''')
+    conn.execute('''INSERT INTO sessions_new (user_id, query, response, timestamp)
+        SELECT user_id, query, response, timestamp FROM sessions ORDER BY rowid''')
+    conn.execute('DROP TABLE sessions')
+    conn.execute('ALTER TABLE sessions_new RENAME TO sessions')
+
+    conn.execute('''CREATE TABLE reminders_new (
+        id INTEGER PRIMARY KEY, user_id TEXT, task TEXT, reminder_time TEXT, created_at DATETIME, due_at INTEGER)''')
+    rows = conn.execute('SELECT user_id, task, reminder_time, created_at FROM reminders ORDER BY rowid').fetchall()
+    conn.executemany('INSERT INTO reminders_new (user_id, task, reminder_time, created_at, due_at) VALUES (?, ?, ?, ?, ?)',
+                     [(user_id, task, reminder_time, created_at, reminder_due_at(reminder_time))
+                      for user_id, task, reminder_time, created_at in rows])
+    conn.execute('DROP TABLE reminders')
+    conn.execute('ALTER TABLE reminders_new RENAME TO reminders')
+
+
+def _add_indexes(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user_timestamp ON sessions (user_id, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_user_created ON reminders (user_id, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reminders_due_at ON reminders (due_at)')
+
+
+def _add_reminder_fired_at(conn):
+    conn.execute('ALTER TABLE reminders ADD COLUMN fired_at INTEGER')
+    # Reminders already past due were delivered (or missed) by the old timer threads
+    conn.execute("UPDATE reminders SET fired_at = due_at WHERE due_at <= strftime('%s', 'now')")
+
+
+def _create_recurring_reminders(conn):
+    # rule is a jobs.DailyAt rule string such as 'weekday 09:00'
+    conn.execute('''CREATE TABLE IF NOT EXISTS recurring_reminders (
+        id INTEGER PRIMARY KEY, user_id TEXT, task TEXT, rule TEXT, created_at DATETIME)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_recurring_reminders_user ON recurring_reminders (user_id)')
+
+
+def _create_semantic_cache(conn):
+    # slot is the row of the question vector in semantic_cache.SemanticCache's memmap file
+    conn.execute('''CREATE TABLE IF NOT EXISTS semantic_cache (
+        slot INTEGER PRIMARY KEY, namespace TEXT, query TEXT, answer TEXT,
+        compute_seconds REAL, expires_at REAL, last_access REAL)''')
+
+
+def _create_tasks(conn):
+    # Background tasks run by tasks.TaskQueue; task_requests lists everyone waiting on a task
+    conn.execute('''CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY, kind TEXT, upstream TEXT, dedup_key TEXT, payload TEXT, state TEXT,
+        result TEXT, error TEXT, attempts INTEGER, created_at REAL, started_at REAL, finished_at REAL)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks (state, id)')
+    # At most one in-flight task per dedup key
+    conn.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_in_flight ON tasks (dedup_key)
+        WHERE state IN ('queued', 'running')''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS task_requests (
+        task_id INTEGER, user_id TEXT, query TEXT, created_at REAL)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_task_requests_task ON task_requests (task_id)')
+
+
+def _create_state_claims(conn):
+    # Claims by state.SQLiteState: which worker runs a scheduled job occurrence
+    conn.execute('CREATE TABLE IF NOT EXISTS state_claims (key TEXT PRIMARY KEY, owner TEXT, expires_at REAL)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_state_claims_expires ON state_claims (expires_at)')
+
+
+def _create_session_archive(conn):
+    # Old sessions rows moved by retention.SessionRetention: one compressed NDJSON blob per user per day
+    conn.execute('''CREATE TABLE IF NOT EXISTS session_archive (
+        id INTEGER PRIMARY KEY, user_id TEXT, day TEXT, codec TEXT, rows INTEGER, data BLOB, updated_at REAL,
+        UNIQUE (user_id, day))''')
+
+
+def _add_semantic_cache_shard(conn):
+    # Each worker process has its own vector file (state.claim_worker_slot), so slots are numbered per shard
+    conn.execute('''CREATE TABLE semantic_cache_new (
+        shard INTEGER, slot INTEGER, namespace TEXT, query TEXT, answer TEXT,
+        compute_seconds REAL, expires_at REAL, last_access REAL, PRIMARY KEY (shard, slot))''')
+    conn.execute('''INSERT INTO semantic_cache_new
+        SELECT 0, slot, namespace, query, answer, compute_seconds, expires_at, last_access FROM semantic_cache''')
+    conn.execute('DROP TABLE semantic_cache')
+    conn.execute('ALTER TABLE semantic_cache_new RENAME TO semantic_cache')
+
+
+def _add_task_leases(conn):
+    # The worker running a task and when its lease runs out unless renewed; see tasks.TaskQueue
+    conn.execute('ALTER TABLE tasks ADD COLUMN owner TEXT')
+    conn.execute('ALTER TABLE tasks ADD COLUMN lease_until REAL')
+
+
+def _create_response_cache(conn):
+    # cache.SQLiteCacheBackend entries; databases used with CACHE_BACKEND=sqlite already have the table
+    conn.execute('''CREATE TABLE IF NOT EXISTS response_cache (
+        namespace TEXT, key TEXT, value TEXT, expires_at REAL, last_access REAL, PRIMARY KEY (namespace, key))''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_access ON response_cache (last_access)')
+
+
+# Ordered schema migrations: (version, description, function).
+# Append new migrations; never edit or reorder ones that have shipped.
+MIGRATIONS = [
+    (1, 'create sessions and reminders tables', _create_base_tables),
+    (2, 'add integer primary keys and reminders.due_at', _add_primary_keys),
+    (3, 'index sessions and reminders by user', _add_indexes),
+    (4, 'track reminder delivery in reminders.fired_at', _add_reminder_fired_at),
+    (5, 'create recurring_reminders table', _create_recurring_reminders),
+    (6, 'create semantic_cache table', _create_semantic_cache),
+    (7, 'create tasks and task_requests tables', _create_tasks),
+    (8, 'create state_claims table', _create_state_claims),
+    (9, 'create session_archive table', _create_session_archive),
+    (10, 'number semantic_cache slots per worker shard', _add_semantic_cache_shard),
+    (11, 'add owner and lease_until to tasks', _add_task_leases),
+    (12, 'create response_cache table', _create_response_cache),
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations; safe to call on every startup.
+
+    Each migration runs in its own IMMEDIATE transaction together with the
+    user_version bump, so a crash leaves the schema at the last completed
+    version and concurrent starters serialize on the write lock.
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for version, description, apply in MIGRATIONS:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Re-check under the lock in case another process migrated first
+                if schema_version(conn) >= version:
+                    conn.execute('ROLLBACK')
+                    continue
+                apply(conn)
+                conn.execute(f'PRAGMA user_version = {int(version)}')
+                conn.execute('COMMIT')
+                logger.info("Applied migration %s: %s", version, description)
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+    finally:
+        conn.isolation_level = isolation_level
+    return schema_version(conn)
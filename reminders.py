@@ -0,0 +1,129 @@
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderScheduler:
+    """Fire reminders from a single thread backed by a min-heap on due time.
+
+    Only reminders due within the next `window` seconds are held in memory;
+    the rest stay in the reminders table and are loaded when the window
+    slides. Cancellation is lazy: the entry is dropped from the pending map
+    and skipped when it reaches the top of the heap. A due reminder is
+    claimed by setting its fired_at before it is delivered, so when several
+    workers share the database each reminder is delivered by exactly one of
+    them, and a restart never delivers it twice.
+    """
+
+    def __init__(self, storage, notify, window=3600, grace=300, clock=time.time):
+        self.storage = storage
+        self.notify = notify
+        self.window = window
+        self.grace = grace
+        self.clock = clock
+        self.fired = 0
+        self.lost = 0
+        self._heap = []
+        self._pending = {}
+        self._window_end = 0.0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='reminder-scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+
+    def add(self, reminder_id, user_id, task, due_at):
+        """Schedule a stored reminder; reminders beyond the window load later."""
+        with self._cond:
+            if due_at >= self._window_end and self._thread is not None:
+                return
+            self._push(reminder_id, user_id, task, due_at)
+            if self._heap[0][1] == reminder_id:
+                self._cond.notify()
+
+    def cancel(self, reminder_id):
+        with self._cond:
+            cancelled = self._pending.pop(reminder_id, None) is not None
+            # Drop cancelled entries once they make up most of the heap
+            if len(self._heap) > 64 and len(self._heap) > 2 * len(self._pending):
+                self._heap = [entry for entry in self._heap if entry[1] in self._pending]
+                heapq.heapify(self._heap)
+            return cancelled
+
+    def stats(self):
+        with self._cond:
+            return {'pending': len(self._pending), 'heap_size': len(self._heap), 'fired': self.fired,
+                    'claimed_elsewhere': self.lost}
+
+    def _push(self, reminder_id, user_id, task, due_at):
+        if reminder_id in self._pending:
+            return
+        entry = (due_at, reminder_id, user_id, task)
+        self._pending[reminder_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _load_window(self, now):
+        window_end = now + self.window
+        rows = self.storage.fetchall(
+            "SELECT id, user_id, task, due_at FROM reminders WHERE fired_at IS NULL AND due_at >= ? AND due_at < ?",
+            (now - self.grace, window_end)
+        )
+        for reminder_id, user_id, task, due_at in rows:
+            self._push(reminder_id, user_id, task, due_at)
+        self._window_end = window_end
+        logger.debug("Reminder window loaded: %s due before %.0f", len(rows), self._window_end)
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._pending.get(entry[1]) is entry:
+                del self._pending[entry[1]]
+                due.append(entry)
+        return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = self.clock()
+                if now >= self._window_end:
+                    self._load_window(now)
+                due = self._pop_due(now)
+                if not due:
+                    next_at = min(self._heap[0][0], self._window_end) if self._heap else self._window_end
+                    self._cond.wait(max(0.0, next_at - now))
+                    continue
+            for due_at, reminder_id, user_id, task in due:
+                self._fire(reminder_id, user_id, task)
+
+    def _fire(self, reminder_id, user_id, task):
+        # Claim it first: another worker (or a cancel) may have got there already
+        claimed = self.storage.execute("UPDATE reminders SET fired_at = ? WHERE id = ? AND fired_at IS NULL",
+                                       (int(self.clock()), reminder_id)) > 0
+        if not claimed:
+            with self._cond:
+                self.lost += 1
+            return
+        try:
+            self.notify(user_id, task)
+        except Exception as e:
+            logger.error("Reminder notification failed for '%s': %s", task, e)
+        with self._cond:
+            self.fired += 1
+        logger.debug("Reminder fired: %s for user %s", task, user_id)
@@ -0,0 +1,219 @@
+import json
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# SQLite PRAGMA auto_vacuum value for INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def default_codec():
+    """'zstd' when the optional zstandard package is installed, else 'zlib'."""
+    try:
+        import zstandard  # noqa: F401
+        return 'zstd'
+    except ImportError:
+        return 'zlib'
+
+
+def _compressor(codec):
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=9).compress
+    return lambda data: zlib.compress(data, 6)
+
+
+def _decompress(codec, data):
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _timestamp_key(timestamp):
+    """Stored sessions.timestamp values are datetime strings; compare them as such."""
+    return str(timestamp) if timestamp is not None else ''
+
+
+class SessionRetention:
+    """Keep the sessions table bounded by archiving old turns into compressed blobs.
+
+    Each user keeps at most max_rows live rows, none older than max_age
+    seconds. Older rows move to session_archive: one row per user per day
+    holding that day's turns as compressed NDJSON (zstd if available, else
+    zlib), written and deleted from sessions in one transaction. archive()
+    handles at most `limit` rows per call so a run stays short; vacuum()
+    hands the freed pages back to the file system a few at a time.
+    """
+
+    def __init__(self, storage, max_rows=5000, max_age=90 * 86400, codec=None, batch_size=5000, clock=time.time):
+        self.storage = storage
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.codec = codec or default_codec()
+        self.batch_size = batch_size
+        self.clock = clock
+        self.archived = 0
+        self.runs = 0
+        self.last_run_seconds = None
+        self.vacuumed_pages = 0
+        self._compress = _compressor(self.codec)
+        self._lock = threading.Lock()
+
+    def _cutoff(self):
+        return _timestamp_key(datetime.fromtimestamp(self.clock() - self.max_age))
+
+    def _excess(self, user_id, cutoff):
+        """How many of the user's oldest rows are over the row or age limit."""
+        total = self.storage.fetchone("SELECT COUNT(*) FROM sessions WHERE user_id = ?", (user_id,))[0]
+        expired = self.storage.fetchone("SELECT COUNT(*) FROM sessions WHERE user_id = ? AND timestamp < ?",
+                                        (user_id, cutoff))[0]
+        return max(expired, total - self.max_rows)
+
+    def archive(self, limit=None):
+        """Archive rows over each user's limits, at most `limit` of them; returns the number archived."""
+        start = time.perf_counter()
+        cutoff = self._cutoff()
+        budget = limit if limit is not None else float('inf')
+        archived = 0
+        users = [row[0] for row in self.storage.fetchall("SELECT DISTINCT user_id FROM sessions")]
+        for user_id in users:
+            excess = min(self._excess(user_id, cutoff), budget - archived)
+            while excess > 0:
+                rows = self.storage.fetchall(
+                    "SELECT id, query, response, timestamp FROM sessions WHERE user_id = ? "
+                    "ORDER BY timestamp, id LIMIT ?", (user_id, int(min(excess, self.batch_size))))
+                if not rows:
+                    break
+                self._archive_rows(user_id, rows)
+                archived += len(rows)
+                excess -= len(rows)
+            if archived >= budget:
+                break
+        with self._lock:
+            self.archived += archived
+            self.runs += 1
+            self.last_run_seconds = round(time.perf_counter() - start, 3)
+        if archived:
+            logger.info("Archived %s session rows in %.1fs", archived, time.perf_counter() - start)
+        return archived
+
+    def _archive_rows(self, user_id, rows):
+        days = {}
+        for session_id, query, response, timestamp in rows:
+            timestamp = _timestamp_key(timestamp)
+            days.setdefault(timestamp[:10], []).append(
+                {'id': session_id, 'query': query, 'response': response, 'timestamp': timestamp})
+        with self.storage.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for day, records in days.items():
+                    existing = conn.execute("SELECT codec, data FROM session_archive WHERE user_id = ? AND day = ?",
+                                            (user_id, day)).fetchone()
+                    lines = b''
+                    if existing:
+                        lines = _decompress(existing[0], existing[1])
+                    lines += ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+                    count = lines.count(b'\n')
+                    conn.execute(
+                        "INSERT INTO session_archive (user_id, day, codec, rows, data, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (user_id, day) DO UPDATE SET codec = excluded.codec, rows = excluded.rows, "
+                        "data = excluded.data, updated_at = excluded.updated_at",
+                        (user_id, day, self.codec, count, self._compress(lines), self.clock()))
+                    conn.executemany("DELETE FROM sessions WHERE id = ?", [(record['id'],) for record in records])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def vacuum(self, pages=2000, full=False):
+        """Return up to `pages` free pages to the file system; returns how many were freed.
+
+        Incremental vacuum needs auto_vacuum=INCREMENTAL, which an existing
+        database only takes after one full VACUUM. That rebuild locks the
+        whole file, so it only happens when full is true; otherwise a
+        database not yet switched over is left alone.
+        """
+        with self.storage.connection() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+                if not full:
+                    return 0
+                freed = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                logger.info("Switching the database to incremental auto-vacuum (full VACUUM)")
+                conn.execute(f'PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}')
+                conn.execute('VACUUM')
+            else:
+                before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                # execute() steps the pragma once, which frees a single page
+                conn.executescript(f'PRAGMA incremental_vacuum({int(pages)})')
+                freed = before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+            # Both rewrite pages through the WAL; fold them back so the file actually shrinks
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        with self._lock:
+            self.vacuumed_pages += freed
+        return freed
+
+    def run(self, limit=None, pages=2000):
+        """Archive, then vacuum: the daily maintenance job."""
+        archived = self.archive(limit)
+        self.vacuum(pages, full=True)
+        return archived
+
+    def export(self, user_id, since=None, until=None, archived=True):
+        """Yield the user's turns as dicts, oldest first: archived days, then live rows.
+
+        since and until are datetime strings ('2025-01-31' or longer)
+        bounding the timestamp; until includes every timestamp it is a
+        prefix of, so until='2025-01-31' covers that whole day. Archive blobs are decompressed one day at a
+        time and live rows are read from a cursor, so memory use stays flat
+        however long the history is.
+        """
+        low = since or ''
+        high = (until or '') + '\uffff'
+        with self.storage.connection() as conn:
+            if archived:
+                blobs = conn.execute(
+                    "SELECT codec, data FROM session_archive WHERE user_id = ? AND day >= ? AND day <= ? ORDER BY day",
+                    (user_id, low[:10], high[:10]))
+                for codec, data in blobs:
+                    for line in _decompress(codec, data).splitlines():
+                        record = json.loads(line)
+                        if low <= record['timestamp'] <= high:
+                            record['archived'] = True
+                            yield record
+            rows = conn.execute(
+                "SELECT id, query, response, timestamp FROM sessions WHERE user_id = ? AND timestamp >= ? "
+                "AND timestamp <= ? ORDER BY timestamp, id", (user_id, low, high))
+            for session_id, query, response, timestamp in rows:
+                yield {'id': session_id, 'query': query, 'response': response,
+                       'timestamp': _timestamp_key(timestamp), 'archived': False}
+
+    def stats(self):
+        live = self.storage.fetchone("SELECT COUNT(*) FROM sessions")[0]
+        archive_rows, archive_bytes, archive_blobs = self.storage.fetchone(
+            "SELECT COALESCE(SUM(rows), 0), COALESCE(SUM(LENGTH(data)), 0), COUNT(*) FROM session_archive")
+        with self.storage.connection() as conn:
+            page_size, page_count, freelist, auto_vacuum = (
+                conn.execute(f'PRAGMA {pragma}').fetchone()[0]
+                for pragma in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum'))
+        with self._lock:
+            return {
+                'live_rows': live,
+                'archived_rows': archive_rows,
+                'archive_blobs': archive_blobs,
+                'archive_bytes': archive_bytes,
+                'codec': self.codec,
+                'database_bytes': page_size * page_count,
+                'free_bytes': page_size * freelist,
+                'incremental_vacuum': auto_vacuum == AUTO_VACUUM_INCREMENTAL,
+                'max_rows_per_user': self.max_rows,
+                'max_age_days': round(self.max_age / 86400, 2),
+                'archived_total': self.archived,
+                'runs': self.runs,
+                'last_run_seconds': self.last_run_seconds,
+                'vacuumed_pages': self.vacuumed_pages
+            }
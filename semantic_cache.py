@@ -0,0 +1,201 @@
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Question boilerplate that says nothing about the topic ("what is", "explain", ...)
+QUESTION_WORDS = re.compile(
+    r'\b(what|whats|who|whos|how|why|when|where|which|is|are|was|were|does|do|did|can|could|would|'
+    r'explain|describe|define|tell|give|me|us|about|please|the|a|an|of|meaning|definition|information|info|on|work|works)\b'
+)
+NGRAM_SIZES = (3, 4, 5)
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and question boilerplate, collapse whitespace."""
+    text = re.sub(r"[^a-z0-9\s]", ' ', text.lower())
+    stripped = ' '.join(QUESTION_WORDS.sub(' ', text).split())
+    return stripped or ' '.join(text.split())
+
+
+def embed(text, dim):
+    """Hashed character n-gram term frequencies (1 + log tf) as a float32 vector."""
+    padded = f' {normalize(text)} '
+    counts = {}
+    for n in NGRAM_SIZES:
+        for i in range(len(padded) - n + 1):
+            index = zlib.crc32(padded[i:i + n].encode('utf-8')) % dim
+            counts[index] = counts.get(index, 0) + 1
+    vector = np.zeros(dim, dtype=np.float32)
+    for index, count in counts.items():
+        vector[index] = 1 + math.log(count)
+    return vector
+
+
+class SemanticCache:
+    """Answers to LLM questions, matched by TF-IDF cosine similarity of the question.
+
+    Question vectors are rows of one float32 matrix memory-mapped from
+    path; a lookup is a single matrix-vector product over it. Answers and
+    slot metadata live in the semantic_cache table, so both survive a
+    restart. IDF weights come from the cached questions themselves and are
+    applied at lookup time. Entries expire after ttl seconds; when every
+    slot is taken the least recently used entry is replaced.
+
+    Slots are allocated in memory, so a vector file and its shard of the
+    table belong to one process: worker processes each use their own
+    (state.claim_worker_slot picks the shard).
+    """
+
+    def __init__(self, storage, path='semantic_cache.f32', capacity=2048, dim=1024, threshold=0.85, ttl=86400,
+                 shard=0):
+        self.storage = storage
+        self.path = path
+        self.shard = shard
+        self.capacity = capacity
+        self.dim = dim
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        self._namespaces = {}
+        self._slot_namespace = np.full(capacity, -1, dtype=np.int32)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._answers = [None] * capacity
+        self._compute_seconds = [0.0] * capacity
+        self._lru = OrderedDict()
+        self._doc_freq = np.zeros(dim, dtype=np.float32)
+        self._norms = None
+
+        expected_size = capacity * dim * 4
+        reuse = os.path.exists(path) and os.path.getsize(path) == expected_size
+        self._vectors = np.memmap(path, dtype=np.float32, mode='r+' if reuse else 'w+', shape=(capacity, dim))
+        self._load(reuse)
+
+    def _load(self, reuse):
+        now = time.time()
+        self.storage.execute('DELETE FROM semantic_cache WHERE shard = ? AND (expires_at <= ? OR slot >= ?)',
+                             (self.shard, now, self.capacity))
+        rows = self.storage.fetchall('''SELECT slot, namespace, query, answer, compute_seconds, expires_at
+            FROM semantic_cache WHERE shard = ? ORDER BY last_access''', (self.shard,))
+        for slot, namespace, query, answer, compute_seconds, expires_at in rows:
+            if not reuse:
+                # The vector file was missing or sized for another capacity/dim
+                self._vectors[slot] = embed(query, self.dim)
+            self._occupy(slot, namespace, answer, compute_seconds, expires_at)
+        self._free = [slot for slot in range(self.capacity - 1, -1, -1) if slot not in self._lru]
+        logger.debug("Semantic cache loaded %s entries from %s", len(rows), self.path)
+
+    def _namespace_id(self, namespace):
+        return self._namespaces.setdefault(namespace, len(self._namespaces))
+
+    def _occupy(self, slot, namespace, answer, compute_seconds, expires_at):
+        self._slot_namespace[slot] = self._namespace_id(namespace)
+        self._expires_at[slot] = expires_at
+        self._answers[slot] = answer
+        self._compute_seconds[slot] = compute_seconds
+        self._lru[slot] = None
+        self._doc_freq += self._vectors[slot] > 0
+        self._norms = None
+
+    def _release(self, slot):
+        self._doc_freq -= self._vectors[slot] > 0
+        self._slot_namespace[slot] = -1
+        self._answers[slot] = None
+        del self._lru[slot]
+        self._free.append(slot)
+        self._norms = None
+
+    def _idf_squared(self):
+        idf = np.log((1 + len(self._lru)) / (1 + self._doc_freq)) + 1
+        return idf * idf
+
+    def _best_match(self, namespace, vector, now):
+        namespace_id = self._namespaces.get(namespace)
+        if namespace_id is None or not self._lru:
+            return None, 0.0
+        weights = self._idf_squared()
+        if self._norms is None:
+            # Row norms under the current IDF; recomputed only after an insert or eviction
+            self._norms = np.sqrt(np.einsum('ij,ij,j->i', self._vectors, self._vectors, weights))
+        query_norm = math.sqrt(float(np.dot(vector * vector, weights)))
+        if query_norm == 0:
+            return None, 0.0
+        scores = self._vectors @ (vector * weights)
+        live = (self._slot_namespace == namespace_id) & (self._expires_at > now) & (self._norms > 0)
+        scores = np.where(live, scores / np.maximum(self._norms, 1e-12), -1.0) / query_norm
+        slot = int(np.argmax(scores))
+        return (slot, float(scores[slot])) if scores[slot] > 0 else (None, 0.0)
+
+    def lookup(self, namespace, text):
+        """Cached answer for a question similar to text, or None."""
+        vector = embed(text, self.dim)
+        now = time.time()
+        with self._lock:
+            slot, score = self._best_match(namespace, vector, now)
+            if slot is None or score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += self._compute_seconds[slot]
+            self._lru.move_to_end(slot)
+            answer = self._answers[slot]
+        self.storage.execute('UPDATE semantic_cache SET last_access = ? WHERE shard = ? AND slot = ?',
+                             (now, self.shard, slot))
+        logger.debug("Semantic cache hit (%.3f) for '%s'", score, text)
+        return answer
+
+    def store(self, namespace, text, answer, compute_seconds=0.0):
+        vector = embed(text, self.dim)
+        now = time.time()
+        with self._lock:
+            if not self._free:
+                expired = [slot for slot in self._lru if self._expires_at[slot] <= now]
+                if not expired:
+                    expired = [next(iter(self._lru))]
+                    self.evictions += 1
+                for slot in expired:
+                    self._release(slot)
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._occupy(slot, namespace, answer, compute_seconds, now + self.ttl)
+        self.storage.execute('''INSERT OR REPLACE INTO semantic_cache
+            (shard, slot, namespace, query, answer, compute_seconds, expires_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', (self.shard, slot, namespace, text, answer, compute_seconds, now + self.ttl, now))
+
+    def get_or_compute(self, namespace, text, compute):
+        """Return a cached answer for text, or call compute() and cache a non-empty result."""
+        answer = self.lookup(namespace, text)
+        if answer is not None:
+            return answer
+        start = time.perf_counter()
+        answer = compute()
+        if answer:
+            self.store(namespace, text, answer, time.perf_counter() - start)
+        return answer
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'shard': self.shard,
+                'entries': len(self._lru),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'evictions': self.evictions,
+                'latency_saved_seconds': round(self.saved_seconds, 3),
+                'threshold': self.threshold
+            }
@@ -0,0 +1,174 @@
+import fnmatch
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id():
+    """Name of this worker process in claims: host:pid."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# Lock files held by claim_worker_slot() for the life of the process
+_slot_locks = []
+
+
+def _try_lock(f):
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def claim_worker_slot(path, limit=64):
+    """Lowest n for which this process gets an exclusive lock on path.n.lock.
+
+    Worker processes sharing a directory use it to pick files of their own
+    (see slot_path) for state that cannot be written by two processes, such
+    as memory-mapped matrices. The lock is held until the process exits, so
+    a restarted worker takes over a free slot and its files. Claim after
+    forking: a lock taken before the fork is shared by every child.
+    """
+    for n in range(limit):
+        f = open(f"{path}.{n}.lock", 'a+')
+        if _try_lock(f):
+            _slot_locks.append(f)
+            logger.debug("Claimed worker slot %s for %s", n, path)
+            return n
+        f.close()
+    raise RuntimeError(f"All {limit} worker slots for {path} are taken")
+
+
+def slot_path(path, n):
+    """path itself for slot 0, else n before its extension: semantic_cache.f32 -> semantic_cache.1.f32."""
+    if n == 0:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{n}{extension}"
+
+
+class SQLiteState:
+    """State shared by every worker process using the same SQLite database.
+
+    claim(key, ttl) is true for exactly one caller until the claim expires,
+    so several workers can agree on who runs a scheduled job occurrence.
+    Expired claims are deleted every `purge_every` claims.
+    """
+
+    def __init__(self, storage, owner=None, purge_every=200, clock=time.time):
+        self.storage = storage
+        self.owner = owner or worker_id()
+        self.purge_every = purge_every
+        self.clock = clock
+        self.claimed = 0
+        self.lost = 0
+        self._claims = 0
+        self._lock = threading.Lock()
+
+    def claim(self, key, ttl):
+        now = self.clock()
+        # Insert, or take over a claim that has expired
+        won = self.storage.execute(
+            "INSERT INTO state_claims (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE state_claims.expires_at <= ?",
+            (key, self.owner, now + ttl, now)) > 0
+        with self._lock:
+            self._claims += 1
+            purge = self._claims % self.purge_every == 0
+            if won:
+                self.claimed += 1
+            else:
+                self.lost += 1
+        if purge:
+            self.storage.execute("DELETE FROM state_claims WHERE expires_at <= ?", (now,))
+        return won
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'sqlite', 'owner': self.owner, 'claimed': self.claimed, 'lost': self.lost}
+
+
+class RedisState:
+    """The same claims kept in Redis (SET NX PX), for workers on different hosts.
+
+    client is a redis.Redis or a FakeRedis.
+    """
+
+    def __init__(self, client, prefix='jarvis:', owner=None):
+        self.client = client
+        self.prefix = prefix
+        self.owner = owner or worker_id()
+        self.claimed = 0
+        self.lost = 0
+        self._lock = threading.Lock()
+
+    def claim(self, key, ttl):
+        won = bool(self.client.set(f"{self.prefix}claim:{key}", self.owner, nx=True, px=max(1, int(ttl * 1000))))
+        with self._lock:
+            if won:
+                self.claimed += 1
+            else:
+                self.lost += 1
+        return won
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'redis', 'owner': self.owner, 'claimed': self.claimed, 'lost': self.lost}
+
+
+class FakeRedis:
+    """In-process stand-in for the few redis.Redis commands Jarvis uses.
+
+    Shared only by the threads of one process, so it suits development and
+    tests, not real multi-worker deployments. Values come back as bytes,
+    as from redis-py without decode_responses.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, name, now):
+        entry = self._data.get(name)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[name]
+            return None
+        return entry
+
+    def get(self, name):
+        with self._lock:
+            entry = self._live(name, self.clock())
+            return entry[0] if entry else None
+
+    def set(self, name, value, ex=None, px=None, nx=False):
+        now = self.clock()
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        expires_at = now + ex if ex is not None else now + px / 1000 if px is not None else None
+        with self._lock:
+            if nx and self._live(name, now) is not None:
+                return None
+            self._data[name] = (value, expires_at)
+            return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    def scan_iter(self, match='*'):
+        with self._lock:
+            names = [name for name in self._data if fnmatch.fnmatchcase(name, match)]
+        return iter(names)
@@ -0,0 +1,156 @@
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class Storage:
+    """Thread-safe access to the Jarvis SQLite database.
+
+    Connections come from a small pool, so Flask request threads, the
+    scheduler and reminder callbacks never share a cursor. The database runs
+    in WAL mode so readers do not block the writer. Session rows are queued
+    and group-committed by one background writer: a batch is flushed when it
+    reaches batch_size rows or flush_interval seconds after its first row.
+    """
+
+    def __init__(self, path='jarvis_sessions.db', pool_size=8, busy_timeout_ms=5000,
+                 batch_size=100, flush_interval=0.05):
+        self.path = path
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        self._writes = queue.Queue()
+        self.batches_written = 0
+        self.rows_written = 0
+
+        with self.connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+        self._writer = threading.Thread(target=self._write_loop, name='storage-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        # NORMAL is durable across application crashes in WAL mode; only an
+        # OS crash or power loss can roll back the last commits.
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out of the pool for the duration of the block."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                create = self._created < self.pool_size
+                if create:
+                    self._created += 1
+            conn = self._connect() if create else self._pool.get()
+        try:
+            yield conn
+        finally:
+            # A block that raised (or never committed) must not return its
+            # transaction, and the write lock with it, to the pool
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def execute(self, sql, params=()):
+        """Run a write statement and commit it; returns the affected row count."""
+        with span('db_write'), self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor.rowcount
+
+    def insert(self, sql, params=()):
+        """Run an INSERT and commit it; returns the new row id."""
+        with span('db_write'), self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor.lastrowid
+
+    def fetchall(self, sql, params=()):
+        with span('db_read'), self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def fetchone(self, sql, params=()):
+        with span('db_read'), self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def compact(self):
+        """Fold the WAL back into the main database file and refresh query planner stats."""
+        with self.connection() as conn:
+            busy, wal_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+            conn.execute('PRAGMA optimize')
+        logger.debug("Database compacted: %s/%s WAL pages checkpointed (busy=%s)", checkpointed, wal_pages, busy)
+        return checkpointed
+
+    def log_session(self, user_id, query, response, timestamp):
+        """Queue a sessions row for the background writer."""
+        with span('db_write'):
+            self._writes.put((user_id, query, response, timestamp))
+
+    def _write_loop(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._writes.get()
+            if item is _STOP:
+                self._writes.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._writes.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    self._writes.task_done()
+                    break
+                batch.append(item)
+            try:
+                conn.executemany('INSERT INTO sessions (user_id, query, response, timestamp) VALUES (?, ?, ?, ?)', batch)
+                conn.commit()
+                self.batches_written += 1
+                self.rows_written += len(batch)
+            except sqlite3.Error as e:
+                logger.error("Failed to write %s session rows: %s", len(batch), e)
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+        conn.close()
+
+    def flush(self):
+        """Block until every queued session row has been committed."""
+        self._writes.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._writes.put(_STOP)
+            self._writer.join()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,100 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# States in which get() returns without taking the lock
+SETTLED = ('ready', 'unavailable', 'failed')
+
+
+class Subsystem:
+    """One lazily initialized capability (camera, LLM, news, ...).
+
+    The loader runs once, on first get() or in a warm-up worker. It returns
+    the object handlers use, or None when the capability is not configured
+    or not supported here; an exception marks the subsystem failed. Either
+    way get() then returns None and handlers fall back to their message.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = 'pending'
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.state in SETTLED:
+            return self.value
+        with self._lock:
+            if self.state == 'pending':
+                self.state = 'loading'
+                start = time.perf_counter()
+                try:
+                    self.value = self.loader()
+                    self.state = 'ready' if self.value is not None else 'unavailable'
+                except Exception as e:
+                    self.error = str(e)
+                    self.state = 'failed'
+                    logger.warning("Subsystem '%s' failed to load: %s", self.name, e)
+                self.load_seconds = round(time.perf_counter() - start, 4)
+                logger.debug("Subsystem '%s' %s in %ss", self.name, self.state, self.load_seconds)
+            return self.value
+
+    def override(self, value):
+        """Install value as the loaded object (benchmarks and local testing)."""
+        with self._lock:
+            self.value = value
+            self.error = None
+            self.state = 'ready' if value is not None else 'unavailable'
+
+    def health(self):
+        return {'state': self.state, 'load_seconds': self.load_seconds, 'error': self.error}
+
+
+class SubsystemRegistry:
+    def __init__(self):
+        self.subsystems = {}
+
+    def register(self, name):
+        """Decorator registering a loader function under name."""
+        def decorator(loader):
+            self.subsystems[name] = Subsystem(name, loader)
+            return loader
+        return decorator
+
+    def get(self, name):
+        return self.subsystems[name].get()
+
+    def error(self, name):
+        return self.subsystems[name].error
+
+    def override(self, name, value):
+        self.subsystems[name].override(value)
+
+    def warm_up(self, names=None, workers=4):
+        """Load subsystems on a few daemon threads so first requests don't pay for imports."""
+        pending = queue.SimpleQueue()
+        names = [name for name in (names if names is not None else self.subsystems) if name in self.subsystems]
+        for name in names:
+            pending.put(self.subsystems[name])
+
+        def work():
+            while True:
+                try:
+                    subsystem = pending.get_nowait()
+                except queue.Empty:
+                    return
+                subsystem.get()
+
+        threads = [threading.Thread(target=work, name=f'warm-up-{i}', daemon=True) for i in range(min(workers, len(names)))]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def health(self):
+        return {name: subsystem.health() for name, subsystem in self.subsystems.items()}
@@ -0,0 +1,244 @@
+import json
+import logging
+import threading
+import time
+
+from state import worker_id
+
+logger = logging.getLogger(__name__)
+
+# Task states; queued and running tasks are "in flight"
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class TaskQueue:
+    """Run slow requests on worker threads, tracked in the tasks table.
+
+    submit() returns a task id at once. A task with the same dedup_key as one
+    still queued or running is not added again: the caller joins the existing
+    task and is recorded in task_requests, so every requester gets the result.
+    Each task names an upstream, and at most limits[upstream] tasks of it run
+    at a time (default_limit for unnamed upstreams).
+
+    Several processes may share the tasks table. A claimed task records its
+    owner (state.worker_id() by default) and a lease that owner renews every
+    lease / 3 seconds while the handler runs. Tasks whose lease has expired,
+    because their worker died or was restarted, are re-queued by start()
+    and by the heartbeat of any live worker, up to max_attempts tries.
+
+    handlers maps a task kind to handler(payload) -> result text. on_finish
+    (task, requests) is called after a task is done or failed, with the
+    task as returned by get() and a list of (user_id, query) requesters.
+    """
+
+    def __init__(self, storage, handlers, on_finish=None, limits=None, default_limit=1, max_attempts=3,
+                 lease=60.0, owner=None, clock=time.time):
+        self.storage = storage
+        self.handlers = handlers
+        self.on_finish = on_finish
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.owner = owner or worker_id()
+        self.clock = clock
+        self.submitted = 0
+        self.deduplicated = 0
+        self.requeued = 0
+        self._running = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._stop = threading.Event()
+        self._threads = []
+
+    def limit(self, upstream):
+        return self.limits.get(upstream, self.default_limit)
+
+    def submit(self, kind, payload, dedup_key, upstream, user_id=None, query=None):
+        """Queue a task or join the in-flight one with the same dedup_key; returns (task_id, deduplicated)."""
+        now = self.clock()
+        with self._cond, self.storage.connection() as conn:
+            # Takes the write lock before the lookup, so a worker process submitting
+            # the same key at the same moment waits and then joins this task
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT id FROM tasks WHERE dedup_key = ? AND state IN (?, ?)",
+                               (dedup_key, QUEUED, RUNNING)).fetchone()
+            if row:
+                task_id = row[0]
+                self.deduplicated += 1
+            else:
+                task_id = conn.execute(
+                    "INSERT INTO tasks (kind, upstream, dedup_key, payload, state, attempts, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, 0, ?)",
+                    (kind, upstream, dedup_key, json.dumps(payload), QUEUED, now)
+                ).lastrowid
+                self.submitted += 1
+            conn.execute("INSERT INTO task_requests (task_id, user_id, query, created_at) VALUES (?, ?, ?, ?)",
+                         (task_id, user_id, query, now))
+            conn.commit()
+            if not row:
+                self._cond.notify()
+        logger.debug("Task %s (%s) %s", task_id, kind, 'joined' if row else 'queued')
+        return task_id, bool(row)
+
+    def get(self, task_id):
+        """Status and result of a task, or None if there is no such task."""
+        row = self.storage.fetchone(
+            "SELECT id, kind, upstream, state, result, error, attempts, owner, created_at, started_at, finished_at "
+            "FROM tasks WHERE id = ?", (task_id,))
+        if row is None:
+            return None
+        keys = ('id', 'kind', 'upstream', 'state', 'result', 'error', 'attempts', 'owner', 'created_at',
+                'started_at', 'finished_at')
+        return dict(zip(keys, row))
+
+    def requests(self, task_id):
+        return self.storage.fetchall("SELECT user_id, query FROM task_requests WHERE task_id = ? ORDER BY rowid",
+                                     (task_id,))
+
+    def cancel(self, task_id):
+        """Cancel a queued or running task; returns False if it had already finished.
+
+        A running handler cannot be interrupted, so it runs to completion and
+        its result is discarded.
+        """
+        with self._cond:
+            return self.storage.execute(
+                "UPDATE tasks SET state = ?, finished_at = ? WHERE id = ? AND state IN (?, ?)",
+                (CANCELLED, self.clock(), task_id, QUEUED, RUNNING)) > 0
+
+    def purge(self, older_than):
+        """Delete finished tasks and their requests older than `older_than` seconds."""
+        cutoff = self.clock() - older_than
+        with self.storage.connection() as conn:
+            conn.execute("DELETE FROM task_requests WHERE task_id IN "
+                         "(SELECT id FROM tasks WHERE state IN (?, ?, ?) AND finished_at < ?)", (*FINISHED, cutoff))
+            deleted = conn.execute("DELETE FROM tasks WHERE state IN (?, ?, ?) AND finished_at < ?",
+                                   (*FINISHED, cutoff)).rowcount
+            conn.commit()
+        return deleted
+
+    def recover(self):
+        """Re-queue running tasks whose lease has expired; returns how many were re-queued.
+
+        Tasks already tried max_attempts times are failed instead. Tasks held
+        by a live worker keep their renewed lease and are left alone.
+        """
+        now = self.clock()
+        expired = "state = ? AND (lease_until IS NULL OR lease_until < ?)"
+        with self._cond, self.storage.connection() as conn:
+            failed = conn.execute(
+                f"UPDATE tasks SET state = ?, error = ?, finished_at = ? WHERE {expired} AND attempts >= ?",
+                (FAILED, 'Interrupted too many times', now, RUNNING, now, self.max_attempts)).rowcount
+            requeued = conn.execute(f"UPDATE tasks SET state = ?, owner = NULL, lease_until = NULL WHERE {expired}",
+                                    (QUEUED, RUNNING, now)).rowcount
+            conn.commit()
+            self.requeued += requeued
+            if requeued:
+                self._cond.notify_all()
+        if requeued or failed:
+            logger.info("Re-queued %s interrupted tasks (%s given up)", requeued, failed)
+        return requeued
+
+    def start(self):
+        """Re-queue tasks whose worker is gone and start the worker and heartbeat threads."""
+        if self._threads:
+            return self
+        self.recover()
+        workers = sum(self.limits.values()) + self.default_limit
+        self._threads = [threading.Thread(target=self._work, name=f'task-worker-{i}', daemon=True)
+                         for i in range(workers)]
+        self._threads.append(threading.Thread(target=self._heartbeat, name='task-heartbeat', daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def shutdown(self, wait=True):
+        """Stop the workers; tasks already running are allowed to finish."""
+        with self._cond:
+            self._stopped = True
+            self._stop.set()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _claim(self):
+        """Mark the oldest queued task whose upstream has a free slot as running, or return None."""
+        full = [upstream for upstream, running in self._running.items() if running >= self.limit(upstream)]
+        sql = "SELECT id, kind, upstream, payload FROM tasks WHERE state = ?"
+        if full:
+            sql += f" AND upstream NOT IN ({','.join('?' * len(full))})"
+        with self.storage.connection() as conn:
+            while True:
+                row = conn.execute(sql + " ORDER BY id LIMIT 1", (QUEUED, *full)).fetchone()
+                if row is None:
+                    return None
+                # Another worker process sharing the database may claim the same row first
+                now = self.clock()
+                claimed = conn.execute(
+                    "UPDATE tasks SET state = ?, started_at = ?, attempts = attempts + 1, owner = ?, lease_until = ? "
+                    "WHERE id = ? AND state = ?",
+                    (RUNNING, now, self.owner, now + self.lease, row[0], QUEUED)).rowcount
+                conn.commit()
+                if claimed:
+                    break
+        self._running[row[2]] = self._running.get(row[2], 0) + 1
+        return row
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    claimed = self._claim()
+                    if claimed:
+                        break
+                    self._cond.wait()
+            task_id, kind, upstream, payload = claimed
+            try:
+                state, result, error = DONE, self.handlers[kind](json.loads(payload)), None
+            except Exception as e:
+                state, result, error = FAILED, None, str(e)
+                logger.error("Task %s (%s) failed: %s", task_id, kind, e)
+            with self._cond:
+                self._running[upstream] -= 1
+                # A cancelled task keeps its cancelled state, and one re-queued after
+                # this worker lost its lease belongs to its new owner; either way the result is dropped
+                finished = self.storage.execute(
+                    "UPDATE tasks SET state = ?, result = ?, error = ?, finished_at = ? "
+                    "WHERE id = ? AND state = ? AND owner = ?",
+                    (state, result, error, self.clock(), task_id, RUNNING, self.owner)) > 0
+                self._cond.notify_all()
+            if finished and self.on_finish:
+                try:
+                    self.on_finish(self.get(task_id), self.requests(task_id))
+                except Exception as e:
+                    logger.error("Task %s completion callback failed: %s", task_id, e)
+
+    def _heartbeat(self):
+        """Renew the leases of this worker's running tasks and recover other workers' expired ones."""
+        while not self._stop.wait(self.lease / 3):
+            try:
+                self.storage.execute("UPDATE tasks SET lease_until = ? WHERE owner = ? AND state = ?",
+                                     (self.clock() + self.lease, self.owner, RUNNING))
+                self.recover()
+            except Exception as e:
+                logger.error("Task lease renewal failed: %s", e)
+
+    def stats(self):
+        counts = dict(self.storage.fetchall("SELECT state, COUNT(*) FROM tasks GROUP BY state"))
+        with self._cond:
+            return {
+                'states': {state: counts.get(state, 0) for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)},
+                'running': {upstream: {'running': running, 'limit': self.limit(upstream)}
+                            for upstream, running in self._running.items()},
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'requeued': self.requeued,
+                'owner': self.owner,
+                'lease': self.lease,
+                'workers': len(self._threads)
+            }
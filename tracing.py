@@ -0,0 +1,178 @@
+import contextvars
+import threading
+import time
+
+# Module import: http_client records upstream spans through this module
+import http_client
+
+# Span and request histogram bucket upper bounds, in seconds
+SPAN_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current = contextvars.ContextVar('jarvis_trace', default=None)
+
+
+class Trace:
+    """Span totals for one request: {name: [seconds, count]} plus the intents it matched.
+
+    Spans may be added from worker threads running the request's commands,
+    so additions take a lock. Spans ending after the response has gone out
+    (the rest of a stream) are observed straight into the tracer.
+    """
+
+    def __init__(self, tracer, route):
+        self.tracer = tracer
+        self.route = route
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.spans = {}
+        self.intents = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    @property
+    def intent(self):
+        """The intent label: the matched intent, 'compound' for several, 'none' for routes without one."""
+        distinct = set(self.intents)
+        if len(distinct) > 1:
+            return 'compound'
+        return self.intents[0] if distinct else 'none'
+
+    def add(self, name, seconds):
+        with self._lock:
+            if self.finished:
+                self.tracer.observe_span(self.intent, name, seconds)
+                return
+            span = self.spans.setdefault(name, [0.0, 0])
+            span[0] += seconds
+            span[1] += 1
+
+    def server_timing(self):
+        """Server-Timing header value, durations in milliseconds."""
+        with self._lock:
+            parts = [f"{name};dur={seconds * 1000:.3f}" for name, (seconds, _) in self.spans.items()]
+        parts.append(f"total;dur={self.seconds * 1000:.3f}")
+        return ', '.join(parts)
+
+
+class Tracer:
+    """Per-request spans collected into histograms by intent, rendered for Prometheus.
+
+    begin() makes a Trace current for the request's context; span(),
+    record() and note_intent() add to whatever trace is current and do
+    nothing outside a request, so instrumented code (storage, upstream
+    calls, intent matching) costs one context variable lookup in
+    background jobs.
+    """
+
+    def __init__(self, buckets=SPAN_BUCKETS):
+        self.buckets = buckets
+        self.request_seconds = {}
+        self.span_seconds = {}
+        self.responses = {}
+        self._lock = threading.Lock()
+
+    def begin(self, route):
+        """Start a trace for a request; returns the token for end()."""
+        return _current.set(Trace(self, route))
+
+    def finish(self, status):
+        """Close the current trace and observe it; returns the trace, or None outside a request."""
+        trace = _current.get()
+        if trace is None or trace.finished:
+            return trace
+        trace.seconds = time.perf_counter() - trace.start
+        with trace._lock:
+            trace.finished = True
+            spans = dict(trace.spans)
+        intent = trace.intent
+        self._histogram(self.request_seconds, (trace.route, intent)).observe(trace.seconds)
+        for name, (seconds, _) in spans.items():
+            self.observe_span(intent, name, seconds)
+        with self._lock:
+            key = (trace.route, str(status))
+            self.responses[key] = self.responses.get(key, 0) + 1
+        return trace
+
+    def end(self, token):
+        _current.reset(token)
+
+    def observe_span(self, intent, name, seconds):
+        self._histogram(self.span_seconds, (intent, name)).observe(seconds)
+
+    def _histogram(self, histograms, labels):
+        histogram = histograms.get(labels)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(labels, http_client.LatencyHistogram(buckets=self.buckets))
+        return histogram
+
+    def prometheus(self):
+        """All request and span histograms in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            request_seconds = dict(self.request_seconds)
+            span_seconds = dict(self.span_seconds)
+            responses = dict(self.responses)
+        lines += ['# HELP jarvis_request_seconds Request latency by route and intent.',
+                  '# TYPE jarvis_request_seconds histogram']
+        for (route, intent), histogram in sorted(request_seconds.items()):
+            lines += _histogram_lines('jarvis_request_seconds', {'route': route, 'intent': intent}, histogram)
+        lines += ['# HELP jarvis_span_seconds Time per request spent in each span, by intent.',
+                  '# TYPE jarvis_span_seconds histogram']
+        for (intent, span), histogram in sorted(span_seconds.items()):
+            lines += _histogram_lines('jarvis_span_seconds', {'intent': intent, 'span': span}, histogram)
+        lines += ['# HELP jarvis_responses_total Responses by route and HTTP status.',
+                  '# TYPE jarvis_responses_total counter']
+        for (route, status), count in sorted(responses.items()):
+            lines.append(f"jarvis_responses_total{_labels({'route': route, 'status': status})} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _histogram_lines(name, labels, histogram):
+    snapshot = histogram.snapshot()
+    lines = [f"{name}_bucket{_labels({**labels, 'le': bound})} {count}" for bound, count in snapshot['buckets'].items()]
+    # The snapshot's sum is rounded; sub-millisecond spans need the exact total
+    lines.append(f"{name}_sum{_labels(labels)} {histogram.total}")
+    lines.append(f"{name}_count{_labels(labels)} {snapshot['count']}")
+    return lines
+
+
+def record(name, seconds):
+    """Add a finished span to the current request's trace, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+class span:
+    """Context manager timing its block as a span of the current request.
+
+    A class rather than a @contextmanager generator: entering and leaving
+    one costs a fraction as much, which matters on every database call.
+    """
+
+    __slots__ = ('name', 'trace', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = _current.get()
+        if self.trace is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.trace is not None:
+            self.trace.add(self.name, time.perf_counter() - self.start)
+
+
+def note_intent(intent):
+    trace = _current.get()
+    if trace is not None:
+        trace.intents.append(intent)